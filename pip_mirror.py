@@ -1,7 +1,7 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
-"""Thin launcher to run the modular pip switcher GUI."""
-from pip_switcher.app import main
+"""Thin launcher: GUI by default, headless CLI when a command is given (see pip_switcher.cli)."""
+from pip_switcher.cli import main
 
 
 if __name__ == "__main__":
@@ -0,0 +1,8 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""`python -m pip_switcher`: headless CLI; with no command it starts the GUI."""
+from .cli import main
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
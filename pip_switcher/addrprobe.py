@@ -0,0 +1,423 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Per-address probing for CDN-fronted mirrors (stdlib only).
+A mirror host behind a CDN resolves to many A/AAAA records, and _probe only measures
+whichever one the system resolver hands out first. Here every host's A and AAAA
+records are resolved concurrently (a minimal DNS client, so record TTLs are known and
+cached), every address is probed separately with speedtest.probe_phases, and each
+mirror is scored by what a client that lands on a random address would see.
+pip connects without happy eyeballs: an unreachable IPv6 address stalls it for the
+whole connect timeout before IPv4 is tried, so slow or broken IPv6 paths are flagged.
+"""
+from __future__ import annotations
+import random
+import socket
+import statistics
+import struct
+import threading
+import time
+import urllib.parse
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from .netfp import resolvers
+from .speedtest import MirrorMap, ProbeTiming, human_ms, probe_phases, run_concurrently
+
+SYSTEM_TTL = 60.0  # getaddrinfo does not report TTLs; assume this for its answers
+NEGATIVE_TTL = 60.0  # no records of a type (e.g. no AAAA)
+MIN_TTL, MAX_TTL = 5.0, 3600.0
+IPV6_SLOW_FACTOR = 1.5  # IPv6 counts as slow above 1.5x the IPv4 median ...
+IPV6_SLOW_MARGIN_MS = 50.0  # ... plus this margin, so tiny absolute gaps are ignored
+_QTYPES = {socket.AF_INET: 1, socket.AF_INET6: 28}  # A, AAAA
+_CNAME = 5
+
+Address = Tuple[int, str]  # (family, ip)
+
+
+@dataclass
+class Resolution:
+    host: str
+    addresses: List[Address] = field(default_factory=list)
+    ttl: float = 0.0
+    resolved_at: float = 0.0
+    source: str = "dns"  # "dns" (own query, real TTL) or "system" (getaddrinfo, SYSTEM_TTL)
+    error: Optional[str] = None
+
+    @property
+    def expires(self) -> float:
+        return self.resolved_at + self.ttl
+
+
+class ResolverCache:
+    """host -> Resolution until its TTL runs out. Safe to share between threads."""
+
+    def __init__(self) -> None:
+        self._entries: Dict[str, Resolution] = {}
+        self._lock = threading.Lock()
+
+    def get(self, host: str) -> Optional[Resolution]:
+        with self._lock:
+            res = self._entries.get(host)
+            if res is not None and time.time() < res.expires:
+                return res
+            self._entries.pop(host, None)
+            return None
+
+    def put(self, res: Resolution) -> None:
+        if res.error is None:
+            with self._lock:
+                self._entries[res.host] = res
+
+
+_cache = ResolverCache()
+
+
+def _build_query(qid: int, host: str, qtype: int) -> bytes:
+    header = struct.pack(">HHHHHH", qid, 0x0100, 1, 0, 0, 0)  # recursion desired, one question
+    labels = host.rstrip(".").encode("idna").split(b".")
+    qname = b"".join(bytes([len(label)]) + label for label in labels) + b"\0"
+    return header + qname + struct.pack(">HH", qtype, 1)
+
+
+def _skip_name(msg: bytes, off: int) -> int:
+    while True:
+        n = msg[off]
+        if n == 0:
+            return off + 1
+        if n & 0xC0 == 0xC0:  # compression pointer ends the name
+            return off + 2
+        off += 1 + n
+
+
+class _Truncated(ValueError):
+    """The reply had the TC bit set: the answer did not fit and must be asked over TCP."""
+
+
+def _parse_reply(msg: bytes, qid: int, family: int) -> Tuple[List[str], float]:
+    """Addresses of the requested family and the smallest TTL along the answer chain."""
+    rid, flags, qdcount, ancount, _ns, _ar = struct.unpack_from(">HHHHHH", msg)
+    if rid != qid or not flags & 0x8000:
+        raise ValueError("unexpected DNS reply")
+    if flags & 0x0200:
+        raise _Truncated("truncated DNS reply")  # the records present are only a prefix
+    rcode = flags & 0xF
+    if rcode == 3:
+        return [], NEGATIVE_TTL  # NXDOMAIN
+    if rcode:
+        raise ValueError(f"DNS error rcode={rcode}")
+    off = 12
+    for _ in range(qdcount):
+        off = _skip_name(msg, off) + 4
+    ips: List[str] = []
+    ttls: List[int] = []
+    for _ in range(ancount):
+        off = _skip_name(msg, off)
+        rtype, rclass, ttl, rdlen = struct.unpack_from(">HHIH", msg, off)
+        off += 10
+        rdata = msg[off:off + rdlen]
+        off += rdlen
+        if rclass != 1:
+            continue
+        if rtype == _QTYPES[family]:
+            ips.append(socket.inet_ntop(family, rdata))
+            ttls.append(ttl)
+        elif rtype == _CNAME:
+            ttls.append(ttl)  # a CNAME in the chain bounds how long the answer stays valid
+    return ips, (float(min(ttls)) if ips else NEGATIVE_TTL)
+
+
+def _recv_exact(sock: socket.socket, n: int) -> bytes:
+    buf = b""
+    while len(buf) < n:
+        chunk = sock.recv(n - len(buf))
+        if not chunk:
+            raise ValueError("DNS connection closed early")
+        buf += chunk
+    return buf
+
+
+def _query_tcp(qid: int, host: str, family: int, server: str, timeout: float) -> Tuple[List[str], float]:
+    """The same query over TCP (RFC 7766: two-byte length prefix each way)."""
+    payload = _build_query(qid, host, _QTYPES[family])
+    with socket.create_connection((server, 53), timeout=timeout) as sock:
+        sock.sendall(struct.pack(">H", len(payload)) + payload)
+        (length,) = struct.unpack(">H", _recv_exact(sock, 2))
+        return _parse_reply(_recv_exact(sock, length), qid, family)
+
+
+def query(host: str, family: int, server: str, timeout: float = 2.0) -> Tuple[List[str], float]:
+    """
+    One A or AAAA query over UDP to server, retried over TCP when the reply is
+    truncated. Returns (ips, ttl); raises OSError/ValueError.
+    """
+    qid = random.getrandbits(16)
+    info = socket.getaddrinfo(server, 53, type=socket.SOCK_DGRAM)[0]
+    with socket.socket(info[0], socket.SOCK_DGRAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(info[4])
+        sock.send(_build_query(qid, host, _QTYPES[family]))
+        end = time.monotonic() + timeout
+        while True:
+            sock.settimeout(max(0.01, end - time.monotonic()))
+            msg = sock.recv(4096)
+            try:
+                return _parse_reply(msg, qid, family)
+            except _Truncated:
+                break
+            except (ValueError, struct.error, IndexError):
+                if time.monotonic() >= end:
+                    raise ValueError("no valid DNS reply")
+                # stray or spoofed datagram: keep waiting for ours
+    return _query_tcp(qid, host, family, server, max(0.01, end - time.monotonic()))
+
+
+def _query_any(host: str, family: int, servers: List[str], timeout: float) -> Tuple[List[str], float]:
+    last: Exception = ValueError("no nameserver configured")
+    for server in servers:
+        try:
+            return query(host, family, server, timeout)
+        except (OSError, ValueError, struct.error, IndexError) as e:
+            last = e
+    raise last
+
+
+def _system_resolve(host: str) -> Resolution:
+    res = Resolution(host, resolved_at=time.time(), ttl=SYSTEM_TTL, source="system")
+    try:
+        infos = socket.getaddrinfo(host, None, type=socket.SOCK_STREAM)
+    except OSError as e:
+        res.error = str(e) or type(e).__name__
+        return res
+    for family, _type, _proto, _canon, sockaddr in infos:
+        addr = (family, sockaddr[0])
+        if family in _QTYPES and addr not in res.addresses:
+            res.addresses.append(addr)
+    return res
+
+
+def resolve(host: str, timeout: float = 2.0, cache: Optional[ResolverCache] = None) -> Resolution:
+    """
+    All A and AAAA records of host, both queried at once against the configured
+    nameservers. Falls back to getaddrinfo (with SYSTEM_TTL) where there are no usable
+    nameservers. Cached until the smallest record TTL expires. Never raises.
+    """
+    cache = _cache if cache is None else cache
+    hit = cache.get(host)
+    if hit is not None:
+        return hit
+    servers = resolvers()
+    answers: Dict[int, Tuple[List[str], float]] = {}
+
+    def _one(family: int) -> None:
+        try:
+            answers[family] = _query_any(host, family, servers, timeout)
+        except (OSError, ValueError, struct.error, IndexError):
+            pass
+
+    res = Resolution(host, resolved_at=time.time())
+    if servers:
+        threads = [threading.Thread(target=_one, args=(family,), daemon=True) for family in _QTYPES]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    if answers and any(ips for ips, _ttl in answers.values()):
+        for family in _QTYPES:
+            res.addresses += [(family, ip) for ip in answers.get(family, ([], 0.0))[0]]
+        res.ttl = min(max(min(ttl for _ips, ttl in answers.values()), MIN_TTL), MAX_TTL)
+    else:
+        res = _system_resolve(host)
+    if not res.addresses and res.error is None:
+        res.error = "no addresses"
+    cache.put(res)
+    return res
+
+
+def ipv6_route() -> bool:
+    """Whether this machine has an IPv6 default route, i.e. tries AAAA records first (no packets sent)."""
+    try:
+        with socket.socket(socket.AF_INET6, socket.SOCK_DGRAM) as s:
+            s.connect(("2001:db8::1", 53))
+        return True
+    except OSError:
+        return False
+
+
+@dataclass
+class AddressResult:
+    family: int
+    ip: str
+    timing: ProbeTiming
+
+    @property
+    def family_name(self) -> str:
+        return "IPv6" if self.family == socket.AF_INET6 else "IPv4"
+
+
+@dataclass
+class HostReport:
+    host: str
+    resolution: Resolution
+    results: List[AddressResult] = field(default_factory=list)
+    prefer_ipv6: bool = False
+    timeout_ms: float = 3000.0
+
+    def _ok(self, family: Optional[int] = None) -> List[float]:
+        return [
+            r.timing.total_ms for r in self.results
+            if r.timing.ok and (family is None or r.family == family)
+        ]
+
+    @property
+    def best_ms(self) -> float:
+        return min(self._ok(), default=float("inf"))
+
+    @property
+    def worst_ms(self) -> float:
+        """Slowest address that answered at all."""
+        return max(self._ok(), default=float("inf"))
+
+    @property
+    def spread_ms(self) -> float:
+        ok = self._ok()
+        return max(ok) - min(ok) if ok else float("inf")
+
+    def family_ms(self, family: int) -> float:
+        ok = self._ok(family)
+        return statistics.median(ok) if ok else float("inf")
+
+    @property
+    def slow_ipv6(self) -> bool:
+        """IPv6 addresses fail or trail IPv4 clearly while IPv4 works."""
+        if not any(r.family == socket.AF_INET6 for r in self.results) or not self._ok(socket.AF_INET):
+            return False
+        v4, v6 = self.family_ms(socket.AF_INET), self.family_ms(socket.AF_INET6)
+        return v6 > v4 * IPV6_SLOW_FACTOR + IPV6_SLOW_MARGIN_MS
+
+    @property
+    def effective_ms(self) -> float:
+        """
+        Median cost over the addresses a client tries first (its preferred family).
+        A dead address costs the connect timeout plus a working address, as pip waits
+        the timeout out before moving on.
+        """
+        ok = self._ok()
+        if not ok:
+            return float("inf")
+        family = socket.AF_INET6 if self.prefer_ipv6 else socket.AF_INET
+        first = [r for r in self.results if r.family == family] or self.results
+        fallback = statistics.median(ok)
+        costs = [r.timing.total_ms if r.timing.ok else self.timeout_ms + fallback for r in first]
+        return statistics.median(costs)
+
+
+def resolve_all(
+    hosts: Iterable[str],
+    timeout: float = 2.0,
+    max_workers: int = 16,
+    deadline: Optional[float] = None,
+    cancel: Optional[threading.Event] = None,
+    cache: Optional[ResolverCache] = None,
+) -> Dict[str, Resolution]:
+    """Resolve hosts concurrently; hosts unresolved by the deadline get an error Resolution."""
+    jobs: MirrorMap = {host: (host, host) for host in hosts}
+    return run_concurrently(
+        jobs, lambda host, _url: resolve(host, timeout, cache), Resolution("", error="deadline exceeded"),
+        max_workers, deadline, cancel=cancel,
+    )
+
+
+def benchmark_addresses(
+    mirrors: MirrorMap,
+    attempts: int = 1,
+    timeout: float = 3.0,
+    progress: Optional[Callable[[str], None]] = None,
+    max_workers: int = 16,
+    deadline: Optional[float] = None,
+    cancel: Optional[threading.Event] = None,
+    cache: Optional[ResolverCache] = None,
+) -> List[Tuple[str, HostReport]]:
+    """
+    Resolve every mirror host, then probe each of its addresses (best of `attempts`)
+    on one bounded pool. Returns (name, HostReport) sorted by effective_ms.
+    """
+    start = time.monotonic()
+
+    def _left() -> Optional[float]:
+        return None if deadline is None else max(0.0, deadline - (time.monotonic() - start))
+
+    if progress:
+        for name in mirrors:
+            progress(f"正在测试 {name} 源…")
+    hosts = {name: urllib.parse.urlsplit(url).hostname or "" for name, (url, _host) in mirrors.items()}
+    resolved = resolve_all(set(hosts.values()), min(timeout, 2.0), max_workers, _left(), cancel, cache)
+    prefer_ipv6 = ipv6_route()
+    reports = {
+        name: HostReport(host, resolved[host], prefer_ipv6=prefer_ipv6, timeout_ms=timeout * 1000.0)
+        for name, host in hosts.items()
+    }
+    # One job per (mirror, address); the job key doubles as the MirrorMap name
+    jobs: MirrorMap = {}
+    targets: Dict[str, Tuple[str, Address]] = {}
+    remaining = {name: 0 for name in mirrors}
+    for name, (url, trusted) in mirrors.items():
+        for addr in reports[name].resolution.addresses:
+            key = f"{name} {addr[1]}"
+            jobs[key] = (url.rstrip("/") + "/", trusted)
+            targets[key] = (name, addr)
+            remaining[name] += 1
+
+    def _task(key: str, url: str) -> ProbeTiming:
+        best = ProbeTiming(error="not probed")
+        for _ in range(max(1, attempts)):
+            timing = probe_phases(url, timeout, address=targets[key][1])
+            if timing.total_ms < best.total_ms or not best.ok and not timing.ok:
+                best = timing
+        return best
+
+    def _report(name: str) -> None:
+        if progress:
+            rep = reports[name]
+            progress(f"{name} 源测试完成：{human_ms(rep.effective_ms)}")
+
+    def _done(key: str, timing: ProbeTiming) -> None:
+        name, (family, ip) = targets[key]
+        reports[name].results.append(AddressResult(family, ip, timing))
+        remaining[name] -= 1
+        if remaining[name] == 0:
+            _report(name)
+
+    for name, left in remaining.items():
+        if left == 0:
+            _report(name)  # resolution failed: nothing to probe
+    run_concurrently(jobs, _task, ProbeTiming(error="deadline exceeded"), max_workers, _left(), _done, cancel)
+    results = [(name, reports[name]) for name in mirrors]
+    results.sort(key=lambda x: (x[1].effective_ms == float("inf"), x[1].effective_ms))
+    if progress:
+        progress("测速完成。正在计算推荐结果…")
+    return results
+
+
+def address_ranking(results: List[Tuple[str, HostReport]]) -> List[Tuple[str, float]]:
+    """(name, effective ms), like speedtest.benchmark_mirrors."""
+    return [(name, rep.effective_ms) for name, rep in results]
+
+
+def format_addresses(results: List[Tuple[str, HostReport]], per_address: bool = True) -> str:
+    lines = ["按 IP 测速结果（有效延迟；最快~最慢，单位：ms，越小越好）:"]
+    for i, (name, rep) in enumerate(results, 1):
+        res = rep.resolution
+        if res.error is not None:
+            lines.append(f"{i:>2}. {name:<8}  解析失败：{res.error}")
+            continue
+        line = f"{i:>2}. {name:<8}  {human_ms(rep.effective_ms)}"
+        if rep.best_ms != float("inf"):
+            line += f"  ({rep.best_ms:.0f}~{rep.worst_ms:.0f}，{len(rep.results)} 个地址，TTL {res.ttl:.0f}s)"
+        if rep.slow_ipv6:
+            line += "  ⚠ IPv6 明显偏慢或不可达"
+        lines.append(line)
+        if per_address:
+            for r in sorted(rep.results, key=lambda r: (r.family, r.timing.total_ms)):
+                lines.append(f"      {r.family_name} {r.ip:<39}  {human_ms(r.timing.total_ms)}")
+    return "\n".join(lines)
@@ -4,7 +4,8 @@
 from __future__ import annotations
 import sys
 from PyQt6.QtWidgets import QApplication
-from PyQt6.QtCore import QCoreApplication
+from PyQt6.QtCore import QCoreApplication, QSettings
+from . import telemetry
 from .style import apply_modern_style, apply_dark_titlebar
 from .ui import MainWindow
 
@@ -15,8 +16,16 @@ def main() -> int:
     QCoreApplication.setOrganizationDomain("example.local")
     QCoreApplication.setApplicationName("PipMirrorSwitcher")
     apply_modern_style(app)
+    # Optional instrumentation output, set by hand in the settings file
+    settings = QSettings()
+    trace, metrics = settings.value("trace_path", ""), settings.value("metrics_path", "")
+    if trace or metrics:
+        telemetry.configure(trace or None, metrics or None)
     w = MainWindow()
     # Attempt to match title bar to dark theme on Windows
     apply_dark_titlebar(w)
     w.show()
-    return app.exec()
+    try:
+        return app.exec()
+    finally:
+        telemetry.flush()
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Mirror catalog: the bundled mirrors.json plus optional user files (mirrors.json or
+mirrors.toml in the app data directory) with regions, tags and display names.
+A user entry with the same name replaces the bundled one, `"disabled": true` drops it.
+HostIndex maps normalised index URLs and hosts to names, so finding the active mirror
+is a dict lookup however long the catalog grows; connect_race/prefilter cut a long
+catalog down to the K mirrors that accept a TCP connection fastest before the full
+speed test runs.
+"""
+from __future__ import annotations
+import json
+import os
+import re
+import sys
+import threading
+import time
+import urllib.parse
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+BUNDLED_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "mirrors.json")
+# Catalogs longer than this are raced on TCP connect before the full speed test
+PREFILTER_K = 8
+
+MirrorMap = Dict[str, Tuple[str, str]]
+
+
+class MirrorEntry:
+    # A plain slotted class: core loads the catalog on every CLI start, and importing
+    # dataclasses (which pulls in inspect) would cost more than the whole catalog
+    __slots__ = ("name", "index_url", "trusted_host", "region", "tags", "display")
+
+    def __init__(
+        self,
+        name: str,
+        index_url: str,
+        trusted_host: str,
+        region: str = "",
+        tags: Optional[List[str]] = None,
+        display: Optional[Dict[str, str]] = None,
+    ) -> None:
+        self.name = name
+        self.index_url = index_url
+        self.trusted_host = trusted_host
+        self.region = region
+        self.tags = tags or []
+        self.display = display or {}  # language -> display name
+
+    def __repr__(self) -> str:
+        return f"MirrorEntry({self.name!r}, {self.index_url!r}, region={self.region!r}, tags={self.tags!r})"
+
+    def label(self, lang: str) -> str:
+        return self.display.get(lang) or self.display.get("en") or self.name
+
+
+def user_paths() -> List[str]:
+    """mirrors.json / mirrors.toml next to history.sqlite3."""
+    from . import history  # sqlite3 is not needed just to find the directory's path
+
+    base = os.path.dirname(history.default_path())
+    return [os.path.join(base, "mirrors.json"), os.path.join(base, "mirrors.toml")]
+
+
+def _read(path: str) -> Dict[str, Any]:
+    if path.endswith(".toml"):
+        try:
+            import tomllib
+        except ImportError:  # Python < 3.11
+            raise ValueError("TOML catalogs need Python 3.11+ (tomllib); use mirrors.json instead")
+        with open(path, "rb") as f:
+            return tomllib.load(f)
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _parse(data: Dict[str, Any], source: str) -> List[Tuple[MirrorEntry, bool]]:
+    """(entry, disabled) pairs from {"mirrors": [...]}. Raises ValueError on bad entries."""
+    items = data.get("mirrors") if isinstance(data, dict) else None
+    if not isinstance(items, list):
+        raise ValueError(f"{source}: expected a top-level 'mirrors' list")
+    out: List[Tuple[MirrorEntry, bool]] = []
+    for i, item in enumerate(items):
+        if not isinstance(item, dict) or not item.get("name"):
+            raise ValueError(f"{source}: mirror #{i + 1} has no name")
+        name = str(item["name"])
+        if item.get("disabled"):
+            out.append((MirrorEntry(name, "", ""), True))
+            continue
+        url = str(item.get("index_url") or "")
+        host = urllib.parse.urlsplit(url).hostname
+        if not url.startswith(("http://", "https://")) or not host:
+            raise ValueError(f"{source}: mirror '{name}' needs an http(s) index_url")
+        tags = item.get("tags") or []
+        display = item.get("display") or {}
+        if not isinstance(tags, list) or not isinstance(display, dict):
+            raise ValueError(f"{source}: mirror '{name}': tags must be a list and display a table")
+        out.append((MirrorEntry(
+            name, url, str(item.get("trusted_host") or host), str(item.get("region") or ""),
+            [str(t) for t in tags], {str(k): str(v) for k, v in display.items()},
+        ), False))
+    return out
+
+
+class Catalog:
+    """Ordered name -> MirrorEntry."""
+
+    def __init__(self, entries: Iterable[MirrorEntry] = ()) -> None:
+        self.entries: Dict[str, MirrorEntry] = {}
+        for entry in entries:
+            self.entries[entry.name] = entry
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def merge(self, pairs: List[Tuple[MirrorEntry, bool]]) -> None:
+        for entry, disabled in pairs:
+            if disabled:
+                self.entries.pop(entry.name, None)
+            else:
+                self.entries[entry.name] = entry
+
+    def select(self, region: Optional[str] = None, tags: Iterable[str] = ()) -> List[MirrorEntry]:
+        """Entries in this region (if given) carrying every one of tags."""
+        wanted = set(tags)
+        return [
+            e for e in self.entries.values()
+            if (not region or e.region == region) and wanted.issubset(e.tags)
+        ]
+
+    def mirror_map(self, region: Optional[str] = None, tags: Iterable[str] = ()) -> MirrorMap:
+        return {e.name: (e.index_url, e.trusted_host) for e in self.select(region, tags)}
+
+    def display_names(self) -> Dict[str, Dict[str, str]]:
+        """{"zh": {name: label}, "en": {...}} for the GUI."""
+        return {lang: {name: e.label(lang) for name, e in self.entries.items()} for lang in ("zh", "en")}
+
+
+def load(paths: Optional[List[str]] = None) -> Catalog:
+    """Bundled catalog merged with the user files that exist (default: user_paths())."""
+    with open(BUNDLED_PATH, "r", encoding="utf-8") as f:
+        cat = Catalog(entry for entry, _disabled in _parse(json.load(f), BUNDLED_PATH))
+    for path in user_paths() if paths is None else paths:
+        if not os.path.exists(path):
+            continue
+        try:
+            cat.merge(_parse(_read(path), path))
+        except (OSError, ValueError) as e:  # json.JSONDecodeError and TOMLDecodeError are ValueErrors
+            # stderr: core loads the catalog at import, before `--json` output is written
+            print(f"[WARN] Ignoring mirror catalog {path}: {e}", file=sys.stderr)
+    return cat
+
+
+def normalize_url(url: str) -> str:
+    """
+    Comparable form of an index URL: scheme dropped, host lowercased, default port and
+    trailing slashes removed, e.g. 'HTTPS://Mirrors.Aliyun.com:443/pypi/simple/' ->
+    'mirrors.aliyun.com/pypi/simple'.
+    """
+    parts = urllib.parse.urlsplit(url.strip())
+    try:
+        port = parts.port
+    except ValueError:
+        port = None
+    host = (parts.hostname or "").lower()
+    if port is not None and port != {"http": 80, "https": 443}.get(parts.scheme.lower()):
+        host = f"{host}:{port}"
+    return host + re.sub("/{2,}", "/", parts.path).rstrip("/")
+
+
+class HostIndex:
+    """O(1) URL -> mirror name: exact normalised URL first, then the bare host."""
+
+    def __init__(self, mirrors: MirrorMap) -> None:
+        self.urls: Dict[str, str] = {}
+        self.hosts: Dict[str, str] = {}
+        for name, (url, host) in mirrors.items():
+            self.urls.setdefault(normalize_url(url), name)
+            self.hosts.setdefault(normalize_url(url).split("/", 1)[0], name)
+            self.hosts.setdefault(host.lower(), name)
+
+    def lookup(self, url: Optional[str]) -> Optional[str]:
+        if not url:
+            return None
+        key = normalize_url(url)
+        return self.urls.get(key) or self.hosts.get(key.split("/", 1)[0])
+
+
+def connect_time(index_url: str, timeout: float = 1.5) -> float:
+    """Seconds for DNS + TCP connect to the mirror's host; inf on failure."""
+    import socket
+
+    parts = urllib.parse.urlsplit(index_url)
+    port = parts.port or (443 if parts.scheme == "https" else 80)
+    start = time.perf_counter()
+    try:
+        with socket.create_connection((parts.hostname, port), timeout=timeout):
+            return time.perf_counter() - start
+    except (OSError, ValueError):
+        return float("inf")
+
+
+def connect_race(
+    mirrors: MirrorMap,
+    timeout: float = 1.5,
+    max_workers: int = 32,
+    deadline: Optional[float] = None,
+    cancel: Optional[threading.Event] = None,
+) -> List[Tuple[str, float]]:
+    """TCP-connect every mirror at once; (name, ms) sorted fastest first, inf = unreachable."""
+    from .speedtest import run_concurrently
+
+    got = run_concurrently(
+        mirrors, lambda _name, url: connect_time(url, timeout), float("inf"), max_workers,
+        deadline if deadline is not None else timeout + 1.0, None, cancel,
+    )
+    ranking = [(name, got[name] * 1000.0 if got[name] != float("inf") else got[name]) for name in mirrors]
+    ranking.sort(key=lambda x: x[1])
+    return ranking
+
+
+def prefilter(
+    mirrors: MirrorMap,
+    k: int = PREFILTER_K,
+    timeout: float = 1.5,
+    cancel: Optional[threading.Event] = None,
+) -> MirrorMap:
+    """The k mirrors that connect fastest (all of them if there are no more than k)."""
+    if k <= 0 or len(mirrors) <= k:
+        return dict(mirrors)
+    ranking = connect_race(mirrors, timeout=timeout, cancel=cancel)
+    return {name: mirrors[name] for name, _ms in ranking[:k]}
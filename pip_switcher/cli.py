@@ -0,0 +1,629 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Headless command-line interface: `python -m pip_switcher switch|reset|show|bench|recommend|...`.
+Never imports PyQt6; the GUI is loaded only for the `gui` command (or no command at all).
+Heavy modules are imported inside the commands that need them to keep start-up fast.
+"""
+from __future__ import annotations
+import argparse
+import contextlib
+import json
+import sys
+import time
+from typing import Any, List, Optional, Sequence, Tuple, Union
+
+from . import catalog, core
+
+SCOPES = ("user", "site", "global")
+
+
+def _ms(value: float) -> Optional[float]:
+    """JSON has no infinity; failures are reported as null."""
+    return None if value == float("inf") else round(value, 1)
+
+
+def _emit(args: argparse.Namespace, payload: Any, text: str) -> None:
+    if args.json:
+        print(json.dumps(payload, ensure_ascii=False))
+    else:
+        print(text)
+
+
+@contextlib.contextmanager
+def _quiet(args: argparse.Namespace):
+    """In --json mode keep stdout pure JSON by sending core's status lines to stderr."""
+    if args.json:
+        with contextlib.redirect_stdout(sys.stderr):
+            yield
+    else:
+        yield
+
+
+def _progress(args: argparse.Namespace):
+    if args.quiet:
+        return None
+    return lambda msg: print(msg, file=sys.stderr)
+
+
+def _candidates(args: argparse.Namespace) -> catalog.MirrorMap:
+    """Catalog mirrors matching --region/--tag, cut to the --top-k fastest to connect."""
+    mirrors = core.CATALOG.mirror_map(getattr(args, "region", None), getattr(args, "tag", None) or ())
+    return catalog.prefilter(mirrors, getattr(args, "top_k", catalog.PREFILTER_K))
+
+
+def cmd_list(args: argparse.Namespace) -> int:
+    entries = core.CATALOG.select(args.region, args.tag or ())
+    payload = [
+        {"name": e.name, "index_url": e.index_url, "trusted_host": e.trusted_host, "region": e.region, "tags": e.tags}
+        for e in entries
+    ]
+    _emit(args, payload, "\n".join(f"{e.name:<10} {e.region:<3} {e.index_url}  [{','.join(e.tags)}]" for e in entries))
+    return 0
+
+
+def cmd_switch(args: argparse.Namespace) -> int:
+    if args.name not in core.MIRRORS:
+        print(f"[ERROR] Unknown mirror '{args.name}'. Choose from: {', '.join(core.MIRRORS)}", file=sys.stderr)
+        return 2
+    with _quiet(args):
+        core.set_mirror(args.name, args.scope, backend=args.backend, verify=args.verify)
+    index_url, host = core.MIRRORS[args.name]
+    if args.json:
+        _emit(args, {"ok": True, "mirror": args.name, "index_url": index_url, "trusted_host": host, "scope": args.scope}, "")
+    return 0
+
+
+def cmd_reset(args: argparse.Namespace) -> int:
+    with _quiet(args):
+        core.reset_mirror(args.scope, backend=args.backend, verify=args.verify)
+    if args.json:
+        _emit(args, {"ok": True, "scope": args.scope}, "")
+    return 0
+
+
+def cmd_show(args: argparse.Namespace) -> int:
+    if args.json:
+        from . import pipconf
+        snap = pipconf.snapshot()
+        payload = {
+            "index_url": snap.index_url,
+            "trusted_hosts": snap.trusted_hosts,
+            "mirror": core.current_mirror(),
+            "values": dict(snap.items()),
+        }
+        _emit(args, payload, "")
+    else:
+        core.show_config(backend=args.backend)
+    return 0
+
+
+def cmd_bench(args: argparse.Namespace) -> int:
+    from . import speedtest
+    progress = _progress(args)
+    mirrors = _candidates(args)
+    common = dict(timeout=args.timeout, progress=progress, max_workers=args.workers, deadline=args.deadline)
+    if args.mode == "latency":
+        ranking = speedtest.benchmark_mirrors(mirrors, attempts=args.attempts, **common)
+        payload: Any = [{"name": name, "ms": _ms(ms)} for name, ms in ranking]
+        text = speedtest.format_ranking(ranking)
+    elif args.mode == "phases":
+        results = speedtest.benchmark_phases(mirrors, attempts=args.attempts, **common)
+        payload = [
+            {"name": name, "ms": _ms(t.total_ms), "dns_ms": _ms(t.dns_ms), "connect_ms": _ms(t.connect_ms),
+             "tls_ms": _ms(t.tls_ms), "ttfb_ms": _ms(t.ttfb_ms), "body_ms": _ms(t.body_ms), "error": t.error}
+            for name, t in results
+        ]
+        text = speedtest.format_ranking(speedtest.phase_ranking(results), dict(results))
+    elif args.mode == "warm":
+        results3 = speedtest.benchmark_cold_warm(mirrors, attempts=max(args.attempts, 2), **common)
+        payload = [{"name": name, "cold_ms": _ms(cold), "warm_ms": _ms(warm)} for name, cold, warm in results3]
+        text = speedtest.format_cold_warm(results3)
+    elif args.mode == "adaptive":
+        stats = speedtest.benchmark_adaptive(mirrors, **common)
+        payload = [
+            {"name": name, "p50_ms": _ms(st.p50), "p95_ms": _ms(st.p95), "jitter_ms": round(st.jitter, 1),
+             "failure_rate": round(st.failure_rate, 3), "samples": st.attempts, "dropped": st.dropped}
+            for name, st in stats
+        ]
+        text = speedtest.format_stats(stats)
+    elif args.mode == "addresses":
+        from . import addrprobe
+        reports = addrprobe.benchmark_addresses(mirrors, attempts=args.attempts, **common)
+        payload = [
+            {"name": name, "ms": _ms(rep.effective_ms), "host": rep.host, "ttl": rep.resolution.ttl,
+             "spread_ms": _ms(rep.spread_ms), "slow_ipv6": rep.slow_ipv6, "error": rep.resolution.error,
+             "addresses": [{"ip": r.ip, "family": r.family_name, "ms": _ms(r.timing.total_ms), "error": r.timing.error}
+                           for r in rep.results]}
+            for name, rep in reports
+        ]
+        text = addrprobe.format_addresses(reports)
+    else:
+        from . import throughput
+        bw = throughput.benchmark_throughput(
+            mirrors, timeout=max(args.timeout, 10.0), progress=progress, deadline=args.deadline
+        )
+        payload = [{"name": name, "mbps": round(r.mbps, 3), "url": r.url, "error": r.error} for name, r in bw]
+        text = throughput.format_throughput(bw)
+    _emit(args, payload, text)
+    return 0
+
+
+def _network_ranking(args: argparse.Namespace) -> Tuple[List[Tuple[str, float]], str, bool]:
+    """
+    (ranking, network fingerprint, cached): reuse this network's ranking within --ttl if one
+    quick probe confirms its winner, else benchmark.
+    """
+    from . import history, netfp, speedtest
+    with history.HistoryStore() as store:
+        fp = netfp.fingerprint()
+        ts, ranking = store.network_ranking(fp)
+        cached = ts is not None and time.time() - ts < args.ttl
+        if cached and netfp.validated_winner(ranking, _progress(args)) is None:
+            cached = False
+        if not cached and getattr(args, "per_address", False):
+            from . import addrprobe
+            ranking = addrprobe.address_ranking(addrprobe.benchmark_addresses(
+                _candidates(args), timeout=args.timeout, progress=_progress(args), deadline=args.deadline
+            ))
+        elif not cached:
+            ranking = speedtest.benchmark_mirrors(
+                _candidates(args), timeout=args.timeout, progress=_progress(args), deadline=args.deadline
+            )
+        if not cached:
+            store.record(ranking, network=fp)
+            store.save_network_ranking(fp, ranking)
+    return ranking, fp, cached
+
+
+def cmd_recommend(args: argparse.Namespace) -> int:
+    from . import speedtest
+    ranking, fp, cached = _network_ranking(args)
+    best = next((name for name, ms in ranking if ms != float("inf") and name in core.MIRRORS), None)
+    current = core.current_mirror()
+    if args.apply and best is not None and best != current:
+        with _quiet(args):
+            core.set_mirror(best, args.scope, backend=args.backend)
+    payload = {
+        "best": best,
+        "index_url": core.MIRRORS[best][0] if best else None,
+        "trusted_host": core.MIRRORS[best][1] if best else None,
+        "current": current,
+        "cached": cached,
+        "network": fp,
+        "applied": bool(args.apply and best is not None and best != current),
+        "ranking": [{"name": name, "ms": _ms(ms)} for name, ms in ranking],
+    }
+    text = speedtest.format_ranking(ranking) + f"\n推荐：{best or '无可用镜像'}（当前：{current or '未设置/官方默认'}）"
+    _emit(args, payload, text)
+    return 0 if best else 1
+
+
+def cmd_fresh(args: argparse.Namespace) -> int:
+    from . import freshness
+    packages = [p.strip() for p in args.packages.split(",") if p.strip()] if args.packages else freshness.HOT_PACKAGES
+    results = freshness.check_freshness(
+        core.MIRRORS, packages, timeout=args.timeout, progress=_progress(args), deadline=args.deadline
+    )
+    payload = [
+        {"name": name, "behind": lag.behind, "missing": lag.missing, "failed": lag.failed,
+         "lag_seconds": None if lag.lag_seconds is None else round(lag.lag_seconds)}
+        for name, lag in results
+    ]
+    _emit(args, payload, freshness.format_lag(results))
+    return 0
+
+
+def cmd_coverage(args: argparse.Namespace) -> int:
+    from . import coverage
+    results = coverage.audit_coverage(
+        core.MIRRORS, timeout=args.timeout, progress=_progress(args), max_workers=args.workers,
+        max_age=0.0 if args.refresh else coverage.CACHE_MAX_AGE,
+    )
+    payload = [
+        {"name": name, "projects": cov.projects, "missing_count": cov.missing_count,
+         "missing": cov.missing, "error": cov.error}
+        for name, cov in results
+    ]
+    _emit(args, payload, coverage.format_coverage(results))
+    return 0
+
+
+def cmd_integrity(args: argparse.Namespace) -> int:
+    from . import freshness, integrity
+    packages = [p.strip() for p in args.packages.split(",") if p.strip()] if args.packages else freshness.HOT_PACKAGES
+    sample = integrity.build_sample(
+        packages, per_package=args.files, max_bytes=int(args.max_mb * 1024 * 1024),
+        fallback_index=core.MIRRORS[next(iter(core.MIRRORS))][0],
+    )
+    if not sample:
+        print("[ERROR] Could not obtain reference digests for any package.", file=sys.stderr)
+        return 1
+    results = integrity.check_integrity(
+        core.MIRRORS, sample, rate=args.rate * 1024 * 1024, timeout=args.timeout,
+        progress=_progress(args), max_workers=args.workers, deadline=args.deadline,
+    )
+    payload = [
+        {"name": name, "checked": len(res.checks), "mismatches": res.mismatches,
+         "problems": [{"file": c.filename, "status": c.status, "detail": c.detail} for c in res.problems]}
+        for name, res in results
+    ]
+    _emit(args, payload, integrity.format_integrity(results))
+    return 0 if all(res.mismatches == 0 for _, res in results) else 1
+
+
+def cmd_replay(args: argparse.Namespace) -> int:
+    from . import replay
+    results = replay.benchmark_replay(
+        core.MIRRORS, args.requirements, mode=args.mode, timeout=args.timeout,
+        progress=_progress(args), max_workers=args.workers, deadline=args.deadline,
+    )
+    payload = [
+        {"name": name, "ms": _ms(res.seconds * 1000.0 if res.ok else float("inf")), "bytes": res.nbytes,
+         "error": res.error,
+         "files": [{"requirement": f.requirement, "file": f.filename, "bytes": f.nbytes, "seconds": round(f.seconds, 3)}
+                   for f in res.files]}
+        for name, res in results
+    ]
+    _emit(args, payload, replay.format_replay(results, per_file=args.per_file))
+    return 0 if any(res.ok for _, res in results) else 1
+
+
+def cmd_simbench(args: argparse.Namespace) -> int:
+    from . import simbench
+    scenarios = simbench.build_scenarios(args.seed)
+    if args.scenario != "all" and args.scenario not in scenarios:
+        print(f"[ERROR] Unknown scenario '{args.scenario}'. Choose from: all, {', '.join(scenarios)}", file=sys.stderr)
+        return 2
+    names = list(scenarios) if args.scenario == "all" else [args.scenario]
+    reports = [simbench.run_scenario(scenarios[name], args.repeat, args.mode, _progress(args)) for name in names]
+    payload: Any = {
+        "scenarios": [
+            {"name": r.scenario.name, "mode": args.mode or r.scenario.mode, "mirrors": len(r.scenario.specs),
+             "expected": r.scenario.expected, "accuracy": round(r.accuracy, 3), "wall_s": round(r.wall_s, 3),
+             "peak_kb": round(r.peak_kb, 1),
+             "runs": [{"wall_s": round(run.wall_s, 3), "winner": run.winner, "peak_kb": round(run.peak_kb, 1)}
+                      for run in r.runs]}
+            for r in reports
+        ],
+    }
+    text = simbench.format_reports(reports)
+    if args.config:
+        timings = simbench.bench_config(args.iterations)
+        payload["config"] = [{"op": t.op, "median_ms": round(t.median_ms, 3), "max_ms": round(t.max_ms, 3)}
+                             for t in timings]
+        text += "\n" + simbench.format_config(timings)
+    _emit(args, payload, text)
+    return 0
+
+
+def cmd_monitor(args: argparse.Namespace) -> int:
+    from . import monitor
+    mon = monitor.HealthMonitor(
+        args.scope, margin=args.margin, hold=args.hold,
+        on_event=lambda msg: print(msg, file=sys.stderr, flush=True),
+    )
+    mon.start()
+    try:
+        while mon.running:
+            time.sleep(1.0)
+    except KeyboardInterrupt:
+        mon.stop()
+    return 0
+
+
+def cmd_metrics(args: argparse.Namespace) -> int:
+    from . import speedtest, telemetry
+    server = telemetry.serve_metrics(args.bind, args.port)
+    print(f"[OK] OpenMetrics on http://{args.bind}:{server.server_address[1]}/metrics", file=sys.stderr, flush=True)
+    try:
+        while True:
+            # Each pass refreshes the per-mirror gauges and the probe histograms/counters
+            speedtest.benchmark_mirrors(core.MIRRORS, timeout=args.timeout, deadline=args.deadline)
+            time.sleep(args.interval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+        server.server_close()
+    return 0
+
+
+def cmd_daemon(args: argparse.Namespace) -> int:
+    from . import daemon
+    # Unix socket wherever the platform has one; loopback HTTP on --port as well (or instead)
+    socket_path = args.socket or (daemon.default_socket_path() if daemon.unix_sockets_supported() else None)
+    port = args.port if args.port is not None or socket_path else daemon.DEFAULT_PORT
+    if args.query:
+        method = "POST" if args.query.rstrip("/") == "/refresh" else "GET"
+        if args.port is not None:
+            socket_path = None  # --query with --port asks over HTTP
+        try:
+            status, payload = daemon.query(args.query, socket_path, port=port or daemon.DEFAULT_PORT, method=method)
+        except OSError as e:
+            print(f"[ERROR] No daemon answering on {socket_path or port}: {e}", file=sys.stderr)
+            return 2
+        print(json.dumps(payload, ensure_ascii=False))
+        return 0 if status < 300 else 1
+    server = daemon.BestMirrorDaemon(
+        _candidates(argparse.Namespace(region=args.region, tag=args.tag, top_k=0)),
+        interval=args.interval, timeout=args.timeout, deadline=args.deadline, top_k=args.top_k,
+    )
+
+    def _ready(addresses: List[str]) -> None:
+        print(f"[OK] Best-mirror daemon listening on {', '.join(addresses)}", file=sys.stderr, flush=True)
+
+    try:
+        server.run(socket_path, port=port, ready=_ready)
+    except KeyboardInterrupt:
+        pass
+    except (OSError, RuntimeError) as e:
+        print(e if str(e).startswith("[ERROR]") else f"[ERROR] {e}", file=sys.stderr)
+        return 2
+    return 0
+
+
+def cmd_fleet(args: argparse.Namespace) -> int:
+    from . import fleet
+    progress = _progress(args)
+    envs = fleet.discover(args.root or fleet.default_roots(), include_system=not args.no_system)
+    if args.action == "discover":
+        payload = [fleet.asdict(env) for env in envs]
+        _emit(args, payload, "\n".join(f"{env.kind:<6} {env.prefix}  ({env.python})" for env in envs))
+        return 0
+    if args.action == "apply":
+        if args.mirror not in core.MIRRORS:
+            print(f"[ERROR] --mirror must be one of: {', '.join(core.MIRRORS)}", file=sys.stderr)
+            return 2
+        results = fleet.run_batch(envs, lambda env: fleet.apply_mirror(env, args.mirror, args.verify), args.workers, progress)
+    elif args.action == "reset":
+        results = fleet.run_batch(envs, lambda env: fleet.reset_mirror(env, args.verify), args.workers, progress)
+    else:
+        results = fleet.run_batch(envs, lambda env: fleet.audit(env, args.verify), args.workers, progress)
+    _emit(args, fleet.report_json(results), fleet.format_report(results))
+    return 0 if all(r.ok for r in results) else 1
+
+
+def cmd_proxy(args: argparse.Namespace) -> int:
+    from . import history, netfp, proxy
+    name = args.mirror
+    if name is None:
+        with history.HistoryStore() as store:
+            ranking = store.weighted_ranking(network=netfp.fingerprint())
+            name = next((n for n, ms in ranking if ms != float("inf") and n in core.MIRRORS), None)
+        name = name or core.current_mirror() or "tsinghua"
+    upstream = core.MIRRORS[name][0] if name in core.MIRRORS else name
+    server = proxy.CachingProxy(
+        upstream, cache_dir=args.cache_dir, host=args.bind, port=args.port,
+        max_bytes=int(args.max_size * 1024 ** 3), verbose=not args.quiet,
+    )
+    if args.point_pip:
+        with _quiet(args):
+            proxy.point_pip_at(server, args.scope)
+    print(f"[OK] Proxy for {upstream} listening on {server.index_url}", file=sys.stderr, flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+def cmd_failover(args: argparse.Namespace) -> int:
+    from . import failover
+    ranking, fp, cached = _network_ranking(args)
+    plan = failover.plan_from_ranking(ranking, fallbacks=args.fallbacks)
+    payload = {
+        "order": plan.order,
+        "timeouts": plan.timeouts,
+        "mode": args.mode,
+        "cached": cached,
+        "network": fp,
+    }
+    if args.mode == "config":
+        with _quiet(args):
+            failover.apply_config(
+                plan, args.scope, backend=args.backend, verify=args.verify,
+                timeout=plan.pip_timeout if args.pip_timeout == "auto" else args.pip_timeout,
+                retries=args.pip_retries,
+            )
+        _emit(args, payload, failover.format_plan(plan))
+        return 0
+    from . import proxy
+    server = proxy.CachingProxy(plan.upstreams, host=args.bind, port=args.port, verbose=not args.quiet)
+    with _quiet(args):
+        proxy.point_pip_at(server, args.scope)
+    payload["index_url"] = server.index_url
+    _emit(args, payload, failover.format_plan(plan) + f"\n[OK] Failover proxy listening on {server.index_url}")
+    sys.stdout.flush()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+def cmd_gui(_args: argparse.Namespace) -> int:
+    from .app import main as gui_main  # the only place Qt gets imported
+    return gui_main()
+
+
+def _timeout_arg(value: str) -> Union[float, str]:
+    return value if value == "auto" else float(value)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="pip_switcher", description="Switch pip mirrors without the GUI.")
+    parser.add_argument("--json", action="store_true", help="machine-readable JSON on stdout")
+    parser.add_argument("-q", "--quiet", action="store_true", help="no progress lines on stderr")
+    parser.add_argument("--trace", metavar="FILE", help="append timing spans to FILE as JSON lines")
+    parser.add_argument("--metrics-file", metavar="FILE", help="write OpenMetrics text to FILE on exit")
+    sub = parser.add_subparsers(dest="command")
+
+    def _scoped(p: argparse.ArgumentParser) -> None:
+        p.add_argument("--scope", choices=SCOPES, default="user")
+        p.add_argument("--backend", choices=("native", "subprocess"), default=None)
+        p.add_argument("--verify", action="store_true", help="read the result back through `pip config`")
+
+    def _filtered(p: argparse.ArgumentParser) -> None:
+        p.add_argument("--region", help="only mirrors in this region, e.g. cn")
+        p.add_argument("--tag", action="append", help="only mirrors with this tag (repeatable)")
+
+    p = sub.add_parser("list", help="list known mirrors")
+    _filtered(p)
+    p.set_defaults(func=cmd_list)
+    p = sub.add_parser("switch", help="point pip at a mirror")
+    p.add_argument("name")
+    _scoped(p)
+    p.set_defaults(func=cmd_switch)
+    p = sub.add_parser("reset", help="restore pip's default index")
+    _scoped(p)
+    p.set_defaults(func=cmd_reset)
+    p = sub.add_parser("show", help="show the effective pip index configuration")
+    p.add_argument("--backend", choices=("native", "subprocess"), default=None)
+    p.set_defaults(func=cmd_show)
+
+    p = sub.add_parser("bench", help="benchmark all mirrors")
+    p.add_argument(
+        "--mode", choices=("latency", "phases", "warm", "adaptive", "addresses", "throughput"), default="latency"
+    )
+    p.add_argument("--attempts", type=int, default=2)
+    p.add_argument("--timeout", type=float, default=3.5)
+    p.add_argument("--workers", type=int, default=8)
+    p.add_argument("--deadline", type=float, default=None)
+    _filtered(p)
+    p.add_argument("--top-k", type=int, default=0, help="only test the K mirrors that connect fastest (0 = all)")
+    p.set_defaults(func=cmd_bench)
+
+    p = sub.add_parser("recommend", help="recommend (and optionally apply) the fastest mirror")
+    _scoped(p)
+    p.add_argument("--apply", action="store_true")
+    p.add_argument("--ttl", type=float, default=15 * 60.0, help="reuse results for this network younger than this (s)")
+    p.add_argument("--timeout", type=float, default=3.5)
+    p.add_argument("--deadline", type=float, default=10.0)
+    p.add_argument("--per-address", action="store_true", help="probe every A/AAAA address of each mirror host")
+    _filtered(p)
+    p.add_argument("--top-k", type=int, default=8, help="only test the K mirrors that connect fastest (0 = all)")
+    p.set_defaults(func=cmd_recommend)
+
+    p = sub.add_parser("fresh", help="check how far each mirror lags behind on popular packages")
+    p.add_argument("--packages", help="comma-separated project names (default: a built-in hot list)")
+    p.add_argument("--timeout", type=float, default=5.0)
+    p.add_argument("--deadline", type=float, default=15.0)
+    p.set_defaults(func=cmd_fresh)
+
+    p = sub.add_parser("coverage", help="compare the full project lists of all mirrors (downloads tens of MB each)")
+    p.add_argument("--timeout", type=float, default=30.0)
+    p.add_argument("--workers", type=int, default=3)
+    p.add_argument("--refresh", action="store_true", help="revalidate cached project lists now")
+    p.set_defaults(func=cmd_coverage)
+
+    p = sub.add_parser("integrity", help="download sample files from every mirror and verify their SHA-256")
+    p.add_argument("--packages", help="comma-separated project names (default: a built-in hot list)")
+    p.add_argument("--files", type=int, default=1, help="files sampled per package")
+    p.add_argument("--max-mb", type=float, default=5.0, help="skip files larger than this")
+    p.add_argument("--rate", type=float, default=4.0, help="total bandwidth cap in MB/s (0 = none)")
+    p.add_argument("--workers", type=int, default=4)
+    p.add_argument("--timeout", type=float, default=30.0)
+    p.add_argument("--deadline", type=float, default=None)
+    p.set_defaults(func=cmd_integrity)
+
+    p = sub.add_parser("replay", help="time pip resolving/downloading a requirements file from every mirror")
+    p.add_argument("-r", "--requirements", required=True)
+    p.add_argument("--mode", choices=("download", "dry-run"), default="download")
+    p.add_argument("--workers", type=int, default=2, help="pip processes running at once")
+    p.add_argument("--timeout", type=float, default=900.0, help="per-mirror limit (s)")
+    p.add_argument("--deadline", type=float, default=None)
+    p.add_argument("--per-file", action="store_true", help="list per-file timings")
+    p.set_defaults(func=cmd_replay)
+
+    p = sub.add_parser("simbench", help="offline benchmark against local stand-in mirrors")
+    p.add_argument("--scenario", default="all", help="all, six, fifty-dead, lossy or bandwidth")
+    p.add_argument("--mode", choices=("latency", "phases", "adaptive", "throughput"), default=None,
+                   help="speed test to run (default: the scenario's own)")
+    p.add_argument("--repeat", type=int, default=3)
+    p.add_argument("--seed", type=int, default=1)
+    p.add_argument("--config", action="store_true", help="also time config writes in a temporary pip config")
+    p.add_argument("--iterations", type=int, default=20)
+    p.set_defaults(func=cmd_simbench)
+
+    p = sub.add_parser("monitor", help="watch the active mirror and auto-switch when it degrades")
+    p.add_argument("--scope", choices=SCOPES, default="user")
+    p.add_argument("--margin", type=float, default=0.5)
+    p.add_argument("--hold", type=float, default=300.0)
+    p.set_defaults(func=cmd_monitor)
+
+    p = sub.add_parser("metrics", help="serve OpenMetrics for mirror health, re-probing periodically")
+    p.add_argument("--bind", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=9464)
+    p.add_argument("--interval", type=float, default=60.0, help="seconds between probe passes")
+    p.add_argument("--timeout", type=float, default=3.5)
+    p.add_argument("--deadline", type=float, default=10.0)
+    p.set_defaults(func=cmd_metrics)
+
+    p = sub.add_parser("fleet", help="apply/reset/audit mirror settings across many venvs and interpreters")
+    p.add_argument("action", choices=("discover", "apply", "reset", "audit"))
+    p.add_argument("--root", action="append", help="directory to scan for venvs (repeatable)")
+    p.add_argument("--no-system", action="store_true", help="skip interpreters found on PATH")
+    p.add_argument("--mirror", help="mirror to apply (for `apply`)")
+    p.add_argument("--workers", type=int, default=16)
+    p.add_argument("--verify", action="store_true", help="check each environment with its own `pip config`")
+    p.set_defaults(func=cmd_fleet)
+
+    p = sub.add_parser("proxy", help="serve a local caching proxy of one mirror")
+    p.add_argument("--mirror", help="mirror name or simple index URL (default: best from history)")
+    p.add_argument("--bind", default="127.0.0.1", help="use 0.0.0.0 to share the cache with the LAN")
+    p.add_argument("--port", type=int, default=3141)
+    p.add_argument("--cache-dir", default=None)
+    p.add_argument("--max-size", type=float, default=2.0, help="cache size limit in GiB")
+    p.add_argument("--point-pip", action="store_true", help="configure pip to use the proxy")
+    p.add_argument("--scope", choices=SCOPES, default="user")
+    p.set_defaults(func=cmd_proxy)
+
+    p = sub.add_parser("daemon", help="keep a warm ranking and answer best-mirror queries over a socket")
+    p.add_argument("--socket", help="Unix socket path (default: daemon.sock in the app data directory)")
+    p.add_argument("--port", type=int, default=None, help="also serve HTTP on 127.0.0.1:PORT")
+    p.add_argument("--interval", type=float, default=300.0, help="seconds between background benchmarks")
+    p.add_argument("--timeout", type=float, default=3.5)
+    p.add_argument("--deadline", type=float, default=10.0)
+    p.add_argument("--top-k", type=int, default=8, help="only benchmark the K mirrors that connect fastest (0 = all)")
+    p.add_argument("--query", metavar="PATH", help="ask a running daemon instead, e.g. /best, /ranking, /refresh")
+    _filtered(p)
+    p.set_defaults(func=cmd_daemon)
+
+    p = sub.add_parser("failover", help="configure the fastest mirror plus ranked fallbacks")
+    _scoped(p)
+    p.add_argument("--mode", choices=("config", "proxy"), default="config",
+                   help="config: index-url + extra-index-url; proxy: local front end retrying the next mirror")
+    p.add_argument("--fallbacks", type=int, default=2)
+    p.add_argument("--pip-timeout", type=_timeout_arg, default=None,
+                   help="also set pip's global timeout (seconds, or 'auto' for the plan's largest)")
+    p.add_argument("--pip-retries", type=int, default=None, help="also set pip's global retries")
+    p.add_argument("--ttl", type=float, default=15 * 60.0, help="reuse results for this network younger than this (s)")
+    p.add_argument("--timeout", type=float, default=3.5)
+    p.add_argument("--deadline", type=float, default=10.0)
+    p.add_argument("--bind", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=3141)
+    p.set_defaults(func=cmd_failover)
+
+    sub.add_parser("gui", help="start the graphical interface").set_defaults(func=cmd_gui)
+    return parser
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    func = getattr(args, "func", cmd_gui)
+    if args.trace or args.metrics_file:
+        from . import telemetry
+        telemetry.configure(args.trace, args.metrics_file)
+    try:
+        return func(args)
+    except (RuntimeError, ValueError, OSError) as e:
+        print(str(e), file=sys.stderr)
+        return 1
+    finally:
+        if args.trace or args.metrics_file:
+            telemetry.flush()
@@ -1,21 +1,26 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 """
-Core logic: manage pip mirrors using `pip config`.
+Core logic: manage pip mirrors by editing pip's config files directly (see pipconf),
+with `pip config` subprocesses as a fallback and verification path.
 """
 from __future__ import annotations
+import configparser
+import json
+import os
 import subprocess
 import sys
-from typing import Dict, Tuple
+from typing import Dict, List, Optional, Tuple
 
-MIRRORS: Dict[str, Tuple[str, str]] = {
-    "tsinghua": ("https://pypi.tuna.tsinghua.edu.cn/simple", "pypi.tuna.tsinghua.edu.cn"),
-    "aliyun": ("https://mirrors.aliyun.com/pypi/simple", "mirrors.aliyun.com"),
-    "huawei": ("https://mirrors.huaweicloud.com/repository/pypi/simple", "repo.huaweicloud.com"),
-    "tencent": ("https://mirrors.cloud.tencent.com/pypi/simple", "mirrors.cloud.tencent.com"),
-    "ustc": ("https://pypi.mirrors.ustc.edu.cn/simple", "pypi.mirrors.ustc.edu.cn"),
-    "douban": ("https://pypi.doubanio.com/simple", "pypi.doubanio.com"),
-}
+from . import catalog, fsutil, pipconf, telemetry
+
+# "native" edits pip's config files in-process; "subprocess" shells out to `pip config`
+BACKEND = "native"
+
+# Bundled mirrors.json plus the user's mirrors.json/.toml; see catalog
+CATALOG = catalog.load()
+MIRRORS: Dict[str, Tuple[str, str]] = CATALOG.mirror_map()
+_INDEX = catalog.HostIndex(MIRRORS)
 
 
 def _scope_flag(scope: str) -> str:
@@ -26,11 +31,63 @@ def _scope_flag(scope: str) -> str:
 
 def _run_pip_config(args: list[str]) -> subprocess.CompletedProcess:
     cmd = [sys.executable, "-m", "pip", "config"] + args
-    return subprocess.run(cmd, capture_output=True, text=True)
+    with telemetry.span("pip_config", command=args[0]) as sp:
+        res = subprocess.run(cmd, capture_output=True, text=True)
+        sp.set(returncode=res.returncode)
+        # `unset` of a key that was never set fails harmlessly; do not count it
+        if res.returncode != 0 and args[0] != "unset":
+            sp.fail((res.stderr or res.stdout).strip() or f"exit status {res.returncode}")
+        return res
 
 
-def set_mirror(name: str, scope: str) -> None:
-    index_url, host = MIRRORS[name]
+def _verify(scope: str, expected: Dict[str, str | None]) -> bool:
+    """Ask pip itself to read back each key; None means the key must be unset."""
+    for key, value in expected.items():
+        res = _run_pip_config(["get", _scope_flag(scope), key])
+        got = res.stdout.strip() if res.returncode == 0 else None
+        if got != value:
+            return False
+    return True
+
+
+def _apply_native(scope: str, set_values: Dict[str, str], unset: list[str], verify: bool) -> bool:
+    """Write the change straight to pip's config file. Returns False if the caller should fall back."""
+    try:
+        with telemetry.span("config_write", scope=scope):
+            previous = pipconf.update(scope, set_values, unset)
+    except (OSError, configparser.Error) as e:
+        print(f"[WARN] Native config write failed ({e}); falling back to `pip config`.")
+        return False
+    if verify:
+        expected: Dict[str, str | None] = dict.fromkeys(unset)
+        expected.update(set_values)
+        if not _verify(scope, expected):
+            pipconf.rollback(scope, previous)
+            raise RuntimeError(f"[ERROR] pip did not read back the new settings from {pipconf.config_file(scope)}; rolled back.")
+    return True
+
+
+@telemetry.traced("set_index")
+def set_index(
+    index_url: str,
+    host: str,
+    scope: str,
+    label: str | None = None,
+    backend: str | None = None,
+    verify: bool = False,
+) -> None:
+    """
+    Point pip at any index URL (a mirror, a local proxy, ...). The native backend sets
+    index-url and trusted-host in one atomic file write; verify=True additionally checks
+    the result with `pip config get` and rolls back on mismatch.
+    """
+    _scope_flag(scope)
+    label = label or index_url
+    if (backend or BACKEND) == "native":
+        values = {"global.index-url": index_url, "global.trusted-host": host}
+        if _apply_native(scope, values, [], verify):
+            print(f"[OK] Switched pip to '{label}' mirror: {index_url} (scope={scope})")
+            return
     res1 = _run_pip_config(["set", _scope_flag(scope), "global.index-url", index_url])
     if res1.returncode != 0:
         msg = "[ERROR] Failed to set index-url:\n" + (res1.stderr or res1.stdout)
@@ -39,36 +96,184 @@ def set_mirror(name: str, scope: str) -> None:
     if res2.returncode != 0:
         # Warn only
         print("[WARN] Failed to set trusted-host (you may ignore if SSL works):\n" + (res2.stderr or res2.stdout))
-    print(f"[OK] Switched pip to '{name}' mirror: {index_url} (scope={scope})")
+    print(f"[OK] Switched pip to '{label}' mirror: {index_url} (scope={scope})")
+
+
+def set_mirror(name: str, scope: str, backend: str | None = None, verify: bool = False) -> None:
+    """Point pip at one of the MIRRORS (see set_index)."""
+    index_url, host = MIRRORS[name]
+    set_index(index_url, host, scope, label=name, backend=backend, verify=verify)
+
+
+@telemetry.traced("set_failover")
+def set_failover(
+    index_urls: List[str],
+    hosts: List[str],
+    scope: str,
+    timeout: float | None = None,
+    retries: int | None = None,
+    backend: str | None = None,
+    verify: bool = False,
+) -> None:
+    """
+    Primary index_urls[0] plus the rest as extra-index-url fallbacks. pip reads every
+    index and skips one that times out or errors, so an outage of a single mirror no
+    longer stalls installs. pip has a single timeout/retries pair for all indexes and
+    for every command, so they are only written when given; reset_mirror puts back
+    the values they replaced.
+    """
+    _scope_flag(scope)
+    if not index_urls:
+        raise ValueError("at least one index URL is required")
+    values = {"global.index-url": index_urls[0], "global.trusted-host": " ".join(hosts)}
+    unset: List[str] = []
+    if len(index_urls) > 1:
+        values["global.extra-index-url"] = " ".join(index_urls[1:])
+    else:
+        unset.append("global.extra-index-url")
+    tuning: Dict[str, str] = {}
+    if timeout is not None:
+        tuning["global.timeout"] = f"{timeout:g}"
+    if retries is not None:
+        tuning["global.retries"] = str(retries)
+    values.update(tuning)
+    path = pipconf.config_file(scope)
+    try:
+        previous = pipconf.read_file(path) if tuning else {}
+    except (OSError, configparser.Error):
+        previous = {}  # the write below reports the broken file
+    done = f"[OK] Switched pip to {index_urls[0]} with {len(index_urls) - 1} fallback(s) (scope={scope})"
+    if (backend or BACKEND) == "native" and _apply_native(scope, values, unset, verify):
+        remember_failover(path, tuning, previous)
+        print(done)
+        return
+    for key, value in values.items():
+        res = _run_pip_config(["set", _scope_flag(scope), key, value])
+        if res.returncode != 0:
+            raise RuntimeError(f"[ERROR] Failed to set {key}:\n" + (res.stderr or res.stdout))
+    for key in unset:
+        _run_pip_config(["unset", _scope_flag(scope), key])
+    remember_failover(path, tuning, previous)
+    print(done)
+
+
+# Keys written by set_mirror/set_failover and removed again by reset_mirror
+MIRROR_KEYS = ["global.index-url", "global.trusted-host", "global.extra-index-url"]
+
+
+def _failover_state_path() -> str:
+    """failover-tuning.json next to history.sqlite3: config file -> {key: [written, previous]}."""
+    from . import history  # keeps sqlite3 out of every CLI start
+
+    return os.path.join(os.path.dirname(history.default_path()), "failover-tuning.json")
 
 
-def reset_mirror(scope: str) -> None:
-    _run_pip_config(["unset", _scope_flag(scope), "global.index-url"])  # remove index-url
-    _run_pip_config(["unset", _scope_flag(scope), "global.trusted-host"])  # remove trusted-host
+def _load_failover_state() -> Dict[str, Dict[str, List[Optional[str]]]]:
+    try:
+        with open(_failover_state_path(), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def remember_failover(path: str, written: Dict[str, str], previous: Dict[str, str]) -> None:
+    """Record the timeout/retries set_failover wrote to path and the values they replaced."""
+    if not written:
+        return
+    state = _load_failover_state()
+    entry = state.setdefault(path, {})
+    for key, value in written.items():
+        old = entry.get(key)
+        # Writing twice must not lose the user's own value from before the first write
+        before = old[1] if old is not None and previous.get(key) == old[0] else previous.get(key)
+        entry[key] = [value, before]
+    fsutil.write_atomic(_failover_state_path(), json.dumps(state, indent=1), prefix=".failover-")
+
+
+def failover_undo(path: str) -> Tuple[Dict[str, str], List[str]]:
+    """
+    (values to set, keys to unset) that put back what set_failover's timeout/retries
+    replaced in the config file at path. A key changed since is the user's and is kept.
+    """
+    entry = _load_failover_state().get(path, {})
+    if not entry:
+        return {}, []
+    try:
+        current = pipconf.read_file(path)
+    except (OSError, configparser.Error):
+        return {}, []
+    restore: Dict[str, str] = {}
+    unset: List[str] = []
+    for key, (written, before) in entry.items():
+        if current.get(key) != written:
+            continue
+        if before is None:
+            unset.append(key)
+        else:
+            restore[key] = before
+    return restore, unset
+
+
+def forget_failover(path: str) -> None:
+    state = _load_failover_state()
+    if state.pop(path, None) is not None:
+        fsutil.write_atomic(_failover_state_path(), json.dumps(state, indent=1), prefix=".failover-")
+
+
+@telemetry.traced("reset_mirror")
+def reset_mirror(scope: str, backend: str | None = None, verify: bool = False) -> None:
+    _scope_flag(scope)
+    path = pipconf.config_file(scope)
+    restore, unset = failover_undo(path)
+    if (backend or BACKEND) == "native" and _apply_native(scope, restore, MIRROR_KEYS + unset, verify):
+        forget_failover(path)
+        print(f"[OK] Reset pip config to default (scope={scope})")
+        return
+    for key in MIRROR_KEYS + unset:
+        _run_pip_config(["unset", _scope_flag(scope), key])  # errors for keys that were never set are fine
+    for key, value in restore.items():
+        _run_pip_config(["set", _scope_flag(scope), key, value])
+    forget_failover(path)
     print(f"[OK] Reset pip config to default (scope={scope})")
 
 
-def show_config() -> None:
+def _list_config(backend: str | None = None) -> list[str] | None:
+    """`pip config list`-style lines, or None if the config could not be read."""
+    if (backend or BACKEND) == "native":
+        try:
+            return [f"{key}={value!r}" for key, value in pipconf.snapshot().items()]
+        except (OSError, configparser.Error):
+            pass
     res = _run_pip_config(["list"])
     if res.returncode != 0:
+        return None
+    return (res.stdout or "").splitlines()
+
+
+def show_config(backend: str | None = None) -> None:
+    lines = _list_config(backend)
+    if lines is None:
+        res = _run_pip_config(["list"])
         msg = "[ERROR] Failed to read pip config:\n" + (res.stderr or res.stdout)
         raise RuntimeError(msg)
-    lines = (res.stdout or "").splitlines()
     interesting = [
         l for l in lines if any(k in l for k in ["global.index-url", "global.trusted-host", "index-url", "trusted-host"])
     ]
-    print("\n".join(interesting) if interesting else res.stdout)
+    print("\n".join(interesting) if interesting else "\n".join(lines))
 
 
-def get_effective_index_url() -> str | None:
+def get_effective_index_url(backend: str | None = None, revalidate: bool = True) -> str | None:
     """Return the effective pip index-url if set, else None.
-    Parses `pip config list` output for any `index-url` entry.
+    The native backend applies pip's precedence (PIP_INDEX_URL, [install], [global]) over
+    a cached snapshot; revalidate=False answers from memory without touching the disk.
+    The subprocess backend parses `pip config list` output for the first `index-url` entry.
     """
-    res = _run_pip_config(["list"])
-    if res.returncode != 0:
-        return None
-    out = res.stdout or ""
-    for line in out.splitlines():
+    if (backend or BACKEND) == "native":
+        try:
+            return pipconf.snapshot(revalidate).index_url
+        except (OSError, configparser.Error):
+            pass
+    for line in _list_config("subprocess") or []:
         if "index-url" in line and "=" in line:
             # format like: global.index-url='https://...'
             val = line.split("=", 1)[1].strip()
@@ -76,3 +281,13 @@ def get_effective_index_url() -> str | None:
                 val = val[1:-1]
             return val
     return None
+
+
+def current_mirror(revalidate: bool = True) -> str | None:
+    """Name of the MIRRORS entry pip currently uses, or None (official/unknown)."""
+    return mirror_for_url(get_effective_index_url(revalidate=revalidate))
+
+
+def mirror_for_url(url: str | None) -> str | None:
+    """Name of the MIRRORS entry serving this index URL, or None."""
+    return _INDEX.lookup(url)
@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Opt-in project coverage audit (stdlib only).
+A full mirror's root /simple/ page lists 500k+ projects in tens of megabytes of HTML.
+Each mirror's page is streamed through an incremental scanner, never held in memory as
+a whole; project names become a sorted array of 64-bit hashes (8 bytes per project)
+and a gzip'd name list on disk. Sorted arrays are diffed by a linear merge to report
+projects a mirror is missing compared with the others.
+"""
+from __future__ import annotations
+import gzip
+import hashlib
+import heapq
+import json
+import os
+import re
+import threading
+import time
+import urllib.error
+import urllib.request
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from . import fsutil
+from .history import default_path
+from .speedtest import MirrorMap, completed_within
+
+CACHE_MAX_AGE = 24 * 3600.0  # reuse a cached set without asking the mirror
+MAX_NAMES = 50  # missing project names listed per mirror; the rest are only counted
+_CHUNK = 256 * 1024
+_CARRY = 4096  # longest partial tag kept between chunks
+_ANCHOR = re.compile(r"<a\b[^>]*>\s*([^<\s]+)\s*</a>", re.I)
+_HEADERS = {"User-Agent": "pip-mirror-switcher/1.0 (+https://python.org)", "Accept": "text/html"}
+_SEPARATORS = re.compile(r"[-_.]+")
+
+
+def _normalize(name: str) -> str:
+    return _SEPARATORS.sub("-", name).lower()
+
+
+def _hash(normalized: str) -> int:
+    return int.from_bytes(hashlib.blake2b(normalized.encode(), digest_size=8).digest(), "big")
+
+
+def name_hash(name: str) -> int:
+    """64-bit hash of a project name (normalised first)."""
+    return _hash(_normalize(name))
+
+
+def iter_project_names(chunks: Iterable[bytes]) -> Iterator[str]:
+    """
+    Yield anchor texts from a root simple page arriving in chunks. Only the unparsed
+    tail of the previous chunk (at most _CARRY bytes) is kept between chunks.
+    """
+    carry = ""
+    for chunk in chunks:
+        text = carry + chunk.decode("utf-8", "replace")
+        end = 0
+        for m in _ANCHOR.finditer(text):
+            yield m.group(1)
+            end = m.end()
+        carry = text[end:]
+        if len(carry) > _CARRY:
+            cut = carry.rfind("<")
+            carry = carry[cut:] if cut >= 0 and len(carry) - cut <= _CARRY else ""
+    for m in _ANCHOR.finditer(carry):
+        yield m.group(1)
+
+
+def _sorted_unique(buckets: List[array]) -> array:
+    """Concatenate 256 top-byte buckets, sorting one bucket at a time (low peak memory)."""
+    out = array("Q")
+    for bucket in buckets:
+        last = None
+        for value in sorted(bucket):
+            if value != last:
+                out.append(value)
+                last = value
+    return out
+
+
+@dataclass
+class ProjectSet:
+    """Sorted, de-duplicated project-name hashes of one mirror plus where its names are kept."""
+    hashes: array = field(default_factory=lambda: array("Q"))
+    names_path: Optional[str] = None  # gzip'd normalised names, one per line
+    fetched: float = 0.0
+    bytes_read: int = 0
+    error: Optional[str] = None
+
+    def __len__(self) -> int:
+        return len(self.hashes)
+
+
+def cache_dir() -> str:
+    return os.path.join(os.path.dirname(default_path()), "coverage")
+
+
+def _paths(directory: str, name: str) -> Tuple[str, str, str]:
+    base = os.path.join(directory, name)
+    return base + ".hashes", base + ".names.gz", base + ".json"
+
+
+def load_cached(name: str, directory: Optional[str] = None) -> Tuple[Optional[ProjectSet], Dict[str, object]]:
+    hashes_path, names_path, meta_path = _paths(directory or cache_dir(), name)
+    try:
+        with open(meta_path, encoding="utf-8") as f:
+            meta = json.load(f)
+        hashes = array("Q")
+        with open(hashes_path, "rb") as f:
+            hashes.frombytes(f.read())
+    except (OSError, ValueError):
+        return None, {}
+    return ProjectSet(hashes, names_path, float(meta.get("fetched", 0))), meta
+
+
+def fetch_project_set(
+    name: str,
+    index_url: str,
+    timeout: float = 30.0,
+    directory: Optional[str] = None,
+    max_age: float = CACHE_MAX_AGE,
+) -> ProjectSet:
+    """
+    Stream one mirror's root index into a ProjectSet, cached under directory. A cached set
+    younger than max_age is returned as is; an older one is revalidated with
+    ETag/Last-Modified. Never raises; failures set ProjectSet.error.
+    """
+    directory = directory or cache_dir()
+    os.makedirs(directory, exist_ok=True)
+    hashes_path, names_path, meta_path = _paths(directory, name)
+    cached, meta = load_cached(name, directory)
+    if cached is not None and meta.get("url") == index_url and time.time() - cached.fetched < max_age:
+        return cached
+    headers = dict(_HEADERS)
+    if cached is not None and meta.get("url") == index_url:
+        if meta.get("etag"):
+            headers["If-None-Match"] = str(meta["etag"])
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = str(meta["last_modified"])
+    url = index_url.rstrip("/") + "/"
+    result = ProjectSet(names_path=names_path, fetched=time.time())
+    tmp_names = names_path + ".part"
+    try:
+        with urllib.request.urlopen(urllib.request.Request(url, headers=headers), timeout=timeout) as resp:
+            buckets = [array("Q") for _ in range(256)]
+
+            def _chunks() -> Iterator[bytes]:
+                while True:
+                    chunk = resp.read(_CHUNK)
+                    if not chunk:
+                        return
+                    result.bytes_read += len(chunk)
+                    yield chunk
+
+            with gzip.open(tmp_names, "wt", encoding="utf-8", compresslevel=1) as names:
+                for project in iter_project_names(_chunks()):
+                    normalized = _normalize(project)
+                    names.write(normalized + "\n")
+                    h = _hash(normalized)
+                    buckets[h >> 56].append(h)
+            result.hashes = _sorted_unique(buckets)
+            del buckets
+            if not result.hashes:
+                raise ValueError("no projects found on the root index page")
+            os.replace(tmp_names, names_path)
+            fsutil.write_atomic(hashes_path, result.hashes.tobytes(), prefix=".coverage-")
+            fsutil.write_atomic(meta_path, json.dumps({
+                "url": index_url, "fetched": result.fetched, "count": len(result.hashes),
+                "etag": resp.headers.get("ETag"), "last_modified": resp.headers.get("Last-Modified"),
+            }), prefix=".coverage-")
+    except urllib.error.HTTPError as e:
+        if e.code == 304 and cached is not None:
+            meta["fetched"] = time.time()
+            fsutil.write_atomic(meta_path, json.dumps(meta), prefix=".coverage-")
+            cached.fetched = float(meta["fetched"])
+            return cached
+        result.error = str(e)
+    except (OSError, urllib.error.URLError, ValueError) as e:
+        result.error = str(e) or type(e).__name__
+    finally:
+        if os.path.exists(tmp_names):
+            os.unlink(tmp_names)
+    return result
+
+
+def _union(sets: Iterable[array]) -> Iterator[int]:
+    last = None
+    for value in heapq.merge(*sets):
+        if value != last:
+            yield value
+            last = value
+
+
+def missing_from(own: array, reference: Iterable[int]) -> array:
+    """Hashes in the sorted reference stream that the sorted array own lacks (linear merge)."""
+    out = array("Q")
+    i, n = 0, len(own)
+    for value in reference:
+        while i < n and own[i] < value:
+            i += 1
+        if i >= n or own[i] != value:
+            out.append(value)
+    return out
+
+
+def _resolve_names(wanted: Set[int], names_paths: Iterable[str]) -> Dict[int, str]:
+    """Map hashes back to names by streaming the cached name lists."""
+    found: Dict[int, str] = {}
+    for path in names_paths:
+        if len(found) == len(wanted):
+            break
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                for line in f:
+                    name = line.rstrip("\n")
+                    h = _hash(name)  # the lists hold normalised names already
+                    if h in wanted and h not in found:
+                        found[h] = name
+        except OSError:
+            continue
+    return found
+
+
+@dataclass
+class Coverage:
+    """One mirror's coverage compared with the union of the other mirrors."""
+    projects: int = 0
+    missing_count: int = 0
+    missing: List[str] = field(default_factory=list)  # up to MAX_NAMES examples
+    error: Optional[str] = None
+
+
+def audit_coverage(
+    mirrors: MirrorMap,
+    timeout: float = 30.0,
+    progress: Optional[Callable[[str], None]] = None,
+    max_workers: int = 3,
+    directory: Optional[str] = None,
+    max_age: float = CACHE_MAX_AGE,
+    cancel: Optional[threading.Event] = None,
+) -> List[Tuple[str, Coverage]]:
+    """
+    Fetch (or reuse) every mirror's project set and report, per mirror, the projects
+    listed by another mirror but not by it. Sorted most complete first. max_workers is
+    small because each root page is tens of megabytes. Setting cancel raises
+    speedtest.Cancelled.
+    """
+    sets: Dict[str, ProjectSet] = {}
+    if progress:
+        for name in mirrors:
+            progress(f"正在读取 {name} 源的项目索引…")
+    pool = ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(mirrors) or 1)), thread_name_prefix="coverage")
+    futures = {
+        pool.submit(fetch_project_set, name, url, timeout, directory, max_age): name
+        for name, (url, _host) in mirrors.items()
+    }
+    try:
+        for fut in completed_within(futures, None, cancel):
+            name = futures[fut]
+            sets[name] = fut.result()
+            if progress:
+                ps = sets[name]
+                progress(f"{name} 源测试完成：" + (f"{len(ps)} 个项目" if ps.error is None else "超时/失败"))
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+    ok = {name: ps for name, ps in sets.items() if ps.error is None}
+    report: Dict[str, Coverage] = {}
+    wanted: Set[int] = set()
+    missing_by: Dict[str, array] = {}
+    for name in mirrors:
+        ps = sets[name]
+        if ps.error is not None:
+            report[name] = Coverage(error=ps.error)
+            continue
+        others = [o.hashes for other, o in ok.items() if other != name]
+        missing_by[name] = missing_from(ps.hashes, _union(others))
+        report[name] = Coverage(len(ps), len(missing_by[name]))
+        wanted.update(missing_by[name][:MAX_NAMES])
+    names = _resolve_names(wanted, [ps.names_path for ps in ok.values() if ps.names_path])
+    for name, missing in missing_by.items():
+        report[name].missing = sorted(names.get(h, f"#{h:016x}") for h in missing[:MAX_NAMES])
+    results = [(name, report[name]) for name in mirrors]
+    results.sort(key=lambda x: (x[1].error is not None, x[1].missing_count))
+    return results
+
+
+def format_coverage(results: List[Tuple[str, Coverage]]) -> str:
+    lines = ["项目覆盖情况（与其他镜像的并集相比）："]
+    for i, (name, cov) in enumerate(results, 1):
+        if cov.error is not None:
+            lines.append(f"{i:>2}. {name:<8}  超时/失败")
+            continue
+        line = f"{i:>2}. {name:<8}  {cov.projects} 个项目，缺少 {cov.missing_count} 个"
+        if cov.missing:
+            more = " …" if cov.missing_count > len(cov.missing) else ""
+            line += "：" + ", ".join(cov.missing) + more
+        lines.append(line)
+    return "\n".join(lines)
@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Best-mirror daemon: keeps a warm mirror ranking in memory and answers "which mirror
+now?" over a Unix domain socket and/or loopback HTTP, for build scripts and Dockerfile
+generators that cannot wait for a benchmark.
+Both transports speak plain HTTP/1.1 (keep-alive), so `curl --unix-socket` works:
+  GET /best     best mirror, index URL and trusted host
+  GET /ranking  the same plus every ranked mirror
+  GET /healthz  liveness, age of the ranking, whether a refresh is running
+  POST /refresh start a benchmark now
+Answers are encoded once per refresh, so a query costs one dict lookup and a write.
+The ranking starts from this network's saved history and is refreshed with speedtest on
+a background thread every `interval` seconds; one asyncio loop serves all clients.
+"""
+from __future__ import annotations
+import asyncio
+import contextlib
+import http.client
+import json
+import os
+import signal
+import socket
+import stat
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from . import catalog, core, history, netfp, speedtest, telemetry
+
+DEFAULT_PORT = 3142
+DEFAULT_INTERVAL = 300.0
+_REASONS = {200: "OK", 202: "Accepted", 404: "Not Found", 405: "Method Not Allowed", 503: "Service Unavailable"}
+
+
+def default_socket_path() -> str:
+    """daemon.sock next to history.sqlite3."""
+    return os.path.join(os.path.dirname(history.default_path()), "daemon.sock")
+
+
+def unix_sockets_supported() -> bool:
+    return hasattr(socket, "AF_UNIX") and hasattr(asyncio, "start_unix_server")
+
+
+def _encode(payload: Dict[str, Any]) -> bytes:
+    return json.dumps(payload, ensure_ascii=False).encode("utf-8")
+
+
+@dataclass(frozen=True)
+class Snapshot:
+    """One published ranking with its pre-encoded answers. Replaced, never mutated."""
+    ranking: List[Tuple[str, float]]
+    source: str  # none | history | benchmark
+    network: Optional[str]
+    updated: Optional[float]
+    best_body: bytes
+    ranking_body: bytes
+
+    @property
+    def ready(self) -> bool:
+        return any(ms != float("inf") for _name, ms in self.ranking)
+
+
+def make_snapshot(
+    ranking: List[Tuple[str, float]],
+    mirrors: catalog.MirrorMap,
+    source: str = "none",
+    network: Optional[str] = None,
+    updated: Optional[float] = None,
+) -> Snapshot:
+    ranking = [(name, ms) for name, ms in ranking if name in mirrors]
+    best = next((name for name, ms in ranking if ms != float("inf")), None)
+    head: Dict[str, Any] = {
+        "best": best,
+        "index_url": mirrors[best][0] if best else None,
+        "trusted_host": mirrors[best][1] if best else None,
+        "source": source,
+        "network": network,
+        "updated": updated,
+    }
+    rows = [
+        {"name": name, "ms": None if ms == float("inf") else round(ms, 1),
+         "index_url": mirrors[name][0], "trusted_host": mirrors[name][1]}
+        for name, ms in ranking
+    ]
+    return Snapshot(ranking, source, network, updated, _encode(head), _encode(dict(head, ranking=rows)))
+
+
+class BestMirrorDaemon:
+    """
+    - interval: seconds between background benchmarks
+    - top_k: mirrors fully benchmarked after the TCP-connect prefilter (see catalog)
+    """
+
+    def __init__(
+        self,
+        mirrors: Optional[catalog.MirrorMap] = None,
+        interval: float = DEFAULT_INTERVAL,
+        timeout: float = 3.5,
+        deadline: float = 10.0,
+        top_k: int = catalog.PREFILTER_K,
+        history_path: Optional[str] = None,
+    ) -> None:
+        self.mirrors = dict(mirrors if mirrors is not None else core.MIRRORS)
+        self.interval = interval
+        self.timeout = timeout
+        self.deadline = deadline
+        self.top_k = top_k
+        self.history_path = history_path
+        self.snapshot = make_snapshot([], self.mirrors)
+        self.refreshing = False
+        self.started = time.time()
+        self._wake: Optional[asyncio.Event] = None
+        self._cancel = threading.Event()
+
+    # --- ranking (executor threads) ---
+    def warm_start(self) -> None:
+        """Publish the ranking last measured on this network, if any, before the first refresh."""
+        fp = netfp.fingerprint()
+        with history.HistoryStore(self.history_path) as store:
+            ts, ranking = store.network_ranking(fp)
+        if ranking and self.snapshot.source == "none":
+            self.snapshot = make_snapshot(ranking, self.mirrors, "history", fp, ts)
+
+    def refresh(self) -> None:
+        """Benchmark now and publish the result (the swap is a single reference assignment)."""
+        self.refreshing = True
+        try:
+            with telemetry.span("daemon_refresh", mirrors=len(self.mirrors)) as sp:
+                candidates = catalog.prefilter(self.mirrors, self.top_k, cancel=self._cancel)
+                ranking = speedtest.benchmark_mirrors(
+                    candidates, timeout=self.timeout, deadline=self.deadline, cancel=self._cancel
+                )
+                fp = netfp.fingerprint()
+                with history.HistoryStore(self.history_path) as store:
+                    store.record(ranking, network=fp)
+                    store.save_network_ranking(fp, ranking)
+                self.snapshot = make_snapshot(ranking, self.mirrors, "benchmark", fp, time.time())
+                sp.set(best=next((n for n, ms in ranking if ms != float("inf")), None))
+        finally:
+            self.refreshing = False
+
+    async def _refresher(self, wake: asyncio.Event) -> None:
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(None, self.warm_start)
+        except Exception as e:
+            print(f"[WARN] Could not load the saved ranking: {e}", file=sys.stderr)
+        wake.clear()  # the first refresh is about to start anyway
+        while True:
+            try:
+                await loop.run_in_executor(None, self.refresh)
+            except speedtest.Cancelled:
+                return
+            except Exception as e:
+                print(f"[WARN] Mirror refresh failed: {e}", file=sys.stderr)
+            # A POST /refresh that came in during the run leaves wake set: go round again at once
+            try:
+                await asyncio.wait_for(wake.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            wake.clear()
+
+    # --- requests (event loop) ---
+    def route(self, method: str, path: str) -> Tuple[int, bytes]:
+        snap = self.snapshot
+        path = path.split("?", 1)[0].rstrip("/") or "/"
+        if path == "/refresh":
+            if method != "POST":
+                return 405, _encode({"error": "use POST"})
+            if self._wake is not None:
+                self._wake.set()
+            return 202, _encode({"refreshing": True})
+        if method not in ("GET", "HEAD"):
+            return 405, _encode({"error": "use GET"})
+        if path in ("/", "/best"):
+            return (200 if snap.ready else 503), snap.best_body
+        if path == "/ranking":
+            return (200 if snap.ready else 503), snap.ranking_body
+        if path == "/healthz":
+            age = time.time() - snap.updated if snap.updated else None
+            return 200, _encode({
+                "ok": True, "ready": snap.ready, "source": snap.source, "refreshing": self.refreshing,
+                "age_s": round(age, 1) if age is not None else None, "uptime_s": round(time.time() - self.started, 1),
+            })
+        return 404, _encode({"error": f"unknown path {path}"})
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                headers: Dict[str, str] = {}
+                while True:
+                    raw = await reader.readline()
+                    if raw in (b"\r\n", b"\n", b""):
+                        break
+                    key, _, value = raw.decode("latin-1").partition(":")
+                    headers[key.strip().lower()] = value.strip()
+                parts = line.decode("latin-1").split()
+                if len(parts) != 3:
+                    break
+                method, target, version = parts
+                length = int(headers.get("content-length") or 0)
+                if length:
+                    await reader.readexactly(length)
+                status, body = self.route(method, target)
+                keep = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                head = (
+                    f"HTTP/1.1 {status} {_REASONS.get(status, '')}\r\n"
+                    f"Content-Type: application/json; charset=utf-8\r\n"
+                    f"Content-Length: {len(body)}\r\n"
+                    f"Cache-Control: no-store\r\n"
+                    f"Connection: {'keep-alive' if keep else 'close'}\r\n\r\n"
+                ).encode("latin-1")
+                writer.write(head if method == "HEAD" else head + body)
+                await writer.drain()
+                if not keep:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass  # client went away, or sent a line over the reader's limit
+        finally:
+            writer.close()
+
+    async def serve(
+        self,
+        socket_path: Optional[str] = None,
+        host: str = "127.0.0.1",
+        port: Optional[int] = None,
+        ready: Optional[Callable[[List[str]], None]] = None,
+    ) -> None:
+        """Listen until cancelled. ready(addresses) is called once the sockets are bound."""
+        self._wake = asyncio.Event()
+        servers: List[asyncio.AbstractServer] = []
+        addresses: List[str] = []
+        try:
+            if socket_path:
+                _claim_socket_path(socket_path)
+                servers.append(await asyncio.start_unix_server(self._handle, path=socket_path, backlog=512))
+                os.chmod(socket_path, 0o600)
+                addresses.append(f"unix:{socket_path}")
+            if port is not None:
+                server = await asyncio.start_server(self._handle, host, port, backlog=512)
+                servers.append(server)
+                addresses.append(f"http://{host}:{server.sockets[0].getsockname()[1]}")
+            if ready:
+                ready(addresses)
+            refresher = asyncio.create_task(self._refresher(self._wake))
+            try:
+                await asyncio.gather(*(s.serve_forever() for s in servers))
+            finally:
+                self._cancel.set()
+                refresher.cancel()
+        finally:
+            for s in servers:
+                s.close()
+            if socket_path and os.path.exists(socket_path):
+                os.unlink(socket_path)
+
+    def run(self, socket_path: Optional[str] = None, host: str = "127.0.0.1", port: Optional[int] = None,
+            ready: Optional[Callable[[List[str]], None]] = None) -> None:
+        """Blocking serve(); SIGTERM (service managers) stops it as cleanly as Ctrl+C."""
+        async def _main() -> None:
+            main = asyncio.current_task()
+            with contextlib.suppress(NotImplementedError, RuntimeError, ValueError, AttributeError):
+                asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, main.cancel)  # type: ignore[union-attr]
+            await self.serve(socket_path, host, port, ready)
+
+        with contextlib.suppress(asyncio.CancelledError):
+            asyncio.run(_main())
+
+
+def _claim_socket_path(path: str) -> None:
+    """Remove a stale socket file; refuse if another daemon still answers on it."""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    if not os.path.exists(path):
+        return
+    if not stat.S_ISSOCK(os.stat(path).st_mode):
+        raise RuntimeError(f"[ERROR] {path} exists and is not a socket.")
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(path)
+    except OSError:
+        os.unlink(path)  # left behind by a daemon that died
+        return
+    finally:
+        probe.close()
+    raise RuntimeError(f"[ERROR] A daemon is already listening on {path}.")
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path: str, timeout: float) -> None:
+        super().__init__("localhost", timeout=timeout)
+        self.path = path
+
+    def connect(self) -> None:
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.path)
+
+
+def query(
+    path: str = "/best",
+    socket_path: Optional[str] = None,
+    host: str = "127.0.0.1",
+    port: int = DEFAULT_PORT,
+    method: str = "GET",
+    timeout: float = 2.0,
+) -> Tuple[int, Dict[str, Any]]:
+    """(status, JSON answer) from a running daemon; raises OSError if none is listening."""
+    if socket_path:
+        conn: http.client.HTTPConnection = _UnixHTTPConnection(socket_path, timeout)
+    else:
+        conn = http.client.HTTPConnection(host, port, timeout=timeout)
+    try:
+        conn.request(method, path)
+        resp = conn.getresponse()
+        return resp.status, json.loads(resp.read() or b"{}")
+    finally:
+        conn.close()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Multi-mirror failover built from a speed-test ranking.
+The fastest reachable mirror becomes the primary and the next ones its fallbacks, each
+with a timeout derived from its measured latency. A plan can be written to pip's config
+(index-url + extra-index-url) or served by the local proxy, which retries the next
+mirror on a timeout or 5xx.
+"""
+from __future__ import annotations
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from . import core
+from .speedtest import MirrorMap
+
+DEFAULT_FALLBACKS = 2
+TIMEOUT_FACTOR = 5.0  # timeout = measured latency x factor, clamped below
+MIN_TIMEOUT = 3.0
+MAX_TIMEOUT = 15.0  # pip's own default timeout
+
+
+def timeout_for(ms: float, factor: float = TIMEOUT_FACTOR) -> float:
+    """Seconds to wait on a mirror whose probe took ms milliseconds."""
+    if ms == float("inf"):
+        return MAX_TIMEOUT
+    return round(min(MAX_TIMEOUT, max(MIN_TIMEOUT, ms * factor / 1000.0)), 1)
+
+
+@dataclass
+class FailoverPlan:
+    order: List[str]  # primary first
+    timeouts: Dict[str, float] = field(default_factory=dict)  # seconds per mirror
+    mirrors: MirrorMap = field(default_factory=lambda: core.MIRRORS, repr=False)
+
+    @property
+    def primary(self) -> str:
+        return self.order[0]
+
+    @property
+    def fallbacks(self) -> List[str]:
+        return self.order[1:]
+
+    @property
+    def upstreams(self) -> List[Tuple[str, float]]:
+        """(index URL, timeout) in failover order, as taken by proxy.CachingProxy."""
+        return [(self.mirrors[name][0], self.timeouts[name]) for name in self.order]
+
+    @property
+    def pip_timeout(self) -> float:
+        """pip has one timeout for every index: the largest one keeps all chosen mirrors usable."""
+        return max(self.timeouts[name] for name in self.order)
+
+
+def plan_from_ranking(
+    ranking: List[Tuple[str, float]],
+    mirrors: Optional[MirrorMap] = None,
+    fallbacks: int = DEFAULT_FALLBACKS,
+    factor: float = TIMEOUT_FACTOR,
+) -> FailoverPlan:
+    """
+    Build a plan from a (name, ms) ranking such as speedtest.benchmark_mirrors returns.
+    Failed mirrors are left out; raises RuntimeError when none was reachable.
+    """
+    mirrors = mirrors if mirrors is not None else core.MIRRORS
+    usable = sorted(
+        ((name, ms) for name, ms in ranking if ms != float("inf") and name in mirrors), key=lambda x: x[1]
+    )
+    if not usable:
+        raise RuntimeError("[ERROR] No reachable mirror in the ranking; cannot build a failover plan.")
+    chosen = usable[: 1 + max(0, fallbacks)]
+    return FailoverPlan([name for name, _ in chosen], {name: timeout_for(ms, factor) for name, ms in chosen}, mirrors)
+
+
+def apply_config(
+    plan: FailoverPlan,
+    scope: str,
+    backend: Optional[str] = None,
+    verify: bool = False,
+    timeout: Optional[float] = None,
+    retries: Optional[int] = None,
+) -> None:
+    """
+    Write the plan as index-url + extra-index-url into pip's config. pip's timeout and
+    retries apply to every command, so they are written only when given (plan.pip_timeout
+    is a suitable timeout).
+    """
+    core.set_failover(
+        [plan.mirrors[name][0] for name in plan.order],
+        [plan.mirrors[name][1] for name in plan.order],
+        scope,
+        timeout=timeout,
+        retries=retries,
+        backend=backend,
+        verify=verify,
+    )
+
+
+def format_plan(plan: FailoverPlan) -> str:
+    lines = ["故障转移顺序："]
+    for i, name in enumerate(plan.order):
+        role = "主源" if i == 0 else f"备用 {i}"
+        lines.append(f"{role:<6} {name:<10} 超时 {plan.timeouts[name]:g}s  {plan.mirrors[name][0]}")
+    return "\n".join(lines)
@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Fleet mode: discover many interpreters and virtual environments on a host and apply,
+reset or audit their mirror settings in parallel.
+Changes target each environment's site-scope file (<prefix>/pip.conf), which is what
+`<env python> -m pip config --site` edits, so every venv can be configured on its own.
+"""
+from __future__ import annotations
+import configparser
+import glob
+import json
+import os
+import subprocess
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from typing import Callable, Dict, Iterable, List, Optional
+
+from . import core, fsutil, pipconf
+from .history import default_path
+
+WINDOWS = pipconf.WINDOWS
+DEFAULT_MAX_DEPTH = 4
+# Directories never worth descending into while looking for venvs
+_SKIP_DIRS = {".git", "node_modules", "__pycache__", "site-packages", ".tox", ".nox", ".mypy_cache"}
+
+
+@dataclass
+class Environment:
+    python: str  # interpreter path
+    prefix: str  # sys.prefix of that interpreter (site config lives here)
+    kind: str  # "venv" or "system"
+
+
+@dataclass
+class FleetResult:
+    env: Environment
+    ok: bool
+    index_url: Optional[str] = None
+    detail: str = ""
+
+
+def _venv_python(prefix: str) -> Optional[str]:
+    candidates = (
+        [os.path.join(prefix, "Scripts", "python.exe")]
+        if WINDOWS
+        else [os.path.join(prefix, "bin", "python3"), os.path.join(prefix, "bin", "python")]
+    )
+    return next((c for c in candidates if os.path.exists(c)), None)
+
+
+def _has_stdlib(prefix: str) -> bool:
+    if WINDOWS:
+        return os.path.exists(os.path.join(prefix, "Lib", "os.py"))
+    return bool(glob.glob(os.path.join(prefix, "lib", "python3*", "os.py")))
+
+
+def _scan_root(root: str, max_depth: int) -> Dict[str, object]:
+    """Walk one root; return {"dirs": {dir: mtime_ns}, "envs": [Environment dicts]}."""
+    dirs: Dict[str, int] = {}
+    envs: List[Dict[str, str]] = []
+    root = os.path.abspath(os.path.expanduser(root))
+    base_depth = root.rstrip(os.sep).count(os.sep)
+    for current, subdirs, files in os.walk(root):
+        try:
+            dirs[current] = os.stat(current).st_mtime_ns
+        except OSError:
+            continue
+        if "pyvenv.cfg" in files:
+            python = _venv_python(current)
+            if python:
+                envs.append(asdict(Environment(python, current, "venv")))
+            subdirs[:] = []  # a venv does not contain further venvs
+            continue
+        python = _venv_python(current)
+        if python and _has_stdlib(current):
+            # A standalone installation (e.g. a pyenv version): its prefix is this directory
+            envs.append(asdict(Environment(python, current, "system")))
+            subdirs[:] = []
+            continue
+        if current.count(os.sep) - base_depth >= max_depth:
+            subdirs[:] = []
+        else:
+            subdirs[:] = [d for d in subdirs if d not in _SKIP_DIRS and not os.path.islink(os.path.join(current, d))]
+    return {"dirs": dirs, "envs": envs}
+
+
+def _root_is_fresh(entry: Dict[str, object]) -> bool:
+    """A cached scan is valid while every directory it visited keeps its mtime."""
+    for path, mtime in entry.get("dirs", {}).items():  # type: ignore[union-attr]
+        try:
+            if os.stat(path).st_mtime_ns != mtime:
+                return False
+        except OSError:
+            return False
+    return True
+
+
+def _system_pythons() -> List[Environment]:
+    """Interpreters on PATH (python, python3, python3.X), deduplicated by real path."""
+    seen: Dict[str, Environment] = {}
+    pattern = "python*.exe" if WINDOWS else "python*"
+    for directory in os.environ.get("PATH", "").split(os.pathsep):
+        for path in glob.glob(os.path.join(directory, pattern)):
+            name = os.path.basename(path)
+            stem = name[:-4] if name.endswith(".exe") else name
+            if stem not in ("python", "python3") and not (stem.startswith("python3.") and stem[8:].isdigit()):
+                continue
+            if not os.access(path, os.X_OK):
+                continue
+            real = os.path.realpath(path)
+            if real in seen:
+                continue
+            bindir = os.path.dirname(real)
+            prefix = bindir if WINDOWS else os.path.dirname(bindir)
+            if os.path.exists(os.path.join(prefix, "pyvenv.cfg")):
+                continue  # an activated venv; found via roots instead
+            if not _has_stdlib(prefix):
+                continue  # launcher shims (pyenv, asdf) whose real prefix is elsewhere
+            seen[real] = Environment(real, prefix, "system")
+    return list(seen.values())
+
+
+def inventory_path() -> str:
+    return os.path.join(os.path.dirname(default_path()), "fleet_inventory.json")
+
+
+def discover(
+    roots: Iterable[str],
+    include_system: bool = True,
+    max_depth: int = DEFAULT_MAX_DEPTH,
+    cache_path: Optional[str] = None,
+) -> List[Environment]:
+    """
+    Find venvs under `roots` (plus interpreters on PATH). Each root's scan is cached
+    on disk and reused until one of the directories it visited changes mtime.
+    """
+    cache_path = cache_path or inventory_path()
+    try:
+        with open(cache_path, encoding="utf-8") as f:
+            cache: Dict[str, Dict[str, object]] = json.load(f)
+    except (OSError, ValueError):
+        cache = {}
+    changed = False
+    envs: List[Environment] = []
+    for root in roots:
+        key = os.path.abspath(os.path.expanduser(root))
+        entry = cache.get(key)
+        if entry is None or not _root_is_fresh(entry):
+            entry = _scan_root(key, max_depth)
+            cache[key] = entry
+            changed = True
+        envs.extend(Environment(**e) for e in entry["envs"])  # type: ignore[union-attr]
+    if changed:
+        try:
+            fsutil.write_atomic(cache_path, json.dumps(cache), prefix=".fleet-")
+        except OSError:
+            pass  # the cache is only an optimisation
+    if include_system:
+        envs.extend(_system_pythons())
+    unique: Dict[str, Environment] = {}
+    for env in envs:
+        unique.setdefault(os.path.realpath(env.prefix), env)
+    return list(unique.values())
+
+
+def _pip_config_get(env: Environment, key: str) -> Optional[str]:
+    res = subprocess.run(
+        [env.python, "-m", "pip", "config", "--site", "get", key], capture_output=True, text=True, timeout=60
+    )
+    return res.stdout.strip() if res.returncode == 0 else None
+
+
+def apply_mirror(env: Environment, name: str, verify: bool = False) -> FleetResult:
+    index_url, host = core.MIRRORS[name]
+    previous = pipconf.update("site", {"global.index-url": index_url, "global.trusted-host": host}, prefix=env.prefix)
+    if verify and _pip_config_get(env, "global.index-url") != index_url:
+        pipconf.rollback("site", previous, prefix=env.prefix)
+        return FleetResult(env, False, detail="pip did not read back the new index-url; rolled back")
+    return FleetResult(env, True, index_url, f"-> {name}")
+
+
+def reset_mirror(env: Environment, verify: bool = False) -> FleetResult:
+    path = pipconf.config_file("site", env.prefix)
+    restore, unset = core.failover_undo(path)
+    previous = pipconf.update("site", restore, core.MIRROR_KEYS + unset, prefix=env.prefix)
+    if verify and _pip_config_get(env, "global.index-url") is not None:
+        pipconf.rollback("site", previous, prefix=env.prefix)
+        return FleetResult(env, False, detail="index-url still set after reset; rolled back")
+    core.forget_failover(path)
+    return FleetResult(env, True, pipconf.snapshot_for(env.prefix).index_url, "reset")
+
+
+def audit(env: Environment, verify: bool = False) -> FleetResult:
+    """Report the index-url pip in this environment would use (verify=True asks pip itself)."""
+    if verify:
+        url = _pip_config_get(env, "global.index-url")
+    else:
+        url = pipconf.snapshot_for(env.prefix).index_url
+    mirror = core.mirror_for_url(url)
+    return FleetResult(env, True, url, mirror or ("official" if not url else "custom"))
+
+
+def run_batch(
+    envs: List[Environment],
+    op: Callable[[Environment], FleetResult],
+    max_workers: int = 16,
+    progress: Optional[Callable[[str], None]] = None,
+) -> List[FleetResult]:
+    """Run op over every environment on a worker pool; one result per environment, in input order."""
+    def _safe(env: Environment) -> FleetResult:
+        try:
+            result = op(env)
+        except (OSError, ValueError, configparser.Error, subprocess.SubprocessError) as e:
+            # A malformed pip.conf in one environment must not abort the rest of the batch
+            result = FleetResult(env, False, detail=str(e) or type(e).__name__)
+        if progress:
+            progress(f"{'OK ' if result.ok else 'ERR'} {env.prefix}: {result.detail}")
+        return result
+
+    if not envs:
+        return []
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(envs))), thread_name_prefix="fleet") as pool:
+        return list(pool.map(_safe, envs))
+
+
+def format_report(results: List[FleetResult]) -> str:
+    ok = sum(r.ok for r in results)
+    lines = [f"共 {len(results)} 个环境，成功 {ok}，失败 {len(results) - ok}:"]
+    for r in results:
+        status = "OK " if r.ok else "ERR"
+        lines.append(f"[{status}] {r.env.kind:<6} {r.env.prefix}  {r.index_url or '-'}  {r.detail}")
+    return "\n".join(lines)
+
+
+def report_json(results: List[FleetResult]) -> List[Dict[str, object]]:
+    return [dict(asdict(r.env), ok=r.ok, index_url=r.index_url, detail=r.detail) for r in results]
+
+
+def default_roots() -> List[str]:
+    """Common venv locations when no roots are given."""
+    home = os.path.expanduser("~")
+    candidates = [os.path.join(home, d) for d in (".virtualenvs", ".venvs", "venvs", ".pyenv/versions", ".local/share/virtualenvs")]
+    candidates.append(os.getcwd())
+    return [c for c in candidates if os.path.isdir(c)] or [sys.prefix]
@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Mirror sync-lag checker (stdlib only).
+Fetches the simple-API project pages of a few frequently released packages from every
+mirror concurrently (PEP 691 JSON when offered, PEP 503 HTML otherwise), turns them into
+version sets and reports, per mirror, the releases it is missing compared with the
+freshest listing. Packages a mirror could not list are reported apart: a timeout says
+nothing about sync lag. Listings are cached per (mirror, package) for a short TTL.
+"""
+from __future__ import annotations
+import json
+import re
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FuturesTimeout
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Sequence, Set, Tuple
+
+from .speedtest import MirrorMap, completed_within
+from .throughput import LinkParser
+
+# Released often enough that a lagging mirror shows up within hours
+HOT_PACKAGES = ("pip", "setuptools", "requests", "urllib3", "boto3", "botocore", "numpy")
+CACHE_TTL = 300.0
+# Each hot package a mirror is confirmed behind on counts like this much extra latency (0.5 = +50%)
+LAG_PENALTY = 0.5
+_ACCEPT = "application/vnd.pypi.simple.v1+json, application/vnd.pypi.simple.v1+html;q=0.2, text/html;q=0.1"
+_HEADERS = {"User-Agent": "pip-mirror-switcher/1.0 (+https://python.org)", "Accept": _ACCEPT}
+_ARCHIVE_EXTS = (".whl", ".tar.gz", ".zip", ".tar.bz2", ".tgz", ".egg")
+_VERSION = re.compile(r"^v?(\d+(?:\.\d+)*)(?:[-_.]?(a|b|c|rc|alpha|beta|pre|preview)[-_.]?(\d*))?"
+                      r"(?:[-_.]?(?:post|rev|r)[-_.]?(\d*))?(?:[-_.]?dev[-_.]?(\d*))?(?:\+.*)?$", re.I)
+_PRE_RANK = {"a": 0, "alpha": 0, "b": 1, "beta": 1, "c": 2, "rc": 2, "pre": 2, "preview": 2}
+
+
+def _normalize(name: str) -> str:
+    """PEP 503 project-name normalisation."""
+    return re.sub(r"[-_.]+", "-", name).lower()
+
+
+def version_from_filename(project: str, filename: str) -> Optional[str]:
+    """Version part of a wheel or sdist filename, or None if it cannot be told apart."""
+    filename = urllib.parse.unquote(filename)
+    if filename.endswith(".whl"):
+        parts = filename[:-4].split("-")
+        return parts[1] if len(parts) >= 5 else None
+    for ext in _ARCHIVE_EXTS:
+        if filename.endswith(ext):
+            stem = filename[: -len(ext)]
+            break
+    else:
+        return None
+    # sdists are <name>-<version>; the name itself may contain dashes
+    prefix = _normalize(project)
+    head, sep, version = stem.rpartition("-")
+    if _normalize(head) == prefix and sep:
+        return version
+    if _normalize(stem[: len(prefix)]) == prefix and stem[len(prefix): len(prefix) + 1] in "-_":
+        return stem[len(prefix) + 1:] or None
+    return None
+
+
+def version_key(version: str) -> Optional[Tuple[object, ...]]:
+    """
+    Sort key following PEP 440 ordering for release, pre-, post- and dev-segments;
+    None for versions this simple parser does not understand.
+    """
+    m = _VERSION.match(version.strip())
+    if not m:
+        return None
+    release = [int(x) for x in m.group(1).split(".")]
+    while len(release) > 1 and release[-1] == 0:
+        release.pop()
+    pre_kind, pre_n, post, dev = m.group(2), m.group(3), m.group(4), m.group(5)
+    pre = (_PRE_RANK[pre_kind.lower()], int(pre_n or 0)) if pre_kind else (3, 0)
+    if dev is not None and not pre_kind and post is None:
+        pre = (-1, 0)  # 1.0.dev1 sorts before 1.0a1
+    return (tuple(release), pre, int(post) if post else (0 if post is not None else -1),
+            int(dev) if dev else (0 if dev is not None else float("inf")))
+
+
+@dataclass
+class Listing:
+    """Versions of one project on one mirror."""
+    versions: Set[str] = field(default_factory=set)
+    # version -> earliest upload time (epoch seconds), when the mirror serves PEP 691 upload-time
+    uploaded: Dict[str, float] = field(default_factory=dict)
+    fetched: float = 0.0
+    error: Optional[str] = None
+
+
+def _parse_time(value: object) -> Optional[float]:
+    if not isinstance(value, str):
+        return None
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        return None
+
+
+def fetch_listing(index_url: str, project: str, timeout: float = 5.0) -> Listing:
+    """Fetch and parse one project page. Never raises; failures set Listing.error."""
+    listing = Listing(fetched=time.time())
+    url = index_url.rstrip("/") + "/" + _normalize(project) + "/"
+    try:
+        with urllib.request.urlopen(urllib.request.Request(url, headers=_HEADERS), timeout=timeout) as resp:
+            body = resp.read()
+            content_type = resp.headers.get("Content-Type", "")
+        if "json" in content_type:
+            data = json.loads(body)
+            for entry in data.get("files", []):
+                version = version_from_filename(project, str(entry.get("filename", "")))
+                if version is None:
+                    continue
+                listing.versions.add(version)
+                ts = _parse_time(entry.get("upload-time"))
+                if ts is not None and ts < listing.uploaded.get(version, float("inf")):
+                    listing.uploaded[version] = ts
+        else:
+            parser = LinkParser()
+            parser.feed(body.decode("utf-8", "replace"))
+            for href in parser.links:
+                filename = urllib.parse.urlsplit(href).path.rsplit("/", 1)[-1]
+                version = version_from_filename(project, filename)
+                if version is not None:
+                    listing.versions.add(version)
+        if not listing.versions:
+            listing.error = "no releases listed"
+    except (OSError, urllib.error.URLError, ValueError) as e:
+        listing.error = str(e) or type(e).__name__
+    return listing
+
+
+class ListingCache:
+    """Thread-safe (index_url, project) -> Listing cache; failed fetches are not cached."""
+
+    def __init__(self, ttl: float = CACHE_TTL) -> None:
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._data: Dict[Tuple[str, str], Listing] = {}
+
+    def get(self, index_url: str, project: str, now: Optional[float] = None) -> Optional[Listing]:
+        now = time.time() if now is None else now
+        with self._lock:
+            listing = self._data.get((index_url, _normalize(project)))
+        if listing is None or now - listing.fetched >= self.ttl:
+            return None
+        return listing
+
+    def put(self, index_url: str, project: str, listing: Listing) -> None:
+        if listing.error is None:
+            with self._lock:
+                self._data[(index_url, _normalize(project))] = listing
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+
+_cache = ListingCache()
+
+
+@dataclass
+class MirrorLag:
+    """How far one mirror is behind the freshest listing of each checked package."""
+    # package -> versions newer than this mirror's newest that another mirror already has
+    missing: Dict[str, List[str]] = field(default_factory=dict)
+    failed: List[str] = field(default_factory=list)  # packages whose listing could not be fetched
+    # Age of the oldest release the mirror is missing (needs PEP 691 upload times), else None
+    lag_seconds: Optional[float] = None
+
+    @property
+    def behind(self) -> int:
+        """Number of packages on which this mirror is confirmed behind; failed listings don't count."""
+        return sum(1 for versions in self.missing.values() if versions)
+
+
+def _newest(versions: Set[str]) -> Optional[Tuple[object, ...]]:
+    keys = [k for k in (version_key(v) for v in versions) if k is not None]
+    return max(keys) if keys else None
+
+
+def compare_listings(listings: Dict[str, Dict[str, Listing]], now: Optional[float] = None) -> Dict[str, MirrorLag]:
+    """
+    mirror -> package -> Listing in, mirror -> MirrorLag out. Only releases newer than a
+    mirror's own newest count as missing: older gaps are usually files PyPI deleted that
+    another mirror still keeps, not sync lag.
+    """
+    now = time.time() if now is None else now
+    packages = {pkg for per_mirror in listings.values() for pkg in per_mirror}
+    lags = {name: MirrorLag() for name in listings}
+    for pkg in packages:
+        union: Set[str] = set()
+        uploaded: Dict[str, float] = {}
+        for per_mirror in listings.values():
+            listing = per_mirror.get(pkg)
+            if listing is not None and listing.error is None:
+                union |= listing.versions
+                for version, ts in listing.uploaded.items():
+                    uploaded[version] = min(ts, uploaded.get(version, ts))
+        if not union:
+            continue  # nobody could list it: not a freshness signal
+        for name, per_mirror in listings.items():
+            listing = per_mirror.get(pkg)
+            if listing is None or listing.error is not None:
+                lags[name].failed.append(pkg)
+                continue
+            newest = _newest(listing.versions)
+            missing = [
+                v for v in union - listing.versions
+                if newest is not None and (version_key(v) or ()) > newest
+            ]
+            missing.sort(key=lambda v: version_key(v) or ())
+            lags[name].missing[pkg] = missing
+            times = [uploaded[v] for v in missing if v in uploaded]
+            if times:
+                age = now - min(times)
+                lags[name].lag_seconds = max(lags[name].lag_seconds or 0.0, age)
+    return lags
+
+
+def check_freshness(
+    mirrors: MirrorMap,
+    packages: Sequence[str] = HOT_PACKAGES,
+    timeout: float = 5.0,
+    progress: Optional[Callable[[str], None]] = None,
+    max_workers: int = 16,
+    deadline: Optional[float] = None,
+    cache: Optional[ListingCache] = None,
+    cancel: Optional[threading.Event] = None,
+) -> List[Tuple[str, MirrorLag]]:
+    """
+    Fetch every (mirror, package) listing on a bounded thread pool, reusing cached ones,
+    and return (name, MirrorLag) sorted least behind first. Listings still running at the
+    deadline count as failed; setting cancel raises speedtest.Cancelled.
+    """
+    cache = cache if cache is not None else _cache
+    listings: Dict[str, Dict[str, Listing]] = {name: {} for name in mirrors}
+    todo: List[Tuple[str, str, str]] = []
+    for name, (index_url, _host) in mirrors.items():
+        for pkg in packages:
+            hit = cache.get(index_url, pkg)
+            if hit is not None:
+                listings[name][pkg] = hit
+            else:
+                todo.append((name, index_url, pkg))
+    if progress:
+        progress(f"正在检查 {len(mirrors)} 个镜像的同步状态（{len(packages)} 个热门包）…")
+    if todo:
+        pool = ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(todo))), thread_name_prefix="freshness")
+        futures = {pool.submit(fetch_listing, url, pkg, timeout): (name, url, pkg) for name, url, pkg in todo}
+        try:
+            for fut in completed_within(futures, deadline, cancel):
+                name, url, pkg = futures[fut]
+                listings[name][pkg] = fut.result()
+                cache.put(url, pkg, listings[name][pkg])
+        except FuturesTimeout:
+            for name, _url, pkg in todo:
+                listings[name].setdefault(pkg, Listing(error="deadline exceeded"))
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+    lags = compare_listings(listings)
+    results = [(name, lags[name]) for name in mirrors]
+    results.sort(key=lambda x: (x[1].behind, x[1].lag_seconds or 0.0, len(x[1].failed)))
+    return results
+
+
+def apply_lag(ranking: List[List], behind: Dict[str, int], penalty: float = LAG_PENALTY) -> List[List]:
+    """
+    Re-rank [name, ms] or [name, ms, score] entries with sync lag as a factor: latency is
+    multiplied, score divided, by 1 + penalty x packages behind (MirrorLag.behind, so
+    listings that failed are not penalised). Entries keep their measured values; only
+    the order changes.
+    """
+    def _factor(name: str) -> float:
+        return 1.0 + penalty * behind.get(name, 0)
+
+    if ranking and len(ranking[0]) > 2:
+        return sorted(ranking, key=lambda e: -e[2] / _factor(e[0]))
+    return sorted(ranking, key=lambda e: (e[1] == float("inf"), e[1] * _factor(e[0])))
+
+
+def _human_age(seconds: float) -> str:
+    return f"{seconds / 3600:.1f}h" if seconds >= 3600 else f"{seconds / 60:.0f}min"
+
+
+def format_lag(results: List[Tuple[str, MirrorLag]]) -> str:
+    lines = ["同步状态（热门包缺少的最新版本）："]
+    for i, (name, lag) in enumerate(results, 1):
+        failed = f"  (获取失败: {', '.join(lag.failed)})" if lag.failed else ""
+        if not lag.behind:
+            lines.append(f"{i:>2}. {name:<8}  {'未发现落后' if lag.failed else '已同步'}{failed}")
+            continue
+        detail = ", ".join(f"{pkg} {' '.join(vs)}" for pkg, vs in lag.missing.items() if vs)
+        age = f"，至少落后 {_human_age(lag.lag_seconds)}" if lag.lag_seconds else ""
+        lines.append(f"{i:>2}. {name:<8}  {lag.behind} 个包落后{age}  ({detail}){failed}")
+    return "\n".join(lines)
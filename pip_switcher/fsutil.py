@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+File helpers shared by every module that persists state: pip config files, the proxy
+cache, fleet inventories, telemetry exports and failover state.
+"""
+from __future__ import annotations
+import os
+import tempfile
+from typing import Union
+
+
+def _current_umask() -> int:
+    mask = os.umask(0o022)  # the only portable way to read it is to set it
+    os.umask(mask)
+    return mask
+
+
+# Read once at import, while no other thread can be creating files under the temporary mask
+_UMASK = _current_umask()
+
+
+def write_atomic(path: str, text: Union[str, bytes], prefix: str = ".tmp-") -> None:
+    """
+    Replace path with text via a temp file in the same directory (never half-written).
+    prefix names the temp file, so a leftover from a crash says who wrote it.
+    """
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(prefix=prefix, dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(text if isinstance(text, bytes) else text.encode("utf-8"))
+            f.flush()
+            os.fsync(f.fileno())
+        if os.path.exists(path):
+            os.chmod(tmp, os.stat(path).st_mode & 0o777)
+        else:
+            # mkstemp creates 0600; a new file must be readable like one `pip config set` makes
+            os.chmod(tmp, 0o666 & ~_UMASK)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Persistent speed-test history (SQLite, stdlib only).
+Keeps one timestamped sample per mirror per run, rolls old samples up into daily
+aggregates so the store stays small, and ranks mirrors by an exponentially
+time-weighted average instead of a single run. Samples carry the network fingerprint
+(see netfp) they were measured on, so a ranking can be weighted for one network only;
+the latest ranking per network is kept as well.
+"""
+from __future__ import annotations
+import json
+import os
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+
+APP_NAME = "PipMirrorSwitcher"  # matches QCoreApplication organization/application name
+DEFAULT_TTL = 15 * 60.0  # seconds before a stored ranking is considered stale
+HALF_LIFE = 24 * 3600.0  # a sample loses half its weight per day
+RAW_DAYS = 7  # keep per-run samples this long, then roll them up per day
+KEEP_DAYS = 90  # drop daily rollups after this
+_DAY = 86400.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts REAL NOT NULL,
+    network TEXT NOT NULL DEFAULT ''  -- netfp fingerprint, '' when unknown
+);
+CREATE TABLE IF NOT EXISTS samples (
+    run_id INTEGER NOT NULL REFERENCES runs(id) ON DELETE CASCADE,
+    mirror TEXT NOT NULL,
+    ms REAL  -- NULL means timeout/failure
+);
+CREATE INDEX IF NOT EXISTS samples_run ON samples(run_id);
+CREATE TABLE IF NOT EXISTS rollups (
+    day INTEGER NOT NULL,
+    network TEXT NOT NULL DEFAULT '',
+    mirror TEXT NOT NULL,
+    n INTEGER NOT NULL,
+    failures INTEGER NOT NULL,
+    sum_ms REAL NOT NULL,
+    PRIMARY KEY (day, network, mirror)
+);
+CREATE TABLE IF NOT EXISTS networks (
+    fingerprint TEXT PRIMARY KEY,
+    ts REAL NOT NULL,
+    ranking TEXT NOT NULL  -- JSON [[name, ms], ...], null ms for failures
+);
+"""
+
+
+def default_path() -> str:
+    """history.sqlite3 next to the app's QSettings file (computed without importing Qt)."""
+    if sys.platform.startswith("win"):
+        base = os.environ.get("APPDATA") or os.path.expanduser("~")
+    elif sys.platform == "darwin":
+        base = os.path.expanduser("~/Library/Application Support")
+    else:
+        base = os.environ.get("XDG_CONFIG_HOME") or os.path.expanduser("~/.config")
+    return os.path.join(base, APP_NAME, "history.sqlite3")
+
+
+class HistoryStore:
+    """
+    SQLite-backed speed-test history. Open one store per thread; sqlite3 connections
+    must not be shared across threads.
+    """
+
+    def __init__(self, path: Optional[str] = None, half_life: float = HALF_LIFE) -> None:
+        self.path = path or default_path()
+        self.half_life = half_life
+        if self.path != ":memory:":
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        import sqlite3  # deferred: default_path() is needed on every start, the database is not
+
+        self._db = sqlite3.connect(self.path)
+        self._db.execute("PRAGMA foreign_keys = ON")
+        self._db.executescript(_SCHEMA)
+
+    def __enter__(self) -> "HistoryStore":
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._db.close()
+
+    def record(
+        self, ranking: List[Tuple[str, float]], ts: Optional[float] = None, network: Optional[str] = None
+    ) -> None:
+        """Store one run: a (name, ms) ranking as produced by speedtest.benchmark_mirrors, measured on network."""
+        ts = time.time() if ts is None else ts
+        with self._db:
+            run_id = self._db.execute("INSERT INTO runs (ts, network) VALUES (?, ?)", (ts, network or "")).lastrowid
+            self._db.executemany(
+                "INSERT INTO samples (run_id, mirror, ms) VALUES (?, ?, ?)",
+                [(run_id, name, None if ms == float("inf") else ms) for name, ms in ranking],
+            )
+        self.compact(now=ts)
+
+    def last_run(self) -> Tuple[Optional[float], List[Tuple[str, float]]]:
+        """(timestamp, ranking) of the most recent run, or (None, []) if there is none."""
+        row = self._db.execute("SELECT id, ts FROM runs ORDER BY ts DESC LIMIT 1").fetchone()
+        if row is None:
+            return None, []
+        ranking = [
+            (name, float("inf") if ms is None else ms)
+            for name, ms in self._db.execute("SELECT mirror, ms FROM samples WHERE run_id = ?", (row[0],))
+        ]
+        ranking.sort(key=lambda x: (x[1] == float("inf"), x[1]))
+        return row[1], ranking
+
+    def age(self, now: Optional[float] = None) -> float:
+        """Seconds since the last run (inf when empty)."""
+        ts, _ = self.last_run()
+        if ts is None:
+            return float("inf")
+        return (time.time() if now is None else now) - ts
+
+    def is_fresh(self, ttl: float = DEFAULT_TTL, now: Optional[float] = None) -> bool:
+        return self.age(now) < ttl
+
+    def weighted_ranking(self, now: Optional[float] = None, network: Optional[str] = None) -> List[Tuple[str, float]]:
+        """
+        (name, ms) sorted fastest first, where ms is the exponentially time-weighted mean of
+        successful samples. Mirrors whose weighted failure share exceeds 50% rank as inf.
+        With network, only samples measured on that network count; latency on another
+        network says little about this one.
+        """
+        now = time.time() if now is None else now
+        weight_ok: Dict[str, float] = {}
+        weight_fail: Dict[str, float] = {}
+        weighted_ms: Dict[str, float] = {}
+
+        def _add(name: str, age: float, n: int, failures: int, sum_ms: float) -> None:
+            w = 0.5 ** (max(age, 0.0) / self.half_life)
+            weight_ok[name] = weight_ok.get(name, 0.0) + w * (n - failures)
+            weight_fail[name] = weight_fail.get(name, 0.0) + w * failures
+            weighted_ms[name] = weighted_ms.get(name, 0.0) + w * sum_ms
+
+        runs_where, rollups_where, params = "", "", ()
+        if network is not None:
+            runs_where, rollups_where, params = " WHERE runs.network = ?", " WHERE network = ?", (network,)
+        for ts, name, ms in self._db.execute(
+            "SELECT runs.ts, samples.mirror, samples.ms FROM samples JOIN runs ON runs.id = samples.run_id" + runs_where,
+            params,
+        ):
+            _add(name, now - ts, 1, 1 if ms is None else 0, ms or 0.0)
+        for day, name, n, failures, sum_ms in self._db.execute(
+            "SELECT day, mirror, n, failures, sum_ms FROM rollups" + rollups_where, params
+        ):
+            _add(name, now - (day + 0.5) * _DAY, n, failures, sum_ms)
+
+        ranking: List[Tuple[str, float]] = []
+        for name in weight_ok:
+            ok, fail = weight_ok[name], weight_fail[name]
+            if ok <= 0 or fail > ok:
+                ranking.append((name, float("inf")))
+            else:
+                ranking.append((name, weighted_ms[name] / ok))
+        ranking.sort(key=lambda x: (x[1] == float("inf"), x[1]))
+        return ranking
+
+    def save_network_ranking(self, fingerprint: str, ranking: List[Tuple[str, float]], ts: Optional[float] = None) -> None:
+        """Remember the latest ranking measured on the network identified by fingerprint."""
+        payload = json.dumps([[name, None if ms == float("inf") else ms] for name, ms in ranking])
+        with self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO networks (fingerprint, ts, ranking) VALUES (?, ?, ?)",
+                (fingerprint, time.time() if ts is None else ts, payload),
+            )
+
+    def network_ranking(self, fingerprint: str) -> Tuple[Optional[float], List[Tuple[str, float]]]:
+        """(timestamp, ranking) last saved for a network, or (None, []) for an unknown one."""
+        row = self._db.execute("SELECT ts, ranking FROM networks WHERE fingerprint = ?", (fingerprint,)).fetchone()
+        if row is None:
+            return None, []
+        return row[0], [(name, float("inf") if ms is None else ms) for name, ms in json.loads(row[1])]
+
+    def compact(self, now: Optional[float] = None) -> None:
+        """Roll samples older than RAW_DAYS into daily rollups; drop rollups older than KEEP_DAYS."""
+        now = time.time() if now is None else now
+        raw_cutoff = now - RAW_DAYS * _DAY
+        with self._db:
+            rows = self._db.execute(
+                "SELECT CAST(runs.ts / ? AS INTEGER), runs.network, samples.mirror, COUNT(*),"
+                " SUM(samples.ms IS NULL), COALESCE(SUM(samples.ms), 0)"
+                " FROM samples JOIN runs ON runs.id = samples.run_id"
+                " WHERE runs.ts < ? GROUP BY 1, 2, 3",
+                (_DAY, raw_cutoff),
+            ).fetchall()
+            self._db.executemany(
+                "INSERT INTO rollups (day, network, mirror, n, failures, sum_ms) VALUES (?, ?, ?, ?, ?, ?)"
+                " ON CONFLICT (day, network, mirror) DO UPDATE SET n = n + excluded.n,"
+                " failures = failures + excluded.failures, sum_ms = sum_ms + excluded.sum_ms",
+                rows,
+            )
+            self._db.execute("DELETE FROM runs WHERE ts < ?", (raw_cutoff,))
+            self._db.execute("DELETE FROM rollups WHERE day < ?", (int((now - KEEP_DAYS * _DAY) // _DAY),))
@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Artifact integrity sampler (stdlib only).
+Takes a few release files with known SHA-256 digests (PyPI JSON API, or the
+`#sha256=` fragments of a simple page), downloads the same files from every mirror
+and hashes them while streaming; nothing is buffered whole in memory or written to
+disk. Downloads run concurrently under one shared bandwidth cap and end in a
+per-mirror report of missing, truncated, stale or corrupted files.
+"""
+from __future__ import annotations
+import hashlib
+import json
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FuturesTimeout
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+from .freshness import HOT_PACKAGES
+from .speedtest import MirrorMap, completed_within
+from .throughput import LinkParser
+
+PYPI_JSON = "https://pypi.org/pypi"
+FILES_PER_PACKAGE = 1
+MAX_FILE_BYTES = 5 * 1024 * 1024  # skip larger files so a sample stays cheap
+DEFAULT_RATE = 4 * 1024 * 1024  # bytes/s shared by all downloads
+_CHUNK = 64 * 1024
+_HEADERS = {"User-Agent": "pip-mirror-switcher/1.0 (+https://python.org)", "Accept-Encoding": "identity"}
+
+
+@dataclass
+class SampleFile:
+    project: str
+    filename: str
+    sha256: str
+    size: Optional[int] = None
+
+
+@dataclass
+class FileCheck:
+    filename: str
+    # ok | mismatch (wrong bytes) | truncated | stale-hash (page lists another digest) | missing | error
+    status: str
+    nbytes: int = 0
+    detail: str = ""
+
+
+@dataclass
+class MirrorIntegrity:
+    checks: List[FileCheck] = field(default_factory=list)
+
+    @property
+    def problems(self) -> List[FileCheck]:
+        return [c for c in self.checks if c.status != "ok"]
+
+    @property
+    def mismatches(self) -> int:
+        """Files whose content is wrong (the failures pip cannot route around)."""
+        return sum(1 for c in self.checks if c.status in ("mismatch", "truncated"))
+
+
+class RateLimiter:
+    """Token bucket shared by all download threads; rate is bytes per second (0 = unlimited)."""
+
+    def __init__(self, rate: float) -> None:
+        self.rate = rate
+        self._lock = threading.Lock()
+        self._allowance = rate
+        self._last = time.monotonic()
+
+    def consume(self, nbytes: int) -> None:
+        if self.rate <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            self._allowance = min(self.rate, self._allowance + (now - self._last) * self.rate)
+            self._last = now
+            self._allowance -= nbytes
+            wait = -self._allowance / self.rate if self._allowance < 0 else 0.0
+        if wait > 0:
+            time.sleep(wait)
+
+
+def _get(url: str, timeout: float, accept: Optional[str] = None) -> Tuple[bytes, str]:
+    headers = dict(_HEADERS)
+    if accept:
+        headers["Accept"] = accept
+    with urllib.request.urlopen(urllib.request.Request(url, headers=headers), timeout=timeout) as resp:
+        return resp.read(), resp.geturl()
+
+
+def sample_from_json(
+    project: str, per_package: int = FILES_PER_PACKAGE, max_bytes: int = MAX_FILE_BYTES,
+    api: str = PYPI_JSON, timeout: float = 10.0,
+) -> List[SampleFile]:
+    """Files of the latest release with digests and sizes from the JSON API, smallest first."""
+    body, _ = _get(f"{api.rstrip('/')}/{project}/json", timeout)
+    urls = json.loads(body).get("urls", [])
+    files = [
+        SampleFile(project, u["filename"], u["digests"]["sha256"], u.get("size"))
+        for u in urls if u.get("digests", {}).get("sha256") and (u.get("size") or 0) <= max_bytes
+    ]
+    files.sort(key=lambda f: f.size or 0)
+    return files[:per_package]
+
+
+def _page_links(index_url: str, project: str, timeout: float) -> Dict[str, Tuple[str, Optional[str]]]:
+    """filename -> (absolute URL, sha256 fragment or None) from a PEP 503 project page."""
+    body, final = _get(index_url.rstrip("/") + f"/{project}/", timeout, accept="text/html")
+    parser = LinkParser()
+    parser.feed(body.decode("utf-8", "replace"))
+    links: Dict[str, Tuple[str, Optional[str]]] = {}
+    for href in parser.links:
+        absolute, _, frag = urllib.parse.urljoin(final, href).partition("#")
+        filename = urllib.parse.unquote(urllib.parse.urlsplit(absolute).path.rsplit("/", 1)[-1])
+        digest = frag[len("sha256="):] if frag.startswith("sha256=") else None
+        links[filename] = (absolute, digest)
+    return links
+
+
+def sample_from_simple(
+    index_url: str, project: str, per_package: int = FILES_PER_PACKAGE, timeout: float = 10.0,
+) -> List[SampleFile]:
+    """Newest files carrying a #sha256= fragment on a simple page (size unknown)."""
+    links = _page_links(index_url, project, timeout)
+    hashed = [(name, digest) for name, (_url, digest) in links.items() if digest]
+    return [SampleFile(project, name, digest) for name, digest in hashed[-per_package:]]
+
+
+def build_sample(
+    packages: Sequence[str] = HOT_PACKAGES,
+    per_package: int = FILES_PER_PACKAGE,
+    max_bytes: int = MAX_FILE_BYTES,
+    fallback_index: Optional[str] = None,
+    timeout: float = 10.0,
+) -> List[SampleFile]:
+    """Reference digests from PyPI's JSON API, falling back to fallback_index's fragments."""
+    sample: List[SampleFile] = []
+    for project in packages:
+        try:
+            sample.extend(sample_from_json(project, per_package, max_bytes, timeout=timeout))
+            continue
+        except (OSError, urllib.error.URLError, ValueError, KeyError):
+            if not fallback_index:
+                continue
+        try:
+            sample.extend(sample_from_simple(fallback_index, project, per_package, timeout))
+        except (OSError, urllib.error.URLError, ValueError):
+            continue
+    return sample
+
+
+def _hash_download(url: str, limiter: RateLimiter, timeout: float) -> Tuple[str, int]:
+    """Stream url through SHA-256; returns (hexdigest, bytes). Nothing is kept."""
+    digest = hashlib.sha256()
+    total = 0
+    with urllib.request.urlopen(urllib.request.Request(url, headers=_HEADERS), timeout=timeout) as resp:
+        while True:
+            chunk = resp.read(_CHUNK)
+            if not chunk:
+                break
+            limiter.consume(len(chunk))
+            digest.update(chunk)
+            total += len(chunk)
+    return digest.hexdigest(), total
+
+
+def check_file(
+    index_url: str, item: SampleFile, limiter: RateLimiter, timeout: float = 30.0,
+    links: Optional[Dict[str, Tuple[str, Optional[str]]]] = None,
+) -> FileCheck:
+    """Verify one sample file on one mirror. Never raises."""
+    try:
+        if links is None:
+            links = _page_links(index_url, item.project, timeout)
+        if item.filename not in links:
+            return FileCheck(item.filename, "missing", detail="not listed on the project page")
+        url, listed = links[item.filename]
+        got, nbytes = _hash_download(url, limiter, timeout)
+    except (OSError, urllib.error.URLError, ValueError) as e:
+        return FileCheck(item.filename, "error", detail=str(e) or type(e).__name__)
+    if got == item.sha256:
+        if listed and listed != item.sha256:
+            return FileCheck(item.filename, "stale-hash", nbytes, f"page lists sha256={listed[:12]}…")
+        return FileCheck(item.filename, "ok", nbytes)
+    if item.size is not None and nbytes < item.size:
+        return FileCheck(item.filename, "truncated", nbytes, f"{nbytes}/{item.size} bytes")
+    return FileCheck(item.filename, "mismatch", nbytes, f"sha256={got[:12]}…, expected {item.sha256[:12]}…")
+
+
+def check_integrity(
+    mirrors: MirrorMap,
+    sample: List[SampleFile],
+    rate: float = DEFAULT_RATE,
+    timeout: float = 30.0,
+    progress: Optional[Callable[[str], None]] = None,
+    max_workers: int = 4,
+    deadline: Optional[float] = None,
+    cancel: Optional[threading.Event] = None,
+) -> List[Tuple[str, MirrorIntegrity]]:
+    """
+    Check every sample file on every mirror on a bounded pool under one shared rate cap.
+    Returns (name, MirrorIntegrity) sorted by fewest problems first; checks still running
+    at the deadline are reported as errors. Setting cancel raises speedtest.Cancelled.
+    """
+    limiter = RateLimiter(rate)
+    pages: Dict[Tuple[str, str], Union[Dict[str, Tuple[str, Optional[str]]], str]] = {}
+    locks: Dict[Tuple[str, str], threading.Lock] = {}
+    locks_guard = threading.Lock()
+
+    def _task(index_url: str, item: SampleFile) -> FileCheck:
+        # One project page fetch per (mirror, project), shared by that project's files
+        key = (index_url, item.project)
+        with locks_guard:
+            lock = locks.setdefault(key, threading.Lock())
+        with lock:
+            if key not in pages:
+                try:
+                    pages[key] = _page_links(index_url, item.project, timeout)
+                except (OSError, urllib.error.URLError, ValueError) as e:
+                    pages[key] = str(e) or type(e).__name__
+        links = pages[key]
+        if isinstance(links, str):
+            return FileCheck(item.filename, "error", detail=links)
+        return check_file(index_url, item, limiter, timeout, links)
+
+    report = {name: MirrorIntegrity() for name in mirrors}
+    if progress:
+        for name in mirrors:
+            progress(f"正在测试 {name} 源…")
+    jobs = [(name, index_url, item) for name, (index_url, _host) in mirrors.items() for item in sample]
+    if jobs:
+        pool = ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(jobs))), thread_name_prefix="integrity")
+        futures = {pool.submit(_task, url, item): (name, item) for name, url, item in jobs}
+        remaining = {name: len(sample) for name in mirrors}
+        seen = set()
+        try:
+            for fut in completed_within(futures, deadline, cancel):
+                seen.add(fut)
+                name, item = futures[fut]
+                report[name].checks.append(fut.result())
+                remaining[name] -= 1
+                if progress and remaining[name] == 0:
+                    bad = len(report[name].problems)
+                    progress(f"{name} 源测试完成：" + ("全部一致" if not bad else f"{bad} 个文件异常"))
+        except FuturesTimeout:
+            for fut, (name, item) in futures.items():
+                if fut in seen:
+                    continue
+                if fut.done():  # finished alongside the deadline but not handed out yet
+                    report[name].checks.append(fut.result())
+                else:
+                    report[name].checks.append(FileCheck(item.filename, "error", detail="deadline exceeded"))
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+    results = [(name, report[name]) for name in mirrors]
+    results.sort(key=lambda x: (x[1].mismatches, len(x[1].problems)))
+    return results
+
+
+_STATUS_ZH = {
+    "mismatch": "内容不一致", "truncated": "文件被截断", "stale-hash": "页面哈希过期",
+    "missing": "缺少文件", "error": "下载失败",
+}
+
+
+def format_integrity(results: List[Tuple[str, MirrorIntegrity]]) -> str:
+    lines = ["完整性抽检结果："]
+    for i, (name, res) in enumerate(results, 1):
+        if not res.problems:
+            lines.append(f"{i:>2}. {name:<8}  {len(res.checks)} 个文件全部一致")
+            continue
+        lines.append(f"{i:>2}. {name:<8}  {len(res.problems)}/{len(res.checks)} 个文件异常：")
+        for c in res.problems:
+            lines.append(f"      - {c.filename}: {_STATUS_ZH.get(c.status, c.status)} {c.detail}".rstrip())
+    return "\n".join(lines)
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Background mirror health monitor with hysteresis-based auto-switch.
+Probes the active mirror on an adaptive schedule (backing off while it is healthy,
+checking more often while it is degraded) against a small random sample of the
+alternatives, and switches through core.set_mirror only when the active mirror has
+been worse by more than `margin` for at least `hold` seconds.
+"""
+from __future__ import annotations
+import random
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+from . import core, speedtest
+from .speedtest import MirrorMap
+
+
+class HealthMonitor:
+    """
+    - margin: relative slowdown vs. the best sampled alternative that counts as degraded (0.5 = 50% slower)
+    - hold: seconds the active mirror must stay degraded before switching
+    - min_interval/max_interval: bounds of the adaptive probe interval
+    - sample_size: alternatives probed per check
+    - alpha: smoothing factor of the per-mirror latency EWMA
+    """
+
+    def __init__(
+        self,
+        scope: str,
+        mirrors: Optional[MirrorMap] = None,
+        margin: float = 0.5,
+        hold: float = 300.0,
+        min_interval: float = 30.0,
+        max_interval: float = 600.0,
+        sample_size: int = 2,
+        timeout: float = 3.0,
+        alpha: float = 0.5,
+        on_event: Optional[Callable[[str], None]] = None,
+    ) -> None:
+        self.scope = scope
+        self.mirrors = mirrors if mirrors is not None else core.MIRRORS
+        self.margin = margin
+        self.hold = hold
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.sample_size = sample_size
+        self.timeout = timeout
+        self.alpha = alpha
+        self.on_event = on_event
+        self.interval = min_interval
+        self.ewma: Dict[str, float] = {}
+        self._degraded_since: Optional[float] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _emit(self, text: str) -> None:
+        if self.on_event:
+            self.on_event(text)
+
+    def _observe(self, name: str, ms: float) -> float:
+        prev = self.ewma.get(name)
+        if ms == float("inf") or prev is None or prev == float("inf"):
+            # A failure, a first sample or a recovery replaces the estimate outright
+            value = ms
+        else:
+            value = self.alpha * ms + (1.0 - self.alpha) * prev
+        self.ewma[name] = value
+        return value
+
+    def check_once(self, now: Optional[float] = None) -> Optional[str]:
+        """Run one health check; returns the mirror switched to, if any."""
+        now = time.monotonic() if now is None else now
+        current = core.current_mirror()
+        if current is None or current not in self.mirrors:
+            # Official index or a custom URL: nothing to compare against
+            self._degraded_since = None
+            self.interval = self.max_interval
+            return None
+        others = [name for name in self.mirrors if name != current]
+        sample = random.sample(others, min(self.sample_size, len(others)))
+        probed = {name: self.mirrors[name] for name in [current] + sample}
+        results = speedtest.run_concurrently(
+            probed,
+            lambda _name, url: speedtest.probe_phases(url.rstrip("/") + "/", self.timeout).total_ms,
+            float("inf"),
+            deadline=self.timeout * 2,
+            cancel=self._stop,
+        )
+        cur_ms = self._observe(current, results[current])
+        alts = {name: self._observe(name, results[name]) for name in sample}
+        best = min(alts, key=alts.__getitem__, default=None)
+        if best is None or alts[best] == float("inf") or cur_ms <= alts[best] * (1.0 + self.margin):
+            # Healthy (or no usable alternative): back off
+            self._degraded_since = None
+            self.interval = min(self.interval * 2, self.max_interval)
+            return None
+        if self._degraded_since is None:
+            self._degraded_since = now
+            self._emit(f"{current} 源变慢（≈{speedtest.human_ms(cur_ms)}，{best} ≈{speedtest.human_ms(alts[best])}），继续观察…")
+        self.interval = self.min_interval
+        if now - self._degraded_since < self.hold:
+            return None
+        core.set_mirror(best, self.scope)
+        self._emit(f"{current} 源持续变慢，已自动切换到 {best} 源")
+        self._degraded_since = None
+        return best
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.check_once()
+            except speedtest.Cancelled:
+                return
+            except Exception as e:
+                self._emit(f"[WARN] 后台监测出错：{e}")
+            self._stop.wait(self.interval)
+
+    def start(self) -> None:
+        if self.running:
+            return
+        if self._thread is not None:
+            # Stopped mid-check: its probes see the stop event and end within a poll
+            self._thread.join()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="mirror-monitor", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 2.0) -> None:
+        self._stop.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+
+    @property
+    def running(self) -> bool:
+        return bool(self._thread and self._thread.is_alive() and not self._stop.is_set())
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Network fingerprinting for per-network mirror selection.
+The fingerprint is derived cheaply (no subprocesses, no packets sent) from the default
+gateway, the local subnet and the configured resolvers, so switching between office,
+VPN and home networks can reuse the ranking last measured on that network.
+"""
+from __future__ import annotations
+import hashlib
+import ipaddress
+import socket
+import struct
+from typing import Callable, List, Optional, Tuple
+
+from . import core, speedtest
+from .history import HistoryStore
+
+# A cached winner is accepted if one quick probe is within this factor of its recorded latency
+VALIDATE_FACTOR = 3.0
+VALIDATE_TIMEOUT = 2.0
+
+
+def _default_gateway() -> str:
+    """Gateway IP (and MAC when known) of the default IPv4 route; Linux only, '' elsewhere."""
+    try:
+        with open("/proc/net/route") as f:
+            next(f)
+            for line in f:
+                fields = line.split()
+                if len(fields) > 2 and fields[1] == "00000000":
+                    gw = socket.inet_ntoa(struct.pack("<L", int(fields[2], 16)))
+                    break
+            else:
+                return ""
+    except (OSError, ValueError, StopIteration):
+        return ""
+    try:
+        with open("/proc/net/arp") as f:
+            for line in f:
+                fields = line.split()
+                if fields and fields[0] == gw and len(fields) > 3:
+                    return f"{gw}/{fields[3]}"
+    except OSError:
+        pass
+    return gw
+
+
+def _local_subnet() -> str:
+    """Subnet of the address used for outbound traffic (UDP connect sends nothing)."""
+    for family, probe, prefix in ((socket.AF_INET, "192.0.2.1", 24), (socket.AF_INET6, "2001:db8::1", 64)):
+        try:
+            with socket.socket(family, socket.SOCK_DGRAM) as s:
+                s.connect((probe, 53))
+                local = s.getsockname()[0]
+        except OSError:
+            continue
+        return str(ipaddress.ip_network(f"{local.split('%')[0]}/{prefix}", strict=False))
+    return ""
+
+
+def resolvers() -> List[str]:
+    """Nameservers from /etc/resolv.conf (empty where there is none, e.g. Windows)."""
+    try:
+        with open("/etc/resolv.conf") as f:
+            return sorted(
+                line.split()[1] for line in f if line.startswith("nameserver") and len(line.split()) > 1
+            )
+    except OSError:
+        return []
+
+
+def fingerprint() -> str:
+    """Short stable id of the current network, e.g. '3f9a1c0b2d4e'."""
+    parts = [_default_gateway(), _local_subnet(), ",".join(resolvers())]
+    return hashlib.sha1("|".join(parts).encode()).hexdigest()[:12]
+
+
+def validated_winner(
+    ranking: List[Tuple[str, float]], progress: Optional[Callable[[str], None]] = None
+) -> Optional[Tuple[str, float]]:
+    """
+    The fastest usable (name, ms) of a cached ranking if one quick probe confirms it is
+    still about that fast, else None (the caller should benchmark again).
+    """
+    winner = next(((name, ms) for name, ms in ranking if ms != float("inf") and name in core.MIRRORS), None)
+    if winner is None:
+        return None
+    name, ms = winner
+    target = core.MIRRORS[name][0].rstrip("/") + "/"
+    elapsed = speedtest.probe_phases(target, timeout=VALIDATE_TIMEOUT).total_ms
+    if elapsed > max(ms * VALIDATE_FACTOR, ms + 500.0):
+        if progress:
+            progress(f"{name} 源复核未通过，重新测速…")
+        return None
+    return winner
+
+
+def select_for_network(
+    scope: str,
+    store: HistoryStore,
+    progress: Optional[Callable[[str], None]] = None,
+    apply: bool = True,
+) -> Tuple[Optional[str], bool]:
+    """
+    Pick the best mirror for the current network and (optionally) switch pip to it.
+    On a known network the cached winner is validated with a single quick probe; only a
+    new network, or a winner that fails validation, triggers a full benchmark.
+    Returns (mirror name or None, whether a full benchmark ran).
+    """
+    fp = fingerprint()
+    _ts, ranking = store.network_ranking(fp)
+    winner = validated_winner(ranking, progress)
+    full = False
+    if winner is None:
+        full = True
+        ranking = speedtest.benchmark_mirrors(core.MIRRORS, progress=progress, deadline=10.0)
+        store.record(ranking, network=fp)
+        store.save_network_ranking(fp, ranking)
+        winner = next(((name, ms) for name, ms in ranking if ms != float("inf")), None)
+    if winner is None:
+        return None, full
+    if apply and core.current_mirror() != winner[0]:
+        core.set_mirror(winner[0], scope)
+    return winner[0], full
@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Native pip configuration backend: locate pip's config files the way pip does and
+read/write them directly, instead of spawning `python -m pip config` per call.
+ConfigSnapshot resolves the effective values (files plus PIP_* environment variables)
+once and is cached until a watched file's mtime or inode changes.
+"""
+from __future__ import annotations
+import configparser
+import io
+import os
+import sys
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from . import fsutil
+
+WINDOWS = sys.platform.startswith("win") or (sys.platform == "cli" and os.name == "nt")
+CONFIG_BASENAME = "pip.ini" if WINDOWS else "pip.conf"
+SCOPES = ("global", "user", "site")
+# Files are applied in this order; later scopes override earlier ones (pip's override_order)
+LOAD_ORDER = ("global", "user", "site")
+
+
+def _user_config_dir() -> str:
+    if WINDOWS:
+        return os.path.join(os.environ.get("APPDATA") or os.path.expanduser("~"), "pip")
+    if sys.platform == "darwin":
+        path = os.path.expanduser("~/Library/Application Support/pip")
+        if os.path.isdir(path):
+            return path
+        return os.path.expanduser("~/.config/pip")
+    return os.path.join(os.environ.get("XDG_CONFIG_HOME") or os.path.expanduser("~/.config"), "pip")
+
+
+def _site_config_dirs() -> List[str]:
+    if WINDOWS:
+        return [os.path.join(os.environ.get("PROGRAMDATA") or r"C:\ProgramData", "pip")]
+    if sys.platform == "darwin":
+        return ["/Library/Application Support/pip"]
+    xdg = os.environ.get("XDG_CONFIG_DIRS") or "/etc/xdg"
+    return [os.path.join(os.path.expanduser(d), "pip") for d in xdg.split(os.pathsep) if d] + ["/etc"]
+
+
+def config_files(scope: str, prefix: Optional[str] = None) -> List[str]:
+    """
+    All config files pip reads for a scope, lowest precedence first.
+    prefix selects another environment's site file (default: this interpreter's sys.prefix).
+    """
+    if scope == "global":
+        return [os.path.join(d, CONFIG_BASENAME) for d in _site_config_dirs()]
+    if scope == "site":
+        return [os.path.join(prefix or sys.prefix, CONFIG_BASENAME)]
+    if scope == "user":
+        legacy = os.path.join(os.path.expanduser("~"), "pip" if WINDOWS else ".pip", CONFIG_BASENAME)
+        return [legacy, os.path.join(_user_config_dir(), CONFIG_BASENAME)]
+    raise ValueError("scope must be one of: user, global, site")
+
+
+def config_file(scope: str, prefix: Optional[str] = None) -> str:
+    """The file `pip config set --<scope>` modifies: the last one pip reads for that scope."""
+    return config_files(scope, prefix)[-1]
+
+
+def _split_key(key: str) -> tuple[str, str]:
+    section, sep, name = key.partition(".")
+    if not sep or not section or not name:
+        raise ValueError(f"Key does not contain dot separated section and key: {key!r}")
+    return section, name
+
+
+def _load(path: str) -> configparser.RawConfigParser:
+    parser = configparser.RawConfigParser()
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            parser.read_file(f, path)
+    return parser
+
+
+def read_file(path: str) -> Dict[str, str]:
+    """Return `section.key -> value` for one config file ({} if it does not exist)."""
+    parser = _load(path)
+    return {f"{section}.{key}": value for section in parser.sections() for key, value in parser.items(section)}
+
+
+def _source_files(prefix: Optional[str] = None) -> List[str]:
+    """
+    Every file pip may read, lowest precedence first (PIP_CONFIG_FILE last). Like pip,
+    PIP_CONFIG_FILE=os.devnull disables all config files, and an existing
+    PIP_CONFIG_FILE replaces the user file.
+    """
+    env_file = os.environ.get("PIP_CONFIG_FILE")
+    if env_file == os.devnull:
+        return []
+    skip_user = bool(env_file) and os.path.exists(env_file)
+    files = [
+        path for scope in LOAD_ORDER if not (skip_user and scope == "user") for path in config_files(scope, prefix)
+    ]
+    if env_file:
+        files.append(env_file)
+    return files
+
+
+def list_values() -> Dict[str, str]:
+    """Merged values of every config file, later files overriding earlier ones."""
+    values: Dict[str, str] = {}
+    for path in _source_files():
+        values.update(read_file(path))
+    return values
+
+
+def env_values() -> Dict[str, str]:
+    """PIP_* environment variables as `:env:.key` entries, e.g. PIP_INDEX_URL -> :env:.index-url."""
+    return {
+        ":env:." + name[4:].lower().replace("_", "-"): value
+        for name, value in os.environ.items()
+        if name.startswith("PIP_") and name != "PIP_CONFIG_FILE" and value
+    }
+
+
+class ConfigSnapshot:
+    """Resolved pip configuration at one point in time. Lookups are plain dict reads."""
+
+    def __init__(self, values: Dict[str, str], env: Dict[str, str]) -> None:
+        self.values = values
+        self.env = env
+
+    def effective(self, option: str, command: str = "install") -> Optional[str]:
+        """
+        Value pip would use for `option` when running `command`, following pip's
+        precedence: environment variable, then [command] section, then [global].
+        """
+        for key in (f":env:.{option}", f"{command}.{option}", f"global.{option}"):
+            value = self.env.get(key, self.values.get(key))
+            if value:
+                return value
+        return None
+
+    @property
+    def index_url(self) -> Optional[str]:
+        return self.effective("index-url")
+
+    @property
+    def trusted_hosts(self) -> List[str]:
+        return (self.effective("trusted-host") or "").split()
+
+    def items(self) -> List[Tuple[str, str]]:
+        """All entries, file values first, in `pip config list` form."""
+        return list(self.values.items()) + list(self.env.items())
+
+
+_Signature = Tuple[Tuple[str, Optional[Tuple[int, int, int]]], ...]
+
+
+def _signature(paths: List[str]) -> _Signature:
+    sig = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+        except OSError:
+            sig.append((path, None))
+        else:
+            sig.append((path, (st.st_mtime_ns, st.st_ino, st.st_size)))
+    return tuple(sig)
+
+
+class SnapshotCache:
+    """
+    Cache one ConfigSnapshot and rebuild it only when a watched file's mtime, inode or
+    size changes, or the PIP_* environment differs. Files are re-stat'ed at most once
+    per check_interval seconds. Thread-safe.
+    """
+
+    def __init__(self, check_interval: float = 1.0) -> None:
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._snapshot: Optional[ConfigSnapshot] = None
+        self._key: Optional[Tuple[_Signature, Dict[str, str]]] = None
+        self._checked = 0.0
+
+    def get(self, revalidate: bool = True) -> ConfigSnapshot:
+        """Return the cached snapshot; revalidate=False never touches the disk once warm."""
+        with self._lock:
+            now = time.monotonic()
+            if self._snapshot is not None and (not revalidate or now - self._checked < self.check_interval):
+                return self._snapshot
+            key = (_signature(_source_files()), env_values())
+            if self._snapshot is None or key != self._key:
+                values: Dict[str, str] = {}
+                for path, stat in key[0]:
+                    if stat is not None:
+                        values.update(read_file(path))
+                self._snapshot = ConfigSnapshot(values, key[1])
+                self._key = key
+            self._checked = now
+            return self._snapshot
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._snapshot = None
+
+
+_cache = SnapshotCache()
+
+
+def snapshot(revalidate: bool = True) -> ConfigSnapshot:
+    """Process-wide cached ConfigSnapshot."""
+    return _cache.get(revalidate)
+
+
+def invalidate() -> None:
+    """Drop the cached snapshot, e.g. after HOME or PIP_* changed in this process."""
+    _cache.invalidate()
+
+
+def snapshot_for(prefix: str) -> ConfigSnapshot:
+    """Uncached snapshot of what pip running in the environment at `prefix` would see."""
+    values: Dict[str, str] = {}
+    for path in _source_files(prefix):
+        values.update(read_file(path))
+    return ConfigSnapshot(values, env_values())
+
+
+def update(
+    scope: str,
+    set_values: Optional[Dict[str, str]] = None,
+    unset: Iterable[str] = (),
+    prefix: Optional[str] = None,
+) -> Optional[str]:
+    """
+    Apply all changes to the scope's config file in one atomic replace.
+    Returns the previous file content (None if the file did not exist) for rollback().
+    Missing keys in `unset` are ignored.
+    """
+    path = config_file(scope, prefix)
+    previous: Optional[str] = None
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            previous = f.read()
+    parser = _load(path)
+    for key, value in (set_values or {}).items():
+        section, name = _split_key(key)
+        if not parser.has_section(section):
+            parser.add_section(section)
+        parser.set(section, name, value)
+    for key in unset:
+        section, name = _split_key(key)
+        if parser.has_section(section):
+            parser.remove_option(section, name)
+            if not parser.items(section):
+                parser.remove_section(section)
+    buf = io.StringIO()
+    parser.write(buf)
+    fsutil.write_atomic(path, buf.getvalue(), prefix=".pip-conf-")
+    _cache.invalidate()
+    return previous
+
+
+def rollback(scope: str, previous: Optional[str], prefix: Optional[str] = None) -> None:
+    """Restore the scope's config file to the content returned by update()."""
+    path = config_file(scope, prefix)
+    if previous is None:
+        if os.path.exists(path):
+            os.unlink(path)
+    else:
+        fsutil.write_atomic(path, previous, prefix=".pip-conf-")
+    _cache.invalidate()
@@ -0,0 +1,653 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Local caching PyPI proxy (stdlib only).
+Serves the PEP 503 simple API and file downloads from one upstream mirror to the LAN.
+Several upstreams may be given (see failover): a request that times out or gets a 5xx
+is retried on the next one, each with its own timeout. Files are streamed to the client while being written to an on-disk content-addressed
+cache (objects/<sha256>) with size-bounded LRU eviction; index pages are cached and
+revalidated upstream with ETag / Last-Modified after a short TTL. The root listing is
+streamed through to the client and the cache rather than held in memory.
+"""
+from __future__ import annotations
+import base64
+import contextlib
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import BinaryIO, Dict, Iterator, List, Optional, Sequence, Set, TextIO, Tuple, Union
+
+from . import core, fsutil
+from .history import default_path
+
+DEFAULT_PORT = 3141
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+INDEX_TTL = 60.0  # seconds an index page is served without revalidation
+_COMPACT_AFTER = 10000  # journal lines before urls.json is rewritten
+_CHUNK = 64 * 1024
+_HREF = re.compile(r'href="([^"]+)"')
+# PEP 503 normalized project name: the only project path segment forwarded upstream
+_PROJECT = re.compile(r"[a-z0-9]+(?:-[a-z0-9]+)*")
+_UA = "pip-mirror-switcher-proxy/1.0"
+
+
+def _token(url: str) -> str:
+    return base64.urlsafe_b64encode(url.encode()).decode().rstrip("=")
+
+
+def _untoken(token: str) -> str:
+    return base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)).decode()
+
+
+def _retryable(error: OSError) -> bool:
+    """Timeouts, connection errors and 5xx move on to the next upstream; 4xx are final."""
+    return not isinstance(error, urllib.error.HTTPError) or error.code >= 500
+
+
+class _UrlLock:
+    __slots__ = ("lock", "users")
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.users = 0
+
+
+class ProxyCache:
+    """
+    On-disk cache: objects/<sha256> (file bodies), urls.json (url -> sha256) and
+    index/<sha1(url)>.{html,json} (index pages plus validators). LRU by object mtime,
+    which is refreshed on every hit. Changes to the URL table are appended to
+    urls.journal (one JSON [url, sha256 or null] per line) and folded into urls.json
+    on open, on close and whenever the journal outgrows _COMPACT_AFTER lines.
+    """
+
+    def __init__(self, root: str, max_bytes: int = DEFAULT_MAX_BYTES) -> None:
+        self.root = root
+        self.max_bytes = max_bytes
+        self.objects = os.path.join(root, "objects")
+        self.index_dir = os.path.join(root, "index")
+        os.makedirs(self.objects, exist_ok=True)
+        os.makedirs(self.index_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._url_locks: Dict[str, _UrlLock] = {}
+        self._urls_path = os.path.join(root, "urls.json")
+        self._journal_path = os.path.join(root, "urls.journal")
+        try:
+            with open(self._urls_path, encoding="utf-8") as f:
+                self._urls: Dict[str, str] = json.load(f)
+        except (OSError, ValueError):
+            self._urls = {}
+        try:
+            with open(self._journal_path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        url, digest = json.loads(line)
+                    except ValueError:
+                        continue  # torn last line of a crashed run
+                    if digest is None:
+                        self._urls.pop(url, None)
+                    else:
+                        self._urls[url] = digest
+        except OSError:
+            pass
+        self._journal: Optional[TextIO] = None
+        self._compact()
+        self.size = sum(e.stat().st_size for e in os.scandir(self.objects) if e.is_file())
+
+    def _compact(self) -> None:
+        """Write the URL table to urls.json and start an empty journal (caller holds _lock)."""
+        if self._journal is not None:
+            self._journal.close()
+        fsutil.write_atomic(self._urls_path, json.dumps(self._urls), prefix=".proxy-")
+        self._journal = open(self._journal_path, "w", encoding="utf-8")
+        self._journal_lines = 0
+
+    def _log(self, url: str, digest: Optional[str]) -> None:
+        """Record one URL table change (caller holds _lock)."""
+        if self._journal is None:
+            return  # closed
+        self._journal.write(json.dumps([url, digest]) + "\n")
+        self._journal.flush()
+        self._journal_lines += 1
+        if self._journal_lines > _COMPACT_AFTER:
+            self._compact()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._journal is not None:
+                self._compact()
+                self._journal.close()
+                self._journal = None
+
+    @contextlib.contextmanager
+    def url_lock(self, url: str) -> Iterator[None]:
+        """Serialise downloads of the same URL so concurrent misses fetch it once."""
+        with self._lock:
+            entry = self._url_locks.setdefault(url, _UrlLock())
+            entry.users += 1
+        try:
+            with entry.lock:
+                yield
+        finally:
+            with self._lock:
+                entry.users -= 1
+                if not entry.users:
+                    del self._url_locks[url]  # keep the table as small as the downloads in flight
+
+    def lookup(self, url: str) -> Optional[str]:
+        """Path of the cached body for url (and mark it recently used), or None."""
+        with self._lock:
+            digest = self._urls.get(url)
+        if digest is None:
+            return None
+        path = os.path.join(self.objects, digest)
+        try:
+            os.utime(path)
+        except OSError:
+            return None
+        return path
+
+    def open_cached(self, url: str) -> Optional[BinaryIO]:
+        """
+        The cached body for url opened for reading (and marked recently used), or None.
+        Opened under _lock so evict() cannot unlink it in between; an open file stays
+        readable after it is evicted.
+        """
+        with self._lock:
+            digest = self._urls.get(url)
+            if digest is None:
+                return None
+            path = os.path.join(self.objects, digest)
+            try:
+                f = open(path, "rb")
+            except OSError:
+                return None
+        with contextlib.suppress(OSError):
+            os.utime(path)
+        return f
+
+    def new_temp(self) -> Tuple[int, str]:
+        return tempfile.mkstemp(prefix=".part-", dir=self.objects)
+
+    def commit(self, url: str, tmp: str, digest: str) -> None:
+        path = os.path.join(self.objects, digest)
+        with self._lock:
+            if os.path.exists(path):
+                os.unlink(tmp)  # same content under another URL: store once
+            else:
+                os.replace(tmp, path)
+                self.size += os.path.getsize(path)
+            self._urls[url] = digest
+            self._log(url, digest)
+        self.evict()
+
+    def evict(self) -> None:
+        """Drop least recently used objects until the cache fits in max_bytes."""
+        with self._lock:
+            if self.size <= self.max_bytes:
+                return
+            entries = sorted(
+                (e for e in os.scandir(self.objects) if e.is_file() and not e.name.startswith(".")),
+                key=lambda e: e.stat().st_mtime,
+            )
+            dropped = set()
+            for entry in entries:
+                if self.size <= self.max_bytes:
+                    break
+                size = entry.stat().st_size
+                try:
+                    os.unlink(entry.path)
+                except OSError:
+                    continue  # being served on Windows: drop it on a later pass
+                self.size -= size
+                dropped.add(entry.name)
+            for url in [u for u, d in self._urls.items() if d in dropped]:
+                del self._urls[url]
+                self._log(url, None)
+
+    def index_paths(self, url: str) -> Tuple[str, str]:
+        key = hashlib.sha1(url.encode()).hexdigest()
+        return os.path.join(self.index_dir, key + ".html"), os.path.join(self.index_dir, key + ".json")
+
+    def get_index(self, url: str) -> Tuple[Optional[bytes], Dict[str, object]]:
+        body_path, meta_path = self.index_paths(url)
+        try:
+            with open(meta_path, encoding="utf-8") as f:
+                meta = json.load(f)
+            with open(body_path, "rb") as f:
+                return f.read(), meta
+        except (OSError, ValueError):
+            return None, {}
+
+    def put_index(self, url: str, body: bytes, meta: Dict[str, object]) -> None:
+        body_path, meta_path = self.index_paths(url)
+        fsutil.write_atomic(body_path, body, prefix=".proxy-")
+        fsutil.write_atomic(meta_path, json.dumps(meta), prefix=".proxy-")
+
+    def index_meta(self, url: str) -> Dict[str, object]:
+        """Validators of a cached index page, or {} when the page is not cached."""
+        body_path, meta_path = self.index_paths(url)
+        if not os.path.exists(body_path):
+            return {}
+        try:
+            with open(meta_path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def put_index_meta(self, url: str, meta: Dict[str, object]) -> None:
+        fsutil.write_atomic(self.index_paths(url)[1], json.dumps(meta), prefix=".proxy-")
+
+    def put_index_file(self, url: str, tmp: str, meta: Dict[str, object]) -> None:
+        """Install a fully written temp file as the cached body of url."""
+        os.replace(tmp, self.index_paths(url)[0])
+        self.put_index_meta(url, meta)
+
+
+class _Tee:
+    """Readable upstream response that copies every chunk it hands out to sink."""
+
+    def __init__(self, source: BinaryIO, sink: BinaryIO) -> None:
+        self.source = source
+        self.sink = sink
+        self.complete = False
+
+    def read(self, size: int) -> bytes:
+        chunk = self.source.read(size)
+        if chunk:
+            self.sink.write(chunk)
+        else:
+            self.complete = True
+        return chunk
+
+
+def _revalidation_headers(meta: Dict[str, object]) -> Dict[str, str]:
+    headers = {"User-Agent": _UA, "Accept": "text/html"}
+    if meta.get("etag"):
+        headers["If-None-Match"] = str(meta["etag"])
+    if meta.get("last_modified"):
+        headers["If-Modified-Since"] = str(meta["last_modified"])
+    return headers
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: "CachingProxy"
+    protocol_version = "HTTP/1.0"
+    headers_sent = False  # once True, a failing upstream can no longer be swapped out
+
+    def log_message(self, format: str, *args: object) -> None:
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def do_GET(self) -> None:
+        path = urllib.parse.urlsplit(self.path).path
+        try:
+            if path == "/simple" or path.startswith("/simple/"):
+                project = path[len("/simple"):].strip("/")
+                if project and not _PROJECT.fullmatch(project):
+                    self.send_error(404)
+                    return
+                self._serve_index(project)
+            elif path.startswith("/files/"):
+                parts = path.split("/")  # "", "files", project, token, filename
+                if len(parts) != 5 or not _PROJECT.fullmatch(parts[2]):
+                    self.send_error(404)
+                    return
+                url = _untoken(parts[3])
+                if parts[-1].endswith(".metadata") and not url.endswith(".metadata"):
+                    url += ".metadata"  # PEP 658 metadata next to the file
+                if not self._allowed(parts[2], url):
+                    self.send_error(404)
+                    return
+                self._serve_file(parts[2], url)
+            else:
+                self.send_error(404)
+        except (urllib.error.URLError, OSError, ValueError) as e:
+            if self.headers_sent:
+                # The body was already under way: a cut connection is the only honest signal
+                self.close_connection = True
+                return
+            try:
+                if isinstance(e, urllib.error.HTTPError):
+                    self.send_error(e.code, str(e.reason))
+                else:
+                    self.send_error(502, f"Upstream error: {e}")
+            except OSError:
+                pass  # client already gone
+
+    def _allowed(self, project: str, url: str) -> bool:
+        """
+        Only http(s) URLs on an upstream host, or on a file host an upstream project page
+        linked to, are fetched: the token is client input, so anything else (file://,
+        internal hosts) would turn the proxy into an open relay.
+        """
+        if self.server.allows(url):
+            return True
+        if urllib.parse.urlsplit(url).scheme not in ("http", "https"):
+            return False
+        # File hosts are learnt from project pages; after a restart the page may not
+        # have been served yet, so read it (usually from the index cache) and check again
+        for base, timeout in self.server.upstreams:
+            try:
+                body, final = self._fetch_index(base.rstrip("/") + f"/{project}/", timeout)
+            except OSError:
+                continue
+            self.server.learn_links(body, final)
+            if self.server.allows(url):
+                return True
+        return False
+
+    # --- index pages ---
+    def _fetch_index(self, url: str, timeout: float) -> Tuple[bytes, str]:
+        """
+        Body and final URL of one upstream project page, from cache within the TTL.
+        Project pages are small enough to hold whole; the root listing is streamed
+        by _open_root instead.
+        """
+        cache = self.server.cache
+        body, meta = cache.get_index(url)
+        if body is not None and time.time() - float(meta.get("fetched", 0)) < self.server.index_ttl:
+            return body, str(meta.get("url", url))
+        req = urllib.request.Request(url, headers=_revalidation_headers(meta if body is not None else {}))
+        try:
+            with urllib.request.urlopen(req, timeout=timeout) as resp:
+                body = resp.read()
+                final = resp.geturl()
+                meta = {"etag": resp.headers.get("ETag"), "last_modified": resp.headers.get("Last-Modified")}
+        except urllib.error.HTTPError as e:
+            if e.code != 304 or body is None:
+                raise
+            final = str(meta.get("url", url))  # not modified: keep the cached page
+        meta["fetched"] = time.time()
+        meta["url"] = final
+        cache.put_index(url, body, meta)
+        return body, final
+
+    @contextlib.contextmanager
+    def _open_root(self, url: str, timeout: float) -> Iterator[Tuple[Union[BinaryIO, _Tee], str]]:
+        """
+        The root listing (every project on the upstream, tens of MB) as a readable
+        stream plus its final URL: the cached copy within the TTL or on a 304, else the
+        upstream response, written to the cache chunk by chunk as it is read.
+        """
+        cache = self.server.cache
+        meta = cache.index_meta(url)
+        if not meta or time.time() - float(meta.get("fetched", 0)) >= self.server.index_ttl:
+            req = urllib.request.Request(url, headers=_revalidation_headers(meta))
+            try:
+                resp = urllib.request.urlopen(req, timeout=timeout)
+            except urllib.error.HTTPError as e:
+                if e.code != 304 or not meta:
+                    raise
+                meta["fetched"] = time.time()  # not modified: keep the cached page
+                cache.put_index_meta(url, meta)
+            else:
+                with resp:
+                    fresh: Dict[str, object] = {
+                        "etag": resp.headers.get("ETag"),
+                        "last_modified": resp.headers.get("Last-Modified"),
+                        "url": resp.geturl(),
+                    }
+                    fd, tmp = tempfile.mkstemp(prefix=".part-", dir=cache.index_dir)
+                    try:
+                        with os.fdopen(fd, "wb") as out:
+                            tee = _Tee(resp, out)
+                            yield tee, resp.geturl()
+                        if tee.complete:  # a page cut short is not worth keeping
+                            fresh["fetched"] = time.time()
+                            cache.put_index_file(url, tmp, fresh)
+                    finally:
+                        if os.path.exists(tmp):
+                            os.unlink(tmp)
+                return
+        with open(cache.index_paths(url)[0], "rb") as f:
+            yield f, str(meta.get("url", url))
+
+    def _serve_root(self) -> None:
+        error: Optional[OSError] = None
+        for base, timeout in self.server.upstreams:
+            try:
+                with self._open_root(base.rstrip("/") + "/", timeout) as (source, final):
+                    self.headers_sent = True
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/html; charset=utf-8")
+                    self.end_headers()  # no Content-Length: HTTP/1.0 ends the page with the connection
+                    for piece in self._rewrite_chunks(source, final):
+                        self.wfile.write(piece)
+                return
+            except OSError as e:
+                if not _retryable(e) or self.headers_sent:
+                    raise
+                error = e
+        raise error or OSError("no upstream configured")
+
+    def _serve_index(self, project: str) -> None:
+        if not project:
+            self._serve_root()
+            return
+        error: Optional[OSError] = None
+        for base, timeout in self.server.upstreams:
+            try:
+                body, final = self._fetch_index(base.rstrip("/") + f"/{project}/", timeout)
+            except OSError as e:
+                if not _retryable(e):
+                    raise
+                error = e
+                continue
+            self.server.learn_links(body, final)
+            page = self._rewrite(body, final, project)
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(page)))
+            self.end_headers()
+            self.wfile.write(page)
+            return
+        raise error or OSError("no upstream configured")
+
+    @staticmethod
+    def _rewrite(body: bytes, base: str, project: str) -> bytes:
+        """
+        Point links back at the proxy: project links on the root page to /simple/<name>/,
+        file links on project pages to /files/<project>/<token>/<filename>, keeping
+        #sha256 fragments.
+        """
+        def _sub(m: "re.Match[str]") -> str:
+            absolute, _, frag = urllib.parse.urljoin(base, m.group(1).replace("&amp;", "&")).partition("#")
+            name = urllib.parse.urlsplit(absolute).path.rstrip("/").rsplit("/", 1)[-1]
+            if not name:
+                return m.group(0)
+            if not project:
+                return f'href="/simple/{name}/"'
+            return f'href="/files/{project}/{_token(absolute)}/{name}' + (f"#{frag}" if frag else "") + '"'
+        return _HREF.sub(_sub, body.decode("utf-8", "replace")).encode("utf-8")
+
+    @classmethod
+    def _rewrite_chunks(cls, source: Union[BinaryIO, _Tee], base: str) -> Iterator[bytes]:
+        """_rewrite of the root page a chunk at a time, cut after a '>' so no href is split."""
+        pending = b""
+        while True:
+            chunk = source.read(_CHUNK)
+            if not chunk:
+                break
+            pending += chunk
+            cut = pending.rfind(b">") + 1
+            if cut:
+                yield cls._rewrite(pending[:cut], base, "")
+                pending = pending[cut:]
+        if pending:
+            yield cls._rewrite(pending, base, "")
+
+    # --- files ---
+    def _serve_file(self, project: str, url: str) -> None:
+        cache = self.server.cache
+        error: Optional[OSError] = None
+        for candidate, timeout in self._candidates(project, url):
+            with cache.url_lock(candidate):
+                cached = cache.open_cached(candidate)
+                if cached is None:
+                    try:
+                        self._fetch_and_stream(candidate, timeout)
+                        return
+                    except OSError as e:
+                        if not _retryable(e) or self.headers_sent:
+                            raise
+                        error = e
+                        continue
+            with cached:
+                self.send_response(200)
+                self.send_header("Content-Type", "application/octet-stream")
+                self.send_header("Content-Length", str(os.fstat(cached.fileno()).st_size))
+                self.end_headers()
+                shutil.copyfileobj(cached, self.wfile, _CHUNK)
+            return
+        raise error or OSError(f"{url} is not available from any upstream")
+
+    def _candidates(self, project: str, url: str) -> Iterator[Tuple[str, float]]:
+        """
+        url itself, then the same filename as listed by every other upstream's project
+        page (mirrors lay out /packages/ differently, so the URL cannot be rewritten).
+        """
+        origin = urllib.parse.urlsplit(url).netloc
+        yield url, self.server.timeout_for(url)
+        filename = urllib.parse.unquote(url.rsplit("/", 1)[-1])
+        metadata = filename.endswith(".metadata")
+        if metadata:
+            filename = filename[: -len(".metadata")]
+        for base, timeout in self.server.upstreams:
+            if urllib.parse.urlsplit(base).netloc == origin:
+                continue
+            try:
+                body, final = self._fetch_index(base.rstrip("/") + f"/{project}/", timeout)
+            except OSError:
+                continue
+            self.server.learn_links(body, final)
+            for href in _HREF.findall(body.decode("utf-8", "replace")):
+                absolute = urllib.parse.urljoin(final, href.replace("&amp;", "&")).partition("#")[0]
+                if urllib.parse.unquote(absolute.rsplit("/", 1)[-1]) == filename:
+                    yield absolute + (".metadata" if metadata else ""), timeout
+                    break
+
+    def _fetch_and_stream(self, url: str, timeout: float) -> None:
+        cache = self.server.cache
+        req = urllib.request.Request(url, headers={"User-Agent": _UA, "Accept-Encoding": "identity"})
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            self.headers_sent = True
+            self.send_response(200)
+            self.send_header("Content-Type", resp.headers.get("Content-Type", "application/octet-stream"))
+            if resp.headers.get("Content-Length"):
+                self.send_header("Content-Length", resp.headers["Content-Length"])
+            self.end_headers()
+            fd, tmp = cache.new_temp()
+            digest = hashlib.sha256()
+            client_ok = True
+            try:
+                with os.fdopen(fd, "wb") as out:
+                    while True:
+                        chunk = resp.read(_CHUNK)
+                        if not chunk:
+                            break
+                        out.write(chunk)
+                        digest.update(chunk)
+                        if client_ok:
+                            try:
+                                self.wfile.write(chunk)
+                            except OSError:
+                                client_ok = False  # keep filling the cache for the next client
+                cache.commit(url, tmp, digest.hexdigest())
+            except BaseException:
+                if os.path.exists(tmp):
+                    os.unlink(tmp)
+                raise
+
+
+class CachingProxy(ThreadingHTTPServer):
+    """
+    Threaded HTTP server exposing `<index_url>` = http://host:port/simple/ for pip.
+    upstream is a simple index URL, e.g. core.MIRRORS[name][0] or a local stand-in, or
+    an ordered list of (index URL, timeout seconds) tried in turn on timeouts and 5xx.
+    """
+    daemon_threads = True
+
+    def __init__(
+        self,
+        upstream: Union[str, Sequence[Tuple[str, float]]],
+        cache_dir: Optional[str] = None,
+        host: str = "127.0.0.1",
+        port: int = DEFAULT_PORT,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        index_ttl: float = INDEX_TTL,
+        timeout: float = 30.0,
+        verbose: bool = False,
+    ) -> None:
+        super().__init__((host, port), _Handler)
+        self.upstreams: List[Tuple[str, float]] = (
+            [(upstream, timeout)] if isinstance(upstream, str) else [(u, float(t)) for u, t in upstream]
+        )
+        self.cache = ProxyCache(cache_dir or default_cache_dir(), max_bytes)
+        self.index_ttl = index_ttl
+        self.timeout = timeout
+        self.verbose = verbose
+        self._hosts_lock = threading.Lock()
+        # netlocs files may be fetched from: the upstreams plus hosts their project pages link to
+        self.file_hosts: Set[str] = {urllib.parse.urlsplit(u).netloc.lower() for u, _t in self.upstreams}
+
+    def server_close(self) -> None:
+        super().server_close()
+        self.cache.close()
+
+    def allows(self, url: str) -> bool:
+        parts = urllib.parse.urlsplit(url)
+        if parts.scheme not in ("http", "https"):
+            return False
+        with self._hosts_lock:
+            return parts.netloc.lower() in self.file_hosts
+
+    def learn_links(self, body: bytes, base: str) -> None:
+        """Remember the http(s) hosts an upstream project page links files to."""
+        hosts = set()
+        for href in _HREF.findall(body.decode("utf-8", "replace")):
+            parts = urllib.parse.urlsplit(urllib.parse.urljoin(base, href.replace("&amp;", "&")))
+            if parts.scheme in ("http", "https") and parts.netloc:
+                hosts.add(parts.netloc.lower())
+        with self._hosts_lock:
+            self.file_hosts |= hosts
+
+    @property
+    def upstream(self) -> str:
+        return self.upstreams[0][0]
+
+    def timeout_for(self, url: str) -> float:
+        """Timeout of the upstream serving url (files may live on another host, e.g. a CDN)."""
+        netloc = urllib.parse.urlsplit(url).netloc
+        return next((t for u, t in self.upstreams if urllib.parse.urlsplit(u).netloc == netloc), self.timeout)
+
+    @property
+    def index_url(self) -> str:
+        host, port = self.server_address[:2]
+        if host in ("0.0.0.0", "::", ""):
+            host = "127.0.0.1"
+        return f"http://{host}:{port}/simple"
+
+    def start_background(self) -> threading.Thread:
+        thread = threading.Thread(target=self.serve_forever, name="pypi-proxy", daemon=True)
+        thread.start()
+        return thread
+
+
+def default_cache_dir() -> str:
+    return os.path.join(os.path.dirname(default_path()), "proxy-cache")
+
+
+def point_pip_at(proxy: CachingProxy, scope: str) -> None:
+    """Configure pip (via core) to install through the proxy."""
+    host = urllib.parse.urlsplit(proxy.index_url).hostname or "127.0.0.1"
+    core.set_index(proxy.index_url, host, scope, label="local proxy")
@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+End-to-end resolver benchmark: replay a requirements file through pip against each
+mirror. Every run gets its own temporary cache and download directory and ignores the
+user's pip config, so mirrors are measured cold and independently. pip runs from the
+requirements file's directory, so relative `-r`/`-c` and `./pkg` lines resolve as they
+do for the user; runs still going at the deadline are killed. Records wall time,
+bytes and per-file timings and turns them into the same (name, ms) ranking that
+speedtest.benchmark_mirrors returns.
+"""
+from __future__ import annotations
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional, Tuple
+
+from .speedtest import MirrorMap, run_concurrently
+
+MODES = ("download", "dry-run")
+DEFAULT_TIMEOUT = 900.0
+_WATCH_POLL = 0.2
+_COLLECTING = re.compile(r"^Collecting (\S+)")
+_DOWNLOADING = re.compile(r"^\s*Downloading (\S+)(?: \(([\d.]+) (kB|MB|GB|bytes?)\))?")
+_UNITS = {"byte": 1, "bytes": 1, "kB": 1000, "MB": 1000 ** 2, "GB": 1000 ** 3}
+
+
+@dataclass
+class FileTiming:
+    requirement: str
+    filename: Optional[str] = None
+    nbytes: int = 0
+    seconds: float = 0.0
+
+
+@dataclass
+class ReplayResult:
+    seconds: float = 0.0
+    nbytes: int = 0
+    files: List[FileTiming] = field(default_factory=list)
+    returncode: Optional[int] = None
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None and self.returncode == 0
+
+
+def _pip_command(mode: str, python: str, index_url: str, host: str, requirements: str, work: str) -> List[str]:
+    cmd = [python, "-m", "pip"]
+    if mode == "download":
+        cmd += ["download", "--no-deps", "-d", os.path.join(work, "dest")]
+    elif mode == "dry-run":
+        cmd += ["install", "--dry-run", "--ignore-installed"]
+    else:
+        raise ValueError(f"mode must be one of: {', '.join(MODES)}")
+    return cmd + [
+        "-r", requirements,
+        "--index-url", index_url,
+        "--trusted-host", host,
+        "--cache-dir", os.path.join(work, "cache"),
+        "--progress-bar", "off",
+        "--disable-pip-version-check",
+        "--no-input",
+    ]
+
+
+def _isolated_env() -> dict:
+    """Environment without the caller's PIP_* settings or config files."""
+    env = {k: v for k, v in os.environ.items() if not k.startswith("PIP_")}
+    env["PIP_CONFIG_FILE"] = os.devnull
+    env["PYTHONUNBUFFERED"] = "1"
+    return env
+
+
+def _dir_size(path: str) -> int:
+    total = 0
+    for root, _dirs, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def replay_mirror(
+    index_url: str,
+    host: str,
+    requirements: str,
+    mode: str = "download",
+    timeout: float = DEFAULT_TIMEOUT,
+    python: str = sys.executable,
+    stop: Optional[threading.Event] = None,
+) -> ReplayResult:
+    """
+    Run pip once against one mirror. Per-file timings come from timestamping pip's
+    `Collecting`/`Downloading` lines as they are printed. pip is killed after timeout
+    seconds, or as soon as stop is set. Never raises.
+    """
+    result = ReplayResult()
+    stop = stop if stop is not None else threading.Event()
+    if stop.is_set():
+        result.error = "deadline exceeded"
+        return result
+    work = tempfile.mkdtemp(prefix="pip-replay-")
+    try:
+        requirements = os.path.abspath(requirements)
+        cmd = _pip_command(mode, python, index_url, host, requirements, work)
+        start = time.perf_counter()
+        proc = subprocess.Popen(
+            cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, env=_isolated_env(),
+            cwd=os.path.dirname(requirements),
+        )
+
+        def _watch() -> None:
+            # Kill pip at its own timeout or as soon as the benchmark's deadline passes
+            end = time.monotonic() + timeout
+            while proc.poll() is None:
+                if stop.is_set() or time.monotonic() >= end:
+                    proc.kill()
+                    return
+                time.sleep(_WATCH_POLL)
+
+        threading.Thread(target=_watch, name="replay-watch", daemon=True).start()
+        current: Optional[FileTiming] = None
+        tail: List[str] = []
+        try:
+            assert proc.stdout is not None
+            for line in proc.stdout:
+                now = time.perf_counter() - start
+                tail = (tail + [line.rstrip()])[-5:]
+                m = _COLLECTING.match(line)
+                if m:
+                    if current is not None:
+                        current.seconds = now - current.seconds
+                    current = FileTiming(m.group(1), seconds=now)
+                    result.files.append(current)
+                    continue
+                m = _DOWNLOADING.match(line)
+                # PEP 658 "Downloading foo.whl.metadata" lines precede the file itself
+                if m and current is not None and not m.group(1).endswith(".metadata"):
+                    current.filename = m.group(1).rsplit("/", 1)[-1]
+                    if m.group(2):
+                        current.nbytes = int(float(m.group(2)) * _UNITS[m.group(3)])
+            result.returncode = proc.wait()
+        finally:
+            if proc.poll() is None:
+                proc.kill()
+                proc.wait()
+        result.seconds = time.perf_counter() - start
+        if current is not None:
+            current.seconds = result.seconds - current.seconds
+        dest = os.path.join(work, "dest")
+        result.nbytes = _dir_size(dest) if os.path.isdir(dest) else sum(f.nbytes for f in result.files)
+        if result.returncode != 0:
+            if stop.is_set():
+                result.error = "deadline exceeded"
+            elif result.seconds >= timeout:
+                result.error = "timed out"
+            else:
+                result.error = "\n".join(tail) or f"pip exited with {result.returncode}"
+    except (OSError, ValueError) as e:
+        result.error = str(e) or type(e).__name__
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+    return result
+
+
+def benchmark_replay(
+    mirrors: MirrorMap,
+    requirements: str,
+    mode: str = "download",
+    timeout: float = DEFAULT_TIMEOUT,
+    progress: Optional[Callable[[str], None]] = None,
+    max_workers: int = 2,
+    deadline: Optional[float] = None,
+    cancel: Optional[threading.Event] = None,
+) -> List[Tuple[str, ReplayResult]]:
+    """
+    Replay requirements against every mirror, at most max_workers pip processes at a
+    time (they share the local downlink). Returns (name, ReplayResult), fastest first.
+    pip processes still running at the deadline, or when cancel is set, are killed.
+    """
+    if mode not in MODES:
+        raise ValueError(f"mode must be one of: {', '.join(MODES)}")
+    if not os.path.isfile(requirements):
+        raise ValueError(f"requirements file not found: {requirements}")
+
+    def _task(name: str, index_url: str) -> ReplayResult:
+        return replay_mirror(index_url, mirrors[name][1], requirements, mode, timeout, stop=stop)
+
+    def _done(name: str, res: ReplayResult) -> None:
+        if progress:
+            progress(f"{name} 源测试完成：" + (f"{res.seconds:.1f}s" if res.ok else "超时/失败"))
+
+    if progress:
+        for name in mirrors:
+            progress(f"正在测试 {name} 源…")
+    stop = threading.Event()
+    try:
+        got = run_concurrently(
+            mirrors, _task, ReplayResult(error="deadline exceeded"), max_workers, deadline, _done, cancel
+        )
+    finally:
+        stop.set()  # run_concurrently does not wait for stragglers; their pip must not live on
+    results = [(name, got[name]) for name in mirrors]
+    results.sort(key=lambda x: (not x[1].ok, x[1].seconds))
+    return results
+
+
+def replay_ranking(results: List[Tuple[str, ReplayResult]]) -> List[Tuple[str, float]]:
+    """(name, ms) with inf for failed runs, like speedtest.benchmark_mirrors."""
+    ranking = [(name, res.seconds * 1000.0 if res.ok else float("inf")) for name, res in results]
+    ranking.sort(key=lambda x: (x[1] == float("inf"), x[1]))
+    return ranking
+
+
+def format_replay(results: List[Tuple[str, ReplayResult]], per_file: bool = False) -> str:
+    lines = ["依赖解析/下载基准（越小越好）："]
+    for i, (name, res) in enumerate(results, 1):
+        if not res.ok:
+            reason = (res.error or "").strip().splitlines()
+            lines.append(f"{i:>2}. {name:<8}  超时/失败  {reason[-1] if reason else ''}".rstrip())
+            continue
+        lines.append(f"{i:>2}. {name:<8}  {res.seconds:.1f}s  {res.nbytes / 1e6:.1f}MB  {len(res.files)} 个文件")
+        if per_file:
+            for f in sorted(res.files, key=lambda f: -f.seconds):
+                lines.append(f"      {f.seconds:6.2f}s  {f.filename or f.requirement}")
+    return "\n".join(lines)
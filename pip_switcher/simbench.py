@@ -0,0 +1,355 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Offline benchmark suite (stdlib only).
+Starts local PEP 503 stand-in mirrors on 127.0.0.1 with injectable delay, bandwidth
+cap, error rate and hangs, and runs the speed tests against them in reproducible
+scenarios (e.g. 50 mirrors with 10% dead). Records wall time, whether the winner was
+the stand-in that is fastest by construction, and peak traced memory. pip_sandbox()
+points pip's user/global config at a temporary directory so config operations can be
+timed without touching the real pip.conf. Nothing here talks to the internet.
+"""
+from __future__ import annotations
+import contextlib
+import hashlib
+import http.server
+import io
+import os
+import random
+import shutil
+import statistics
+import tempfile
+import threading
+import time
+import tracemalloc
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from . import core, pipconf
+from .speedtest import PROBE_PROJECT, MirrorMap
+from .throughput import REFERENCE_PROJECT
+
+MODES = ("latency", "phases", "adaptive", "throughput")
+_CHUNK = 16 * 1024
+# Project -> (file name, size); the names are what speedtest and throughput look for
+FILES = {
+    PROBE_PROJECT: ("six-1.16.0-py2.py3-none-any.whl", 11 * 1024),
+    REFERENCE_PROJECT: ("numpy-2.0.0-cp312-cp312-manylinux_2_17_x86_64.whl", 2 * 1024 * 1024),
+}
+
+
+@dataclass
+class StandIn:
+    """Behaviour of one stand-in mirror."""
+    delay_ms: float = 0.0  # added before every response
+    bandwidth: float = 0.0  # bytes/s for response bodies, 0 = unlimited
+    error_rate: float = 0.0  # share of requests answered with 503
+    hang: bool = False  # accept connections but never answer
+
+    @property
+    def healthy(self) -> bool:
+        return not self.hang and self.error_rate == 0.0
+
+
+def _payload(filename: str, size: int) -> bytes:
+    seed = hashlib.sha256(filename.encode()).digest()
+    return (seed * (size // len(seed) + 1))[:size]
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    server: "StandInServer"
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format: str, *args: object) -> None:  # noqa: A002 - quiet
+        pass
+
+    def do_GET(self) -> None:
+        spec = self.server.spec
+        if spec.hang:
+            self.server.stopping.wait()
+            return
+        if spec.delay_ms:
+            time.sleep(spec.delay_ms / 1000.0)
+        if spec.error_rate and self.server.roll() < spec.error_rate:
+            self._send(503, b"stand-in error", "text/plain")
+            return
+        path = self.path.split("?", 1)[0]
+        if path in ("/simple", "/simple/"):
+            links = "".join(f'<a href="/simple/{p}/">{p}</a>\n' for p in FILES)
+            self._send(200, f"<!DOCTYPE html><html><body>\n{links}</body></html>".encode(), "text/html")
+        elif path.startswith("/simple/") and path.strip("/").split("/")[-1] in FILES:
+            filename, _size = FILES[path.strip("/").split("/")[-1]]
+            digest = hashlib.sha256(self.server.file(filename)).hexdigest()
+            link = f'<a href="/files/{filename}#sha256={digest}">{filename}</a>'
+            self._send(200, f"<!DOCTYPE html><html><body>\n{link}\n</body></html>".encode(), "text/html")
+        elif path.startswith("/files/"):
+            self._send(200, self.server.file(path[len("/files/"):]), "application/octet-stream")
+        else:
+            self._send(404, b"not found", "text/plain")
+
+    def _send(self, status: int, body: bytes, ctype: str) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        rate = self.server.spec.bandwidth
+        try:
+            for i in range(0, len(body), _CHUNK):
+                chunk = body[i:i + _CHUNK]
+                self.wfile.write(chunk)
+                if rate > 0:
+                    time.sleep(len(chunk) / rate)
+        except (ConnectionError, OSError):
+            self.close_connection = True
+
+
+class StandInServer(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+    # Many clients connect at once in the large scenarios
+    request_queue_size = 128
+
+    def __init__(self, spec: StandIn, seed: int = 0) -> None:
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.spec = spec
+        self.stopping = threading.Event()
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._files: Dict[str, bytes] = {}
+
+    @property
+    def index_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/simple"
+
+    def roll(self) -> float:
+        with self._lock:
+            return self._rng.random()
+
+    def file(self, filename: str) -> bytes:
+        sizes = {name: size for name, size in FILES.values()}
+        if filename not in sizes:
+            return b""
+        with self._lock:
+            if filename not in self._files:
+                self._files[filename] = _payload(filename, sizes[filename])
+            return self._files[filename]
+
+    def stop(self) -> None:
+        self.stopping.set()
+        self.shutdown()
+        self.server_close()
+
+
+@contextlib.contextmanager
+def stand_ins(specs: Dict[str, StandIn], seed: int = 0) -> Iterator[MirrorMap]:
+    """Serve every spec on its own loopback port; yields a MirrorMap of them."""
+    servers: Dict[str, StandInServer] = {}
+    try:
+        for i, (name, spec) in enumerate(specs.items()):
+            srv = StandInServer(spec, seed + i)
+            # Short poll interval: stopping 50 servers one after another should not take 25 s
+            threading.Thread(
+                target=srv.serve_forever, args=(0.05,), name=f"standin-{name}", daemon=True
+            ).start()
+            servers[name] = srv
+        yield {name: (srv.index_url, "127.0.0.1") for name, srv in servers.items()}
+    finally:
+        for srv in servers.values():
+            srv.stop()
+
+
+@contextlib.contextmanager
+def pip_sandbox() -> Iterator[str]:
+    """
+    Point pip's user and global config (and this app's data dir) at a temporary
+    directory and hide PIP_* variables, restoring everything afterwards. The site
+    scope lives under sys.prefix and is not redirected.
+    """
+    root = tempfile.mkdtemp(prefix="pip-sandbox-")
+    saved = dict(os.environ)
+    try:
+        for key in [k for k in os.environ if k.startswith("PIP_")]:
+            del os.environ[key]
+        home = os.path.join(root, "home")
+        os.makedirs(home)
+        os.environ.update({
+            "HOME": home, "USERPROFILE": home,
+            "XDG_CONFIG_HOME": os.path.join(home, ".config"),
+            "XDG_CONFIG_DIRS": os.path.join(root, "etc", "xdg"),
+            "APPDATA": os.path.join(home, "AppData"), "PROGRAMDATA": os.path.join(root, "ProgramData"),
+        })
+        pipconf.invalidate()
+        yield root
+    finally:
+        os.environ.clear()
+        os.environ.update(saved)
+        pipconf.invalidate()
+        shutil.rmtree(root, ignore_errors=True)
+
+
+@dataclass
+class Scenario:
+    name: str
+    specs: Dict[str, StandIn]
+    mode: str = "latency"
+    timeout: float = 1.0
+    deadline: Optional[float] = 5.0
+    description: str = ""
+
+    @property
+    def expected(self) -> Optional[str]:
+        """The stand-in that should win by construction: healthy and fastest (or widest)."""
+        healthy = {name: s for name, s in self.specs.items() if s.healthy}
+        if not healthy:
+            return None
+        if self.mode == "throughput":
+            return max(healthy, key=lambda n: healthy[n].bandwidth or float("inf"))
+        return min(healthy, key=lambda n: healthy[n].delay_ms)
+
+
+def _distinct_delays(rng: random.Random, n: int, low: float, high: float) -> List[float]:
+    return [round(d, 1) for d in rng.sample([low + (high - low) * i / n for i in range(n)], n)]
+
+
+def build_scenarios(seed: int = 1) -> Dict[str, Scenario]:
+    rng = random.Random(seed)
+    six = dict(zip(core.MIRRORS, _distinct_delays(rng, 6, 20.0, 140.0)))
+    fifty = _distinct_delays(rng, 50, 10.0, 300.0)
+    dead = set(rng.sample(range(50), 5))
+    lossy_delays = _distinct_delays(rng, 10, 20.0, 120.0)
+    bandwidths = [1.0, 2.0, 3.0, 4.0, 6.0, 8.0]
+    rng.shuffle(bandwidths)
+    scenarios = [
+        Scenario("six", {name: StandIn(delay) for name, delay in six.items()},
+                 description="six mirrors, like the first six in the catalog"),
+        Scenario("fifty-dead", {f"m{i:02d}": StandIn(delay, hang=i in dead) for i, delay in enumerate(fifty)},
+                 description="50 mirrors, 10% hang"),
+        Scenario("lossy", {f"m{i:02d}": StandIn(delay, error_rate=0.3 if i % 3 == 0 else 0.0)
+                           for i, delay in enumerate(lossy_delays)},
+                 description="10 mirrors, every third answers 30% of requests with 503"),
+        Scenario("bandwidth", {f"m{i:02d}": StandIn(30.0, bandwidth=mb * 1e6) for i, mb in enumerate(bandwidths)},
+                 mode="throughput", timeout=5.0, deadline=60.0,
+                 description="six mirrors, equal latency, 1-8 MB/s caps"),
+    ]
+    return {s.name: s for s in scenarios}
+
+
+@dataclass
+class RunResult:
+    wall_s: float
+    winner: Optional[str]
+    peak_kb: float
+
+
+@dataclass
+class ScenarioReport:
+    scenario: Scenario
+    runs: List[RunResult] = field(default_factory=list)
+
+    @property
+    def accuracy(self) -> float:
+        if not self.runs:
+            return 0.0
+        return sum(1 for r in self.runs if r.winner == self.scenario.expected) / len(self.runs)
+
+    @property
+    def wall_s(self) -> float:
+        return statistics.median(r.wall_s for r in self.runs) if self.runs else float("inf")
+
+    @property
+    def peak_kb(self) -> float:
+        return max((r.peak_kb for r in self.runs), default=0.0)
+
+
+def _winner(mode: str, mirrors: MirrorMap, scenario: Scenario) -> Optional[str]:
+    from . import speedtest, throughput
+    common = dict(timeout=scenario.timeout, deadline=scenario.deadline, max_workers=16)
+    if mode == "latency":
+        ranking = speedtest.benchmark_mirrors(mirrors, **common)
+    elif mode == "phases":
+        ranking = speedtest.phase_ranking(speedtest.benchmark_phases(mirrors, **common))
+    elif mode == "adaptive":
+        ranking = [(name, st.p50) for name, st in speedtest.benchmark_adaptive(mirrors, **common)]
+    elif mode == "throughput":
+        bw = throughput.benchmark_throughput(
+            mirrors, max_bytes=FILES[REFERENCE_PROJECT][1], timeout=scenario.timeout, deadline=scenario.deadline
+        )
+        return next((name for name, res in bw if res.error is None), None)
+    else:
+        raise ValueError(f"mode must be one of: {', '.join(MODES)}")
+    return next((name for name, ms in ranking if ms != float("inf")), None)
+
+
+def run_scenario(
+    scenario: Scenario,
+    repeat: int = 3,
+    mode: Optional[str] = None,
+    progress: Optional[Callable[[str], None]] = None,
+) -> ScenarioReport:
+    """Run one scenario `repeat` times against fresh stand-ins. Peak memory is what
+    tracemalloc saw during each run (stand-in server threads included)."""
+    report = ScenarioReport(scenario)
+    with stand_ins(scenario.specs) as mirrors:
+        for i in range(repeat):
+            if progress:
+                progress(f"正在运行场景 {scenario.name}（第 {i + 1}/{repeat} 次）…")
+            tracemalloc.start()
+            start = time.perf_counter()
+            try:
+                winner = _winner(mode or scenario.mode, mirrors, scenario)
+                wall = time.perf_counter() - start
+                peak = tracemalloc.get_traced_memory()[1] / 1024.0
+            finally:
+                tracemalloc.stop()
+            report.runs.append(RunResult(wall, winner, peak))
+    return report
+
+
+@dataclass
+class ConfigTiming:
+    op: str
+    samples: List[float] = field(default_factory=list)  # ms
+
+    @property
+    def median_ms(self) -> float:
+        return statistics.median(self.samples) if self.samples else float("inf")
+
+    @property
+    def max_ms(self) -> float:
+        return max(self.samples, default=float("inf"))
+
+
+def bench_config(iterations: int = 20, backend: Optional[str] = None) -> List[ConfigTiming]:
+    """Time set_index / current_mirror / reset_mirror (user scope) inside pip_sandbox()."""
+    index_url, host = next(iter(core.MIRRORS.values()))
+    ops: List[Tuple[str, Callable[[], object]]] = [
+        ("set_index", lambda: core.set_index(index_url, host, "user", backend=backend)),
+        ("current_mirror", lambda: core.current_mirror()),
+        ("reset_mirror", lambda: core.reset_mirror("user", backend=backend)),
+    ]
+    timings = [ConfigTiming(op) for op, _fn in ops]
+    with pip_sandbox(), contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(iterations):
+            for timing, (_op, fn) in zip(timings, ops):
+                start = time.perf_counter()
+                fn()
+                timing.samples.append((time.perf_counter() - start) * 1000.0)
+    return timings
+
+
+def format_reports(reports: List[ScenarioReport]) -> str:
+    lines = ["离线基准结果（墙钟时间取中位数；准确率 = 选中预期最优镜像的比例）:"]
+    for r in reports:
+        s = r.scenario
+        winners = ", ".join(sorted({str(run.winner) for run in r.runs}))
+        lines.append(
+            f"- {s.name:<11} {r.wall_s:6.2f}s  准确率 {r.accuracy:.0%}"
+            f"  峰值内存 {r.peak_kb:.0f}KB  预期 {s.expected}，实际 {winners}  ({s.description})"
+        )
+    return "\n".join(lines)
+
+
+def format_config(timings: List[ConfigTiming]) -> str:
+    lines = ["配置操作耗时（中位数 / 最大，单位：ms）:"]
+    for t in timings:
+        lines.append(f"- {t.op:<15} {t.median_ms:7.2f} / {t.max_ms:.2f}")
+    return "\n".join(lines)
@@ -3,15 +3,43 @@
 """
 Mirror speed test utilities (no external deps).
 Measures latency by performing a lightweight HTTP GET to the mirror's /simple index.
+Probes run concurrently on a small thread pool, so a full pass takes roughly as long
+as the slowest single probe rather than the sum of all of them.
+ProbePool keeps connections alive per host so cold (first connect) and warm
+(reused connection) latency can be reported separately, and probe_phases breaks a
+single probe down into DNS / connect / TLS / TTFB / body time.
+benchmark_adaptive keeps sampling only close contenders and reports p50/p95/jitter.
 """
 from __future__ import annotations
+import http.client
+import socket
+import ssl
+import threading
 import time
+import urllib.parse
 import urllib.request
 import urllib.error
-from typing import Dict, Tuple, List, Callable, Optional
+from dataclasses import dataclass
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, as_completed, wait
+from concurrent.futures import TimeoutError as FuturesTimeout
+from typing import Dict, Iterable, Iterator, Tuple, List, Callable, Optional, Set, TypeVar
+
+from . import telemetry
 
 # Type alias for clarity
 MirrorMap = Dict[str, Tuple[str, str]]  # name -> (index_url, host)
+PoolKey = Tuple[str, str, int]  # (scheme, host, port)
+R = TypeVar("R")
+
+# Small project page used for keep-alive probes; the root /simple/ page is far too
+# large to drain, and an undrained response cannot be reused.
+PROBE_PROJECT = "six"
+_REDIRECTS = {301, 302, 303, 307, 308}
+_HEADERS = {
+    "User-Agent": "pip-mirror-switcher/1.0 (+https://python.org)",
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+    "Accept-Encoding": "identity",
+}
 
 
 def _probe(url: str, timeout: float = 3.5) -> float:
@@ -22,16 +50,332 @@ def _probe(url: str, timeout: float = 3.5) -> float:
         "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
         "Connection": "close",
     })
-    try:
-        with urllib.request.urlopen(req, timeout=timeout) as resp:
-            # Read a small chunk then close
-            resp.read(128)
-    except (urllib.error.URLError, urllib.error.HTTPError, TimeoutError):
-        return float("inf")
-    except Exception:
-        return float("inf")
+    with telemetry.span("probe", url=url) as sp:
+        try:
+            with urllib.request.urlopen(req, timeout=timeout) as resp:
+                # Read a small chunk then close
+                resp.read(128)
+        except (urllib.error.URLError, urllib.error.HTTPError, TimeoutError) as e:
+            sp.fail(e, timeout=telemetry.is_timeout(e))
+            return float("inf")
+        except Exception as e:
+            sp.fail(e)
+            return float("inf")
+        else:
+            return time.perf_counter() - start
+
+
+@dataclass
+class ProbeTiming:
+    """Per-phase timings (ms) of one probe; phases are summed across redirect hops."""
+    dns_ms: float = 0.0
+    connect_ms: float = 0.0
+    tls_ms: float = 0.0
+    ttfb_ms: float = 0.0
+    body_ms: float = 0.0
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    @property
+    def total_ms(self) -> float:
+        if self.error is not None:
+            return float("inf")
+        return self.dns_ms + self.connect_ms + self.tls_ms + self.ttfb_ms + self.body_ms
+
+    @property
+    def bottleneck(self) -> Optional[str]:
+        """Name of the slowest phase, or None for a failed probe."""
+        if self.error is not None:
+            return None
+        phases = {"dns": self.dns_ms, "connect": self.connect_ms, "tls": self.tls_ms,
+                  "ttfb": self.ttfb_ms, "body": self.body_ms}
+        return max(phases, key=phases.__getitem__)
+
+
+def _timed_get(
+    url: str, timeout: float, body_bytes: int, timing: ProbeTiming, address: Optional[Tuple[int, str]] = None
+) -> Tuple[int, Optional[str]]:
+    parts = urllib.parse.urlsplit(url)
+    https = parts.scheme == "https"
+    host = parts.hostname or ""
+    port = parts.port or (443 if https else 80)
+    path = (parts.path or "/") + ("?" + parts.query if parts.query else "")
+
+    t0 = time.perf_counter()
+    if address is not None:
+        # Pinned (family, ip): skip the resolver; TLS still verifies against the host name
+        family, ip = address
+        sockaddr = (ip, port) if family == socket.AF_INET else (ip, port, 0, 0)
+        infos = [(family, socket.SOCK_STREAM, 0, "", sockaddr)]
     else:
-        return time.perf_counter() - start
+        infos = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    t1 = time.perf_counter()
+    timing.dns_ms += (t1 - t0) * 1000.0
+
+    sock: Optional[socket.socket] = None
+    last_err: Optional[OSError] = None
+    for family, socktype, proto, _canon, addr in infos:
+        candidate = socket.socket(family, socktype, proto)
+        candidate.settimeout(timeout)
+        try:
+            candidate.connect(addr)
+        except OSError as e:
+            candidate.close()
+            last_err = e
+            continue
+        sock = candidate
+        break
+    if sock is None:
+        raise last_err or OSError(f"No address for {host}")
+    t2 = time.perf_counter()
+    timing.connect_ms += (t2 - t1) * 1000.0
+
+    try:
+        if https:
+            sock = ssl.create_default_context().wrap_socket(sock, server_hostname=host)
+        t3 = time.perf_counter()
+        timing.tls_ms += (t3 - t2) * 1000.0
+        cls = http.client.HTTPSConnection if https else http.client.HTTPConnection
+        conn = cls(host, port, timeout=timeout)
+        conn.sock = sock  # already connected; http.client skips its own connect()
+        conn.request("GET", path, headers=dict(_HEADERS, Connection="close"))
+        resp = conn.getresponse()
+        t4 = time.perf_counter()
+        timing.ttfb_ms += (t4 - t3) * 1000.0
+        resp.read(body_bytes)
+        timing.body_ms += (time.perf_counter() - t4) * 1000.0
+        return resp.status, resp.getheader("Location")
+    finally:
+        sock.close()
+
+
+def probe_phases(
+    url: str,
+    timeout: float = 3.5,
+    body_bytes: int = 128,
+    max_redirects: int = 3,
+    address: Optional[Tuple[int, str]] = None,
+) -> ProbeTiming:
+    """
+    GET url on a fresh connection and time each phase: resolver, TCP connect,
+    TLS handshake, time to first byte and reading `body_bytes` of the body.
+    address=(family, ip) connects to that address instead of resolving url's host;
+    redirects to another host resolve normally.
+    Never raises; failures are recorded in ProbeTiming.error.
+    """
+    timing = ProbeTiming()
+    pinned = urllib.parse.urlsplit(url).hostname
+    with telemetry.span("probe_phases", url=url, address=address[1] if address else None) as sp:
+        try:
+            for _ in range(max_redirects + 1):
+                same_host = urllib.parse.urlsplit(url).hostname == pinned
+                status, location = _timed_get(url, timeout, body_bytes, timing, address if same_host else None)
+                if status in _REDIRECTS and location:
+                    url = urllib.parse.urljoin(url, location)
+                    continue
+                if status >= 400:
+                    raise http.client.HTTPException(f"HTTP {status}")
+                return timing
+            raise http.client.HTTPException("too many redirects")
+        except (OSError, http.client.HTTPException) as e:
+            timing.error = str(e) or type(e).__name__
+            sp.fail(e, timeout=telemetry.is_timeout(e))
+            return timing
+
+
+class ProbePool:
+    """
+    Keep-alive HTTP(S) connections for the speed tester, reused per (scheme, host, port).
+    This is what pip sees on a session that fetches many files from the same index.
+    Safe to share between probe threads.
+    """
+
+    def __init__(self, timeout: float = 3.5, max_idle_per_host: int = 4) -> None:
+        self.timeout = timeout
+        self.max_idle_per_host = max_idle_per_host
+        self._idle: Dict[PoolKey, List[http.client.HTTPConnection]] = {}
+        self._lock = threading.Lock()
+
+    def __enter__(self) -> "ProbePool":
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
+
+    def _connect(self, key: PoolKey) -> http.client.HTTPConnection:
+        scheme, host, port = key
+        cls = http.client.HTTPSConnection if scheme == "https" else http.client.HTTPConnection
+        return cls(host, port, timeout=self.timeout)
+
+    def _acquire(self, key: PoolKey) -> Tuple[http.client.HTTPConnection, bool]:
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                return idle.pop(), True
+        return self._connect(key), False
+
+    def _release(self, key: PoolKey, conn: http.client.HTTPConnection) -> None:
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.max_idle_per_host:
+                idle.append(conn)
+                return
+        conn.close()
+
+    def close(self) -> None:
+        with self._lock:
+            conns = [c for idle in self._idle.values() for c in idle]
+            self._idle.clear()
+        for conn in conns:
+            conn.close()
+
+    @staticmethod
+    def _send(conn: http.client.HTTPConnection, path: str) -> http.client.HTTPResponse:
+        conn.request("GET", path, headers=_HEADERS)
+        return conn.getresponse()
+
+    def _get(self, url: str, max_body: int) -> Tuple[int, Optional[str], bool]:
+        parts = urllib.parse.urlsplit(url)
+        port = parts.port or (443 if parts.scheme == "https" else 80)
+        key: PoolKey = (parts.scheme, parts.hostname or "", port)
+        path = (parts.path or "/") + ("?" + parts.query if parts.query else "")
+        conn, reused = self._acquire(key)
+        try:
+            try:
+                resp = self._send(conn, path)
+            except (http.client.RemoteDisconnected, ConnectionError):
+                if not reused:
+                    raise
+                # The server dropped our idle connection; retry once on a fresh one
+                conn.close()
+                conn, reused = self._connect(key), False
+                resp = self._send(conn, path)
+            resp.read(max_body)
+        except BaseException:
+            conn.close()
+            raise
+        # Only a fully drained response leaves the connection reusable
+        if resp.isclosed() and not resp.will_close:
+            self._release(key, conn)
+        else:
+            conn.close()
+        return resp.status, resp.getheader("Location"), reused
+
+    def fetch(self, url: str, max_body: int = 256 * 1024, max_redirects: int = 3) -> Tuple[float, bool]:
+        """
+        GET url through the pool, following redirects.
+        Returns (elapsed seconds, reused) where reused tells whether an idle connection served
+        the final response. Raises OSError or http.client.HTTPException on failure.
+        """
+        start = time.perf_counter()
+        for _ in range(max_redirects + 1):
+            status, location, reused = self._get(url, max_body)
+            if status in _REDIRECTS and location:
+                url = urllib.parse.urljoin(url, location)
+                continue
+            if status >= 400:
+                raise http.client.HTTPException(f"HTTP {status} for {url}")
+            return time.perf_counter() - start, reused
+        raise http.client.HTTPException(f"Too many redirects for {url}")
+
+
+def _probe_cold_warm(url: str, pool: ProbePool, warm_attempts: int) -> Tuple[float, float]:
+    """Return (cold, warm) seconds: the first request opens a connection, later ones reuse it."""
+    try:
+        cold, _ = pool.fetch(url)
+    except (OSError, http.client.HTTPException):
+        return float("inf"), float("inf")
+    warm = []
+    for _ in range(warm_attempts):
+        try:
+            warm.append(pool.fetch(url)[0])
+        except (OSError, http.client.HTTPException):
+            warm.append(float("inf"))
+    return cold, (min(warm) if warm else float("inf"))
+
+
+def _to_ms(seconds: float) -> float:
+    return seconds * 1000.0 if seconds != float("inf") else float("inf")
+
+
+def human_ms(ms: float) -> str:
+    return "超时/失败" if ms == float("inf") else f"{ms:.0f}ms"
+
+
+class Cancelled(Exception):
+    """Raised by the benchmarks when their cancel event is set."""
+
+
+_CANCEL_POLL = 0.1  # seconds between checks of a cancel event
+
+
+def completed_within(
+    futures: Iterable[Future], deadline: Optional[float], cancel: Optional[threading.Event] = None
+) -> Iterator[Future]:
+    """
+    as_completed(futures, timeout=deadline) that also raises Cancelled soon after cancel
+    is set. Shared by every engine that fans probes out over a pool.
+    """
+    if cancel is None:
+        yield from as_completed(futures, timeout=deadline)
+        return
+    end = None if deadline is None else time.monotonic() + deadline
+    pending = set(futures)
+    while pending:
+        if cancel.is_set():
+            raise Cancelled()
+        wait_for = _CANCEL_POLL if end is None else min(_CANCEL_POLL, end - time.monotonic())
+        if wait_for <= 0:
+            raise FuturesTimeout()
+        done, pending = wait(pending, timeout=wait_for, return_when=FIRST_COMPLETED)
+        yield from done
+
+
+def _sample_mirrors(
+    mirrors: MirrorMap,
+    attempts: int,
+    probe: Callable[[str], R],
+    max_workers: int,
+    deadline: Optional[float],
+    on_done: Optional[Callable[[str, List[R]], None]] = None,
+    cancel: Optional[threading.Event] = None,
+) -> Dict[str, List[R]]:
+    """
+    Run `attempts` probes of every mirror's /simple/ URL on one bounded pool.
+    Returns name -> samples; on_done fires in the calling thread once a mirror's last
+    sample arrives, or for every unfinished mirror when the deadline expires.
+    Setting cancel abandons the outstanding probes and raises Cancelled.
+    """
+    samples: Dict[str, List[R]] = {name: [] for name in mirrors}
+    remaining: Dict[str, int] = {name: attempts for name in mirrors}
+    jobs = [
+        (name, index_url.rstrip("/") + "/")  # ensure trailing slash to hit /simple/
+        for name, (index_url, _host) in mirrors.items()
+        for _ in range(attempts)
+    ]
+    if not jobs:
+        return samples
+    pool = ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(jobs))), thread_name_prefix="speedtest")
+    futures = {pool.submit(probe, target): name for name, target in jobs}
+    try:
+        for fut in completed_within(futures, deadline, cancel):
+            name = futures[fut]
+            samples[name].append(fut.result())
+            remaining[name] -= 1
+            if remaining[name] == 0 and on_done:
+                on_done(name, samples[name])
+    except FuturesTimeout:
+        # Deadline hit: report stragglers with whatever samples they have
+        for name, left in remaining.items():
+            if left > 0 and on_done:
+                on_done(name, samples[name])
+    finally:
+        # Do not wait on stragglers; each is bounded by its own socket timeout
+        pool.shutdown(wait=False, cancel_futures=True)
+    return samples
 
 
 def benchmark_mirrors(
@@ -39,34 +383,331 @@ def benchmark_mirrors(
     attempts: int = 2,
     timeout: float = 3.5,
     progress: Optional[Callable[[str], None]] = None,
+    max_workers: int = 8,
+    deadline: Optional[float] = None,
+    cancel: Optional[threading.Event] = None,
 ) -> List[Tuple[str, float]]:
     """
-    Benchmark mirrors and return a list of (name, avg_ms) sorted by fastest.
+    Benchmark mirrors concurrently and return a list of (name, avg_ms) sorted by fastest.
     - attempts: number of probes per mirror; uses min latency to reduce noise
     - timeout: per-request timeout seconds
+    - max_workers: cap on the number of probes in flight at once
+    - deadline: overall budget in seconds; mirrors without a sample by then count as failed
+    - cancel: event checked while waiting; once set the run stops with Cancelled
     """
-    results: List[Tuple[str, float]] = []
-    for name, (index_url, _host) in mirrors.items():
-        if progress:
+    if progress:
+        for name in mirrors:
             progress(f"正在测试 {name} 源…")
-        target = index_url.rstrip("/") + "/"  # ensure trailing slash to hit /simple/
-        samples = []
-        for _ in range(attempts):
-            elapsed = _probe(target, timeout=timeout)
-            samples.append(elapsed)
-        best = min(samples) if samples else float("inf")
-        avg_ms = best * 1000.0 if best != float("inf") else float("inf")
-        results.append((name, avg_ms))
+
+    def _done(name: str, got: List[float]) -> None:
+        if progress:
+            progress(f"{name} 源测试完成：{human_ms(_to_ms(min(got, default=float('inf'))))}")
+
+    with telemetry.span("benchmark_mirrors", mirrors=len(mirrors), attempts=attempts):
+        samples = _sample_mirrors(
+            mirrors, attempts, lambda url: _probe(url, timeout), max_workers, deadline, _done, cancel
+        )
+    results: List[Tuple[str, float]] = []
+    for name in mirrors:
+        best = min(samples[name]) if samples[name] else float("inf")
+        results.append((name, _to_ms(best)))
     # sort, treating inf as very large
     results.sort(key=lambda x: (x[1] == float("inf"), x[1]))
+    telemetry.record_ranking(results)
+    if progress:
+        progress("测速完成。正在计算推荐结果…")
+    return results
+
+
+def benchmark_phases(
+    mirrors: MirrorMap,
+    attempts: int = 2,
+    timeout: float = 3.5,
+    progress: Optional[Callable[[str], None]] = None,
+    max_workers: int = 8,
+    deadline: Optional[float] = None,
+    cancel: Optional[threading.Event] = None,
+) -> List[Tuple[str, ProbeTiming]]:
+    """
+    Like benchmark_mirrors, but keep the per-phase breakdown of each mirror's fastest
+    probe. Returns (name, ProbeTiming) sorted by total time.
+    """
+    if progress:
+        for name in mirrors:
+            progress(f"正在测试 {name} 源…")
+
+    def _best(got: List[ProbeTiming]) -> ProbeTiming:
+        return min(got, key=lambda t: t.total_ms, default=ProbeTiming(error="deadline exceeded"))
+
+    def _done(name: str, got: List[ProbeTiming]) -> None:
+        if progress:
+            progress(f"{name} 源测试完成：{human_ms(_best(got).total_ms)}")
+
+    with telemetry.span("benchmark_phases", mirrors=len(mirrors), attempts=attempts):
+        samples = _sample_mirrors(
+            mirrors, attempts, lambda url: probe_phases(url, timeout), max_workers, deadline, _done, cancel
+        )
+    results = [(name, _best(samples[name])) for name in mirrors]
+    results.sort(key=lambda x: (x[1].total_ms == float("inf"), x[1].total_ms))
+    telemetry.record_ranking(phase_ranking(results))
+    if progress:
+        progress("测速完成。正在计算推荐结果…")
+    return results
+
+
+@dataclass
+class SampleStats:
+    """Latency distribution of one mirror from the adaptive sampler (ms)."""
+    samples: List[float]
+    failures: int = 0
+    dropped: bool = False  # stopped early as a clear loser
+
+    @property
+    def attempts(self) -> int:
+        return len(self.samples) + self.failures
+
+    @property
+    def failure_rate(self) -> float:
+        return self.failures / self.attempts if self.attempts else 1.0
+
+    def percentile(self, q: float) -> float:
+        """Linear-interpolated percentile, q in [0, 100]; inf without samples."""
+        if not self.samples:
+            return float("inf")
+        data = sorted(self.samples)
+        pos = (len(data) - 1) * q / 100.0
+        lo = int(pos)
+        hi = min(lo + 1, len(data) - 1)
+        return data[lo] + (data[hi] - data[lo]) * (pos - lo)
+
+    @property
+    def p50(self) -> float:
+        return self.percentile(50)
+
+    @property
+    def p95(self) -> float:
+        return self.percentile(95)
+
+    @property
+    def jitter(self) -> float:
+        """Standard deviation of successful samples."""
+        n = len(self.samples)
+        if n < 2:
+            return 0.0
+        mean = sum(self.samples) / n
+        return (sum((x - mean) ** 2 for x in self.samples) / (n - 1)) ** 0.5
+
+    def interval(self, z: float = 1.96) -> Tuple[float, float]:
+        """Approximate confidence interval of the mean."""
+        n = len(self.samples)
+        if n == 0:
+            return float("inf"), float("inf")
+        mean = sum(self.samples) / n
+        half = z * self.jitter / n ** 0.5
+        return mean - half, mean + half
+
+
+def benchmark_adaptive(
+    mirrors: MirrorMap,
+    min_samples: int = 3,
+    max_samples: int = 10,
+    batch: int = 2,
+    timeout: float = 3.5,
+    progress: Optional[Callable[[str], None]] = None,
+    max_workers: int = 8,
+    deadline: Optional[float] = None,
+    max_failure_rate: float = 0.5,
+    cancel: Optional[threading.Event] = None,
+) -> List[Tuple[str, SampleStats]]:
+    """
+    Probe mirrors until the ranking is settled and return (name, SampleStats) sorted by p50.
+    Every mirror gets min_samples probes; after that only contenders whose confidence
+    interval still overlaps the leader's get `batch` more, up to max_samples. Mirrors
+    whose interval is clearly above the leader's, or that fail too often, stop early.
+    """
+    stats: Dict[str, SampleStats] = {name: SampleStats([]) for name in mirrors}
+    active = dict(mirrors)
+    end = time.monotonic() + deadline if deadline is not None else None
+    if progress:
+        for name in mirrors:
+            progress(f"正在测试 {name} 源…")
+
+    def _collect(round_mirrors: MirrorMap, n: int) -> None:
+        budget = None if end is None else max(end - time.monotonic(), 0.0)
+        got = _sample_mirrors(round_mirrors, n, lambda url: _probe(url, timeout), max_workers, budget, cancel=cancel)
+        for name, values in got.items():
+            st = stats[name]
+            st.samples.extend(_to_ms(v) for v in values if v != float("inf"))
+            # probes cut off by the deadline count as failures too
+            st.failures += n - len([v for v in values if v != float("inf")])
+
+    reported: Set[str] = set()
+
+    def _settled(name: str) -> None:
+        # A mirror's result is final once it gets no more samples: report it right away
+        if progress and name not in reported:
+            reported.add(name)
+            progress(f"{name} 源测试完成：{human_ms(stats[name].p50)}")
+
+    _collect(active, min_samples)
+    while active:
+        for name in list(active):
+            if stats[name].attempts >= min_samples and stats[name].failure_rate > max_failure_rate:
+                stats[name].dropped = True
+                del active[name]
+                _settled(name)
+        if len(active) <= 1:
+            break
+        leader = min(active, key=lambda n: stats[n].p50)
+        _, leader_hi = stats[leader].interval()
+        for name in list(active):
+            lo, _ = stats[name].interval()
+            if name != leader and lo > leader_hi:
+                stats[name].dropped = True
+                del active[name]
+                _settled(name)
+        # Keep sampling contenders (and the leader against them) while intervals overlap
+        contenders = {n: m for n, m in active.items() if stats[n].attempts < max_samples}
+        for name in active:
+            if name not in contenders:
+                _settled(name)
+        if len(active) <= 1 or not contenders or (end is not None and time.monotonic() >= end):
+            break
+        _collect(contenders, min(batch, max_samples - min(stats[n].attempts for n in contenders)))
+
+    for name in mirrors:
+        _settled(name)
+    results = [(name, stats[name]) for name in mirrors]
+    results.sort(key=lambda x: (x[1].p50 == float("inf"), x[1].p50))
     if progress:
         progress("测速完成。正在计算推荐结果…")
     return results
 
 
-def format_ranking(ranking: List[Tuple[str, float]]) -> str:
+def run_concurrently(
+    mirrors: MirrorMap,
+    task: Callable[[str, str], R],
+    failed: R,
+    max_workers: int = 8,
+    deadline: Optional[float] = None,
+    on_done: Optional[Callable[[str, R], None]] = None,
+    cancel: Optional[threading.Event] = None,
+) -> Dict[str, R]:
+    """
+    Run task(name, index_url) for every mirror on a bounded thread pool.
+    Returns name -> result; mirrors still running when the deadline expires get `failed`.
+    on_done is called from the calling thread as each mirror finishes. Setting cancel
+    stops waiting and raises Cancelled.
+    """
+    results: Dict[str, R] = {}
+    if not mirrors:
+        return results
+    pool = ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(mirrors))), thread_name_prefix="speedtest")
+    futures = {pool.submit(task, name, index_url): name for name, (index_url, _host) in mirrors.items()}
+    try:
+        for fut in completed_within(futures, deadline, cancel):
+            name = futures[fut]
+            try:
+                results[name] = fut.result()
+            except Exception:
+                results[name] = failed
+            if on_done:
+                on_done(name, results[name])
+    except FuturesTimeout:
+        for name in mirrors:
+            if name not in results:
+                results[name] = failed
+                if on_done:
+                    on_done(name, failed)
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+    return results
+
+
+def benchmark_cold_warm(
+    mirrors: MirrorMap,
+    attempts: int = 3,
+    timeout: float = 3.5,
+    progress: Optional[Callable[[str], None]] = None,
+    max_workers: int = 8,
+    deadline: Optional[float] = None,
+    cancel: Optional[threading.Event] = None,
+) -> List[Tuple[str, float, float]]:
+    """
+    Benchmark mirrors over keep-alive connections and return (name, cold_ms, warm_ms)
+    sorted by warm latency, which is what a multi-file `pip install` mostly pays.
+    - attempts: total requests per mirror; the first is cold, the rest reuse its connection
+    """
+    pool = ProbePool(timeout=timeout)
+
+    def _task(name: str, index_url: str) -> Tuple[float, float]:
+        target = index_url.rstrip("/") + "/" + PROBE_PROJECT + "/"
+        return _probe_cold_warm(target, pool, max(attempts - 1, 1))
+
+    def _done(name: str, res: Tuple[float, float]) -> None:
+        if progress:
+            cold, warm = res
+            progress(f"{name} 源测试完成：冷连接 {human_ms(_to_ms(cold))} / 复用 {human_ms(_to_ms(warm))}")
+
+    if progress:
+        for name in mirrors:
+            progress(f"正在测试 {name} 源…")
+    try:
+        samples = run_concurrently(
+            mirrors, _task, (float("inf"), float("inf")), max_workers, deadline, _done, cancel
+        )
+    finally:
+        pool.close()
+    results = [(name, _to_ms(samples[name][0]), _to_ms(samples[name][1])) for name in mirrors]
+    results.sort(key=lambda x: (x[2] == float("inf"), x[2], x[1]))
+    if progress:
+        progress("测速完成。正在计算推荐结果…")
+    return results
+
+
+def format_phases(timing: ProbeTiming) -> str:
+    """One-line phase breakdown, e.g. 'DNS 3 / TCP 21 / TLS 40 / TTFB 85 / body 2'."""
+    if not timing.ok:
+        return f"失败：{timing.error}"
+    return (
+        f"DNS {timing.dns_ms:.0f} / TCP {timing.connect_ms:.0f} / TLS {timing.tls_ms:.0f}"
+        f" / TTFB {timing.ttfb_ms:.0f} / body {timing.body_ms:.0f}"
+    )
+
+
+def phase_ranking(results: List[Tuple[str, ProbeTiming]]) -> List[Tuple[str, float]]:
+    """Reduce benchmark_phases output to the (name, ms) ranking used elsewhere."""
+    return [(name, timing.total_ms) for name, timing in results]
+
+
+def format_ranking(
+    ranking: List[Tuple[str, float]],
+    phases: Optional[Dict[str, ProbeTiming]] = None,
+) -> str:
     lines = ["测速结果（单位：ms，越小越好）:"]
     for i, (name, ms) in enumerate(ranking, 1):
-        human = "超时/失败" if ms == float("inf") else f"{ms:.0f}ms"
-        lines.append(f"{i:>2}. {name:<8}  {human}")
+        line = f"{i:>2}. {name:<8}  {human_ms(ms)}"
+        if phases and name in phases and phases[name].ok:
+            line += f"  ({format_phases(phases[name])})"
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def format_stats(results: List[Tuple[str, SampleStats]]) -> str:
+    lines = ["测速结果（p50 / p95 / 抖动，单位：ms；失败率）:"]
+    for i, (name, st) in enumerate(results, 1):
+        if not st.samples:
+            lines.append(f"{i:>2}. {name:<8}  超时/失败")
+            continue
+        lines.append(
+            f"{i:>2}. {name:<8}  {st.p50:.0f} / {st.p95:.0f} / ±{st.jitter:.0f}"
+            f"  失败 {st.failure_rate:.0%}  n={st.attempts}" + ("  (提前淘汰)" if st.dropped else "")
+        )
+    return "\n".join(lines)
+
+
+def format_cold_warm(results: List[Tuple[str, float, float]]) -> str:
+    lines = ["测速结果（冷连接 / 复用连接，单位：ms，越小越好）:"]
+    for i, (name, cold, warm) in enumerate(results, 1):
+        lines.append(f"{i:>2}. {name:<8}  {human_ms(cold):>8} / {human_ms(warm)}")
     return "\n".join(lines)
@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Built-in timing spans, counters and gauges (stdlib only).
+Instrumented code wraps work in `with span("probe", url=url):`. Every finished span
+feeds a per-name duration histogram plus failure/timeout counters kept in memory, and,
+once configure(trace_path=...) is called, is appended to a JSONL trace file. The
+metrics render as OpenMetrics text, written to a file or served over HTTP for
+Prometheus-style scrapers. Spans nest per thread (parent ids), so a slow `switch`
+shows where its time went: set_index > config_write > pip_config.
+"""
+from __future__ import annotations
+import contextlib
+import functools
+import itertools
+import json
+import math
+import os
+import socket
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, TypeVar
+
+from . import fsutil
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+PREFIX = "pip_switcher"
+CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+
+Labels = Tuple[Tuple[str, str], ...]
+F = TypeVar("F", bound=Callable[..., Any])
+
+
+def is_timeout(error: BaseException) -> bool:
+    """Timeouts, including urllib's URLError wrapping a socket timeout."""
+    reason = getattr(error, "reason", None)
+    return isinstance(error, (TimeoutError, socket.timeout)) or isinstance(reason, (TimeoutError, socket.timeout))
+
+
+class Span:
+    __slots__ = ("name", "attrs", "span_id", "parent_id", "start", "duration", "status", "error")
+
+    def __init__(self, name: str, attrs: Dict[str, Any], span_id: int, parent_id: Optional[int]) -> None:
+        self.name = name
+        self.attrs = attrs
+        self.span_id = span_id
+        self.parent_id = parent_id
+        self.start = time.time()
+        self.duration = 0.0
+        self.status = "ok"  # ok | error | timeout
+        self.error: Optional[str] = None
+
+    def set(self, **attrs: Any) -> None:
+        self.attrs.update(attrs)
+
+    def fail(self, error: Any, timeout: bool = False) -> None:
+        """Mark the span failed without raising (for code that returns inf instead)."""
+        self.status = "timeout" if timeout else "error"
+        self.error = str(error) or type(error).__name__
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name, "span_id": self.span_id, "parent_id": self.parent_id,
+            "start": round(self.start, 6), "duration_ms": round(self.duration * 1000.0, 3),
+            "status": self.status, "error": self.error, "thread": threading.current_thread().name,
+            "attrs": self.attrs,
+        }
+
+
+class _Histogram:
+    __slots__ = ("counts", "total", "count")
+
+    def __init__(self) -> None:
+        self.counts = [0] * len(BUCKETS)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                self.counts[i] += 1
+        self.total += value
+        self.count += 1
+
+
+class Registry:
+    """In-memory metrics. Safe to use from any thread."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._histograms: Dict[str, _Histogram] = {}
+        self._counters: Dict[Tuple[str, Labels], float] = {}
+        self._gauges: Dict[Tuple[str, Labels], float] = {}
+        self._help: Dict[str, str] = {}
+
+    def inc(self, name: str, value: float = 1.0, help: str = "", **labels: str) -> None:  # noqa: A002
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0.0) + value
+            if help:
+                self._help.setdefault(name, help)
+
+    def set_gauge(self, name: str, value: float, help: str = "", **labels: str) -> None:  # noqa: A002
+        with self._lock:
+            self._gauges[(name, tuple(sorted(labels.items())))] = value
+            if help:
+                self._help.setdefault(name, help)
+
+    def observe_span(self, sp: Span) -> None:
+        with self._lock:
+            self._histograms.setdefault(sp.name, _Histogram()).observe(sp.duration)
+        if sp.status == "error":
+            self.inc("failures", help="Spans that ended in an error.", span=sp.name)
+        elif sp.status == "timeout":
+            self.inc("timeouts", help="Spans that ended in a timeout.", span=sp.name)
+
+    def counter(self, name: str, **labels: str) -> float:
+        with self._lock:
+            return self._counters.get((name, tuple(sorted(labels.items()))), 0.0)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+            self._gauges.clear()
+
+    def render(self) -> str:
+        """OpenMetrics text exposition of everything recorded so far."""
+        with self._lock:
+            histograms = {name: (list(h.counts), h.total, h.count) for name, h in self._histograms.items()}
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+            helps = dict(self._help)
+        lines: List[str] = []
+        if histograms:
+            family = f"{PREFIX}_span_duration_seconds"
+            lines += [f"# TYPE {family} histogram", f"# UNIT {family} seconds",
+                      f"# HELP {family} Duration of instrumented operations."]
+            for name in sorted(histograms):
+                counts, total, count = histograms[name]
+                span = _escape(name)
+                for bound, n in zip(BUCKETS, counts):
+                    lines.append(f'{family}_bucket{{span="{span}",le="{float(bound)!r}"}} {n}')
+                lines.append(f'{family}_bucket{{span="{span}",le="+Inf"}} {count}')
+                lines.append(f'{family}_count{{span="{span}"}} {count}')
+                lines.append(f'{family}_sum{{span="{span}"}} {_num(total)}')
+        for kind, samples, suffix in (("counter", counters, "_total"), ("gauge", gauges, "")):
+            for name in sorted({n for n, _labels in samples}):
+                family = f"{PREFIX}_{name}"
+                lines.append(f"# TYPE {family} {kind}")
+                if name in helps:
+                    lines.append(f"# HELP {family} {helps[name]}")
+                for (n, labels), value in sorted(samples.items()):
+                    if n == name:
+                        lines.append(f"{family}{suffix}{_labels(labels)} {_num(value)}")
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(str(v))}"' for k, v in labels) + "}"
+
+
+def _num(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if math.isnan(value):
+        return "NaN"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class JsonlExporter:
+    """Appends finished spans to a file, one JSON object per line."""
+
+    def __init__(self, path: str) -> None:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = open(path, "a", encoding="utf-8")
+
+    def export(self, sp: Span) -> None:
+        line = json.dumps(sp.to_dict(), ensure_ascii=False, default=str)
+        with self._lock:
+            if not self._file.closed:
+                self._file.write(line + "\n")
+                self._file.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            self._file.close()
+
+
+registry = Registry()
+_exporter: Optional[JsonlExporter] = None
+_metrics_path: Optional[str] = None
+_ids = itertools.count(1)
+_local = threading.local()
+
+
+def configure(trace_path: Optional[str] = None, metrics_path: Optional[str] = None) -> None:
+    """Start exporting spans to trace_path; flush() writes metrics to metrics_path."""
+    global _exporter, _metrics_path
+    if _exporter is not None:
+        _exporter.close()
+    _exporter = JsonlExporter(trace_path) if trace_path else None
+    _metrics_path = metrics_path
+
+
+def flush() -> None:
+    """Write the OpenMetrics file (if configured) and close the trace file."""
+    global _exporter
+    if _metrics_path:
+        write_metrics(_metrics_path)
+    if _exporter is not None:
+        _exporter.close()
+        _exporter = None
+
+
+def write_metrics(path: str) -> None:
+    fsutil.write_atomic(path, registry.render(), prefix=".metrics-")
+
+
+@contextlib.contextmanager
+def span(name: str, **attrs: Any) -> Iterator[Span]:
+    """Time the block. Exceptions mark the span error/timeout and propagate."""
+    stack: List[Span] = getattr(_local, "stack", None) or []
+    _local.stack = stack
+    sp = Span(name, attrs, next(_ids), stack[-1].span_id if stack else None)
+    stack.append(sp)
+    start = time.perf_counter()
+    try:
+        yield sp
+    except BaseException as e:
+        if sp.status == "ok":
+            sp.fail(e, timeout=is_timeout(e))
+        raise
+    finally:
+        sp.duration = time.perf_counter() - start
+        stack.pop()
+        registry.observe_span(sp)
+        exporter = _exporter
+        if exporter is not None:
+            exporter.export(sp)
+
+
+def traced(name: str) -> Callable[[F], F]:
+    """Decorator form of span() for whole functions."""
+    def deco(fn: F) -> F:
+        @functools.wraps(fn)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper  # type: ignore[return-value]
+    return deco
+
+
+def inc(name: str, value: float = 1.0, help: str = "", **labels: str) -> None:  # noqa: A002
+    registry.inc(name, value, help, **labels)
+
+
+def set_gauge(name: str, value: float, help: str = "", **labels: str) -> None:  # noqa: A002
+    registry.set_gauge(name, value, help, **labels)
+
+
+def record_ranking(ranking: List[Tuple[str, float]]) -> None:
+    """Per-mirror latency/up gauges from a (name, ms) ranking."""
+    for name, ms in ranking:
+        set_gauge("mirror_latency_milliseconds", ms, "Latest measured mirror latency.", mirror=name)
+        set_gauge("mirror_up", 0.0 if ms == float("inf") else 1.0, "Whether the mirror answered.", mirror=name)
+
+
+def serve_metrics(bind: str = "127.0.0.1", port: int = 9464) -> "http.server.ThreadingHTTPServer":
+    """Serve GET /metrics on a daemon thread; call .shutdown() to stop."""
+    import http.server  # only the metrics command needs it; core imports this module on every start
+
+    class _MetricsHandler(http.server.BaseHTTPRequestHandler):
+        def log_message(self, format: str, *args: object) -> None:  # noqa: A002 - quiet
+            pass
+
+        def do_GET(self) -> None:
+            if self.path.split("?", 1)[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = http.server.ThreadingHTTPServer((bind, port), _MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    return server
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Sustained-throughput benchmark (no external deps).
+Finds a reference wheel on each mirror through its simple page and streams a bounded
+number of bytes of it, so mirrors can be ranked by MB/s as well as latency.
+"""
+from __future__ import annotations
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from dataclasses import dataclass, field
+from html.parser import HTMLParser
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .speedtest import MirrorMap, run_concurrently
+
+# Large, universally mirrored project whose wheels are several MB each
+REFERENCE_PROJECT = "numpy"
+DEFAULT_MAX_BYTES = 8 * 1024 * 1024
+# Latency share of the combined score; the rest goes to throughput
+LATENCY_WEIGHT = 0.4
+_CHUNK = 64 * 1024
+_HEADERS = {
+    "User-Agent": "pip-mirror-switcher/1.0 (+https://python.org)",
+    "Accept-Encoding": "identity",
+}
+
+
+@dataclass
+class ThroughputResult:
+    """Bytes streamed from one mirror's reference artifact and the resulting rate."""
+    url: Optional[str] = None
+    nbytes: int = 0
+    seconds: float = 0.0
+    # Range size -> MB/s, filled when benchmark_throughput is given range_sizes
+    ranges: Dict[int, float] = field(default_factory=dict)
+    error: Optional[str] = None
+
+    @property
+    def mbps(self) -> float:
+        """Megabytes per second after the first byte, 0.0 on failure."""
+        if self.error is not None or self.seconds <= 0:
+            return 0.0
+        return self.nbytes / self.seconds / 1e6
+
+
+class LinkParser(HTMLParser):
+    def __init__(self) -> None:
+        super().__init__()
+        self.links: List[str] = []
+
+    def handle_starttag(self, tag: str, attrs: List[Tuple[str, Optional[str]]]) -> None:
+        if tag == "a":
+            href = dict(attrs).get("href")
+            if href:
+                self.links.append(href)
+
+
+def find_reference_artifact(index_url: str, project: str = REFERENCE_PROJECT, timeout: float = 5.0) -> str:
+    """Return the absolute URL of the newest wheel listed on the project's simple page."""
+    page = index_url.rstrip("/") + "/" + project + "/"
+    req = urllib.request.Request(page, headers=_HEADERS)
+    with urllib.request.urlopen(req, timeout=timeout) as resp:
+        html = resp.read().decode("utf-8", "replace")
+        page = resp.geturl()
+    parser = LinkParser()
+    parser.feed(html)
+    wheels = [h for h in parser.links if urllib.parse.urlsplit(h).path.endswith(".whl")]
+    if not wheels:
+        raise LookupError(f"No wheel found for {project} at {page}")
+    # Simple pages list files oldest first
+    return urllib.parse.urljoin(page, wheels[-1])
+
+
+def _stream(url: str, max_bytes: int, timeout: float, ranged: bool = False) -> Tuple[int, float]:
+    """Read up to max_bytes of url; return (bytes, seconds after the first byte)."""
+    headers = dict(_HEADERS)
+    if ranged:
+        headers["Range"] = f"bytes=0-{max_bytes - 1}"
+    req = urllib.request.Request(url, headers=headers)
+    with urllib.request.urlopen(req, timeout=timeout) as resp:
+        first = resp.read(1)
+        start = time.perf_counter()
+        total = len(first)
+        while first and total < max_bytes:
+            chunk = resp.read(min(_CHUNK, max_bytes - total))
+            if not chunk:
+                break
+            total += len(chunk)
+        return total, time.perf_counter() - start
+
+
+def measure_throughput(
+    index_url: str,
+    project: str = REFERENCE_PROJECT,
+    max_bytes: int = DEFAULT_MAX_BYTES,
+    timeout: float = 10.0,
+    range_sizes: Tuple[int, ...] = (),
+) -> ThroughputResult:
+    """Stream the reference artifact from one mirror. Never raises."""
+    result = ThroughputResult()
+    try:
+        result.url = find_reference_artifact(index_url, project, timeout)
+        result.nbytes, result.seconds = _stream(result.url, max_bytes, timeout)
+        for size in range_sizes:
+            got, secs = _stream(result.url, size, timeout, ranged=True)
+            result.ranges[size] = got / secs / 1e6 if secs > 0 else 0.0
+    except (OSError, urllib.error.URLError, LookupError, ValueError) as e:
+        result.error = str(e) or type(e).__name__
+    return result
+
+
+def benchmark_throughput(
+    mirrors: MirrorMap,
+    project: str = REFERENCE_PROJECT,
+    max_bytes: int = DEFAULT_MAX_BYTES,
+    timeout: float = 10.0,
+    range_sizes: Tuple[int, ...] = (),
+    progress: Optional[Callable[[str], None]] = None,
+    max_workers: int = 1,
+    deadline: Optional[float] = None,
+    cancel: Optional[threading.Event] = None,
+) -> List[Tuple[str, ThroughputResult]]:
+    """
+    Measure MB/s per mirror and return (name, ThroughputResult) sorted fastest first.
+    - max_bytes: bytes streamed per mirror; keeps the test bounded on fast links
+    - range_sizes: extra Range requests of these sizes, reported in result.ranges
+    - max_workers: defaults to 1 so mirrors do not share (and skew) the local downlink
+    """
+    def _task(_name: str, index_url: str) -> ThroughputResult:
+        return measure_throughput(index_url, project, max_bytes, timeout, range_sizes)
+
+    def _done(name: str, res: ThroughputResult) -> None:
+        if progress:
+            human = f"{res.mbps:.2f}MB/s" if res.error is None else "超时/失败"
+            progress(f"{name} 源测试完成：{human}")
+
+    if progress:
+        for name in mirrors:
+            progress(f"正在测试 {name} 源…")
+    got = run_concurrently(
+        mirrors, _task, ThroughputResult(error="deadline exceeded"), max_workers, deadline, _done, cancel
+    )
+    results = [(name, got[name]) for name in mirrors]
+    results.sort(key=lambda x: -x[1].mbps)
+    return results
+
+
+def score_mirrors(
+    latency: List[Tuple[str, float]],
+    throughput: Dict[str, float],
+    latency_weight: float = LATENCY_WEIGHT,
+) -> List[Tuple[str, float, float]]:
+    """
+    Combine a (name, ms) latency ranking with name -> MB/s into (name, ms, score),
+    sorted best first. Both terms are normalised to the best mirror, so score is in [0, 1].
+    """
+    best_ms = min((ms for _, ms in latency if ms != float("inf")), default=None)
+    best_mbps = max(throughput.values(), default=0.0)
+    scored: List[Tuple[str, float, float]] = []
+    for name, ms in latency:
+        if best_ms is None or ms == float("inf"):
+            lat = 0.0
+        else:
+            lat = best_ms / ms if ms > 0 else 1.0
+        tp = throughput.get(name, 0.0) / best_mbps if best_mbps > 0 else 0.0
+        scored.append((name, ms, latency_weight * lat + (1.0 - latency_weight) * tp))
+    scored.sort(key=lambda x: -x[2])
+    return scored
+
+
+def format_throughput(results: List[Tuple[str, ThroughputResult]]) -> str:
+    lines = ["带宽测试结果（MB/s，越大越好）:"]
+    for i, (name, res) in enumerate(results, 1):
+        if res.error is not None:
+            lines.append(f"{i:>2}. {name:<8}  超时/失败")
+            continue
+        line = f"{i:>2}. {name:<8}  {res.mbps:.2f}MB/s"
+        if res.ranges:
+            line += "  (" + ", ".join(f"{size // 1024}KB {mbps:.2f}" for size, mbps in sorted(res.ranges.items())) + ")"
+        lines.append(line)
+    return "\n".join(lines)
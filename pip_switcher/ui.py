@@ -2,15 +2,18 @@
 # -*- coding: utf-8 -*-
 """MainWindow UI construction and interactions."""
 from __future__ import annotations
-from typing import Any, Callable
-import json
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from dataclasses import dataclass
+import sqlite3
+import time
 
-from PyQt6.QtCore import QThread, Qt, QSettings, QLocale
+from PyQt6.QtCore import Qt, QSettings, QLocale, pyqtSignal
 from PyQt6.QtWidgets import (
     QWidget,
     QLabel,
     QComboBox,
     QPushButton,
+    QCheckBox,
     QTextEdit,
     QGridLayout,
     QHBoxLayout,
@@ -22,28 +25,11 @@ from PyQt6.QtWidgets import (
     QApplication,
 )
 
-from . import core
-from .workers import Worker
+from . import catalog, core, freshness, history, monitor
+from .workers import Error, Log, Progress, Result, TaskScheduler
 
-# Display names for mirrors per language
-MIRROR_DISPLAY = {
-    "zh": {
-        "tsinghua": "清华 TUNA",
-        "aliyun": "阿里云",
-        "huawei": "华为云",
-        "tencent": "腾讯云",
-        "ustc": "中科大 USTC",
-        "douban": "豆瓣",
-    },
-    "en": {
-        "tsinghua": "Tsinghua TUNA",
-        "aliyun": "Aliyun",
-        "huawei": "Huawei Cloud",
-        "tencent": "Tencent Cloud",
-        "ustc": "USTC",
-        "douban": "Douban",
-    },
-}
+# Display names for mirrors per language, from the mirror catalog
+MIRROR_DISPLAY = core.CATALOG.display_names()
 
 TEXTS = {
     "zh": {
@@ -72,6 +58,7 @@ TEXTS = {
         "act_speed": "执行：镜像测速并推荐…",
         "testing_prefix": "正在测试 ",
         "testing_suffix": " 源…",
+        "tested": "{name} 源测试完成：{result}",
         "speed_done": "测速完成。正在计算推荐结果…",
         "rank_header": "测速结果（单位：ms，越小越好）：",
         "timeout": "超时/失败",
@@ -83,7 +70,26 @@ TEXTS = {
             "是否切换到推荐镜像？（作用域：{scope}）"
         ),
         "apply_recommend": "应用推荐镜像",
+        "bandwidth": "含带宽测试",
+        "auto_switch": "后台监测并自动切换",
+        "monitor_on": "已开启后台监测：当前镜像持续明显变慢时将自动切换。",
+        "monitor_off": "已关闭后台监测。",
+        "history_header": "历史测速排名（最近一次在 {age:.0f} 分钟前）：",
+        "history_cached": "使用 {age:.0f} 分钟前的测速结果（有效期 {ttl:.0f} 分钟），跳过重新测速。",
+        "history_invalid": "上次最快的镜像复核未通过，重新测速…",
+        "history_weighted": "历史加权排名（单位：ms，越小越好）：",
+        "bw_header": "带宽测试结果（MB/s，越大越好）：",
+        "score_header": "综合评分（延迟 + 带宽，越大越好）：",
+        "lag_header": "同步状态（热门包是否缺少最新版本）：",
+        "lag_ok": "已同步",
+        "lag_behind": "{n} 个包落后（{detail}）",
+        "lag_failed": "获取失败：{pkgs}",
+        "lag_note": "\n注意：当前镜像有 {n} 个热门包未同步到最新版本。",
         "lang_label": "语言：",
+        "cancel_speed": "取消测速",
+        "cancelled": "已取消。",
+        "timed_out": "任务超时，已取消。",
+        "queued": "已排队，等待上一个配置操作完成…",
     },
     "en": {
         "app_title": "pip Mirror Switcher - China Mirrors",
@@ -111,6 +117,7 @@ TEXTS = {
         "act_speed": "Action: Speed test & recommendation…",
         "testing_prefix": "Testing ",
         "testing_suffix": " mirror…",
+        "tested": "{name} mirror done: {result}",
         "speed_done": "Speed test finished. Computing recommendation…",
         "rank_header": "Speed test results (ms, lower is better):",
         "timeout": "timeout/fail",
@@ -122,10 +129,39 @@ TEXTS = {
             "Switch to the recommended one? (scope: {scope})"
         ),
         "apply_recommend": "Apply Recommendation",
+        "bandwidth": "Include bandwidth",
+        "auto_switch": "Monitor && auto-switch",
+        "monitor_on": "Background monitor on: will switch if the current mirror stays clearly slower.",
+        "monitor_off": "Background monitor off.",
+        "history_header": "Speed test history (last run {age:.0f} min ago):",
+        "history_cached": "Using results from {age:.0f} min ago (valid for {ttl:.0f} min); skipping a new test.",
+        "history_invalid": "The last fastest mirror failed a quick re-check; testing again…",
+        "history_weighted": "History-weighted ranking (ms, lower is better):",
+        "bw_header": "Bandwidth results (MB/s, higher is better):",
+        "score_header": "Combined score (latency + bandwidth, higher is better):",
+        "lag_header": "Sync status (latest releases of popular packages):",
+        "lag_ok": "up to date",
+        "lag_behind": "behind on {n} package(s) ({detail})",
+        "lag_failed": "could not check: {pkgs}",
+        "lag_note": "\nNote: the current mirror is missing the latest release of {n} popular package(s).",
         "lang_label": "Language:",
+        "cancel_speed": "Cancel Speed Test",
+        "cancelled": "Cancelled.",
+        "timed_out": "Task timed out and was cancelled.",
+        "queued": "Queued until the previous config change finishes…",
     },
 }
 
+
+@dataclass
+class SpeedOutcome:
+    """What the speed-test and sync-lag tasks hand back to the GUI thread."""
+    # [(name, ms), ...] or, with the bandwidth test, [(name, ms, score), ...]
+    ranking: List[tuple]
+    # Packages each mirror is confirmed behind on; None until the sync-lag check has run
+    behind: Optional[Dict[str, int]] = None
+
+
 SCOPES = [
     ("user", {"zh": "用户级(推荐)", "en": "User (recommended)"}),
     ("site", {"zh": "当前环境/虚拟环境", "en": "Current env/venv"}),
@@ -134,8 +170,15 @@ SCOPES = [
 
 
 class MainWindow(QWidget):
+    # Emitted from the health monitor thread; Qt queues it onto the GUI thread
+    monitor_event = pyqtSignal(str)
+
     def __init__(self) -> None:
         super().__init__()
+        self.monitor: monitor.HealthMonitor | None = None
+        # Config writes queue behind each other; show-config runs alongside a speed test
+        self.scheduler = TaskScheduler(self)
+        self._speed_task: Optional[int] = None
         # Load saved language preference
         settings = QSettings()
         saved = settings.value("lang", None)
@@ -157,6 +200,7 @@ class MainWindow(QWidget):
         self._intro_shown = False
         self._init_ui()
         self._append_intro()
+        self._show_history()
 
     def _init_ui(self) -> None:
         self.lbl_title = QLabel(TEXTS[self.lang]["title"])
@@ -191,6 +235,9 @@ class MainWindow(QWidget):
         self.btn_show.setIcon(self.style().standardIcon(QStyle.StandardPixmap.SP_MessageBoxInformation))
         self.btn_speed = QPushButton(TEXTS[self.lang]["speed"])
         self.btn_speed.setIcon(self.style().standardIcon(QStyle.StandardPixmap.SP_MediaPlay))
+        self.chk_bandwidth = QCheckBox(TEXTS[self.lang]["bandwidth"])
+        self.chk_bandwidth.setChecked(QSettings().value("bandwidth", False, type=bool))
+        self.chk_monitor = QCheckBox(TEXTS[self.lang]["auto_switch"])
 
         # Language chooser
         self.lbl_lang = QLabel(TEXTS[self.lang]["lang_label"] if "lang_label" in TEXTS[self.lang] else ("语言：" if self.lang=="zh" else "Language:"))
@@ -227,6 +274,8 @@ class MainWindow(QWidget):
         actions.addWidget(self.btn_reset)
         actions.addWidget(self.btn_show)
         actions.addWidget(self.btn_speed)
+        actions.addWidget(self.chk_bandwidth)
+        actions.addWidget(self.chk_monitor)
         actions.addStretch(1)
 
         layout = QVBoxLayout()
@@ -248,6 +297,16 @@ class MainWindow(QWidget):
         self.btn_show.clicked.connect(self.on_show)
         self.btn_speed.clicked.connect(self.on_speedtest)
         self.cmb_lang.currentIndexChanged.connect(self.on_lang_changed)
+        self.chk_bandwidth.toggled.connect(lambda on: QSettings().setValue("bandwidth", on))
+        self.chk_monitor.toggled.connect(self.on_monitor_toggled)
+        self.cmb_scope.currentIndexChanged.connect(self._on_scope_changed)
+        self.monitor_event.connect(self._append_text)
+        self.scheduler.event.connect(self._on_event)
+        self.scheduler.finished.connect(self._on_finished)
+        self.scheduler.cancelled.connect(self._on_cancelled)
+        self.scheduler.busy_changed.connect(self._on_busy_changed)
+        # Restore after wiring so a saved "on" starts the monitor
+        self.chk_monitor.setChecked(QSettings().value("auto_switch", False, type=bool))
 
     def _append_intro(self) -> None:
         self.txt_log.clear()
@@ -257,6 +316,28 @@ class MainWindow(QWidget):
         self.txt_log.append(TEXTS[self.lang]["intro"])  # welcome text
         self._intro_shown = True
 
+    def _ranking_lines(self, header: str, ranking: List[Tuple[str, float]]) -> List[str]:
+        lines = [header]
+        for i, (name, ms) in enumerate(ranking, 1):
+            disp = MIRROR_DISPLAY[self.lang].get(name, name)
+            human = TEXTS[self.lang]["timeout"] if ms == float("inf") else f"{ms:.0f}ms"
+            lines.append(f"{i:>2}. {disp:<12}  {human}")
+        return lines
+
+    def _show_history(self) -> None:
+        # Show the last known ranking at startup so a recommendation is visible immediately
+        try:
+            from . import netfp
+            with history.HistoryStore() as store:
+                age = store.age()
+                ranking = store.weighted_ranking(network=netfp.fingerprint())
+        except (sqlite3.Error, OSError):
+            return
+        if not ranking:
+            return
+        header = TEXTS[self.lang]["history_header"].format(age=age / 60)
+        self.txt_log.append(self._escape_html("\n".join(self._ranking_lines(header, ranking))))
+
     def _append_text(self, text: str, error: bool = False) -> None:
         # Any new output means intro is no longer the only content
         self._intro_shown = False
@@ -274,110 +355,145 @@ class MainWindow(QWidget):
             .replace("\n", "<br>")
         )
 
-    # --- threading helper ---
-    def _run_in_thread(self, fn: Callable, *args: Any) -> None:
-        self.btn_switch.setEnabled(False)
-        self.btn_reset.setEnabled(False)
-        self.btn_show.setEnabled(False)
-        QApplication.setOverrideCursor(Qt.CursorShape.BusyCursor)
-        self.progress.setVisible(True)
-        self.status.setText(TEXTS[self.lang]["running"])
-
-        self.thread = QThread(self)  # type: ignore[attr-defined]
-        self.worker = Worker(fn, *args)  # type: ignore[attr-defined]
-        self.worker.moveToThread(self.thread)
-        self.thread.started.connect(self.worker.run)
-        self.worker.finished.connect(self._on_finished)
-        self.worker.failed.connect(self._on_failed)
-        self.worker.progress.connect(self._on_progress)
-        self.worker.finished.connect(self.thread.quit)
-        self.worker.failed.connect(self.thread.quit)
-        self.thread.finished.connect(self._cleanup_worker)
-        self.thread.start()
-
-    def _cleanup_worker(self) -> None:
-        QApplication.restoreOverrideCursor()
-        self.btn_switch.setEnabled(True)
-        self.btn_reset.setEnabled(True)
-        self.btn_show.setEnabled(True)
-        self.progress.setVisible(False)
-        # Ensure objects can be GC'ed
-        self.worker.deleteLater()
-        self.thread.deleteLater()
-
-    def _on_finished(self, msg: str) -> None:
-        self._append_text(msg, error=False)
-        self.status.setText(TEXTS[self.lang]["ready"])
-        # Detect speedtest result marker to offer recommendation
-        marker = "##RANKING_JSON "
-        if marker in msg:
-            try:
-                line = [l for l in msg.split("\n") if l.startswith(marker)][0]
-                ranking = json.loads(line[len(marker):])  # List[[name, ms], ...]
-                best = next(((name, ms) for name, ms in ranking if ms != float("inf")), None)
-                if not best:
-                    return
-                best_name, best_ms = best
-                best_name_disp = MIRROR_DISPLAY[self.lang].get(best_name, best_name)
-                # Identify current mirror
-                current_url = core.get_effective_index_url()
-                current_name = None
-                if current_url:
-                    for name, (url, host) in core.MIRRORS.items():
-                        if host in current_url or url.rstrip('/') in current_url:
-                            current_name = name
-                            break
-                if current_name == best_name:
-                    QMessageBox.information(
-                        self,
-                        TEXTS[self.lang]["speed_finished"],
-                        TEXTS[self.lang]["fastest_is_current"].format(name=best_name_disp, ms=best_ms),
-                    )
-                    return
-                # Ask user to switch
-                scope = self.cmb_scope.currentData()
-                current_disp = (
-                    MIRROR_DISPLAY[self.lang].get(current_name, current_name)
-                    if current_name else ("未设置/官方默认" if self.lang == "zh" else "Not set/Official default")
-                )
-                text = TEXTS[self.lang]["recommend_text"].format(best=best_name_disp, ms=best_ms, current=current_disp, scope=scope)
-                if QMessageBox.question(self, TEXTS[self.lang]["apply_recommend"], text) == QMessageBox.StandardButton.Yes:
-                    self._append_text(TEXTS[self.lang]["act_switch"].format(name=best_name_disp, scope=scope))
-                    self._run_in_thread(core.set_mirror, best_name, scope)
-            except Exception:
-                # Ignore parsing errors; message already printed
-                pass
-
-    def _on_failed(self, msg: str) -> None:
-        self._append_text(msg, error=True)
-        QMessageBox.warning(self, "Error" if self.lang == "en" else "操作失败", msg)
-        self.status.setText(TEXTS[self.lang]["ready"])
+    # --- task helpers ---
+    def _submit(self, fn: Callable, *args: Any, group: Optional[str] = None, timeout: Optional[float] = None) -> int:
+        if self.scheduler.group_busy(group):
+            self._append_text(TEXTS[self.lang]["queued"])
+        return self.scheduler.submit(fn, *args, group=group, timeout=timeout)
 
-    def _on_progress(self, text: str) -> None:
-        # Real-time progress lines during speed test or other tasks
-        self._append_text(text)
+    def _on_busy_changed(self, busy: bool) -> None:
+        if busy:
+            QApplication.setOverrideCursor(Qt.CursorShape.BusyCursor)
+            self.status.setText(TEXTS[self.lang]["running"])
+        else:
+            QApplication.restoreOverrideCursor()
+            self.status.setText(TEXTS[self.lang]["ready"])
+        self.progress.setVisible(busy)
+
+    def _set_speed_running(self, task_id: Optional[int]) -> None:
+        self._speed_task = task_id
+        running = task_id is not None
+        self.btn_speed.setText(TEXTS[self.lang]["cancel_speed" if running else "speed"])
+        self.btn_speed.setIcon(self.style().standardIcon(
+            QStyle.StandardPixmap.SP_MediaStop if running else QStyle.StandardPixmap.SP_MediaPlay
+        ))
+
+    def _on_event(self, task_id: int, ev: object) -> None:
+        if isinstance(ev, (Progress, Log)):
+            # Real-time progress and output lines during speed test or other tasks
+            self._append_text(ev.text, error=isinstance(ev, Log) and ev.error)
+        elif isinstance(ev, Result) and isinstance(ev.value, SpeedOutcome):
+            if ev.value.behind is None:
+                self._check_lag(ev.value)
+            else:
+                self._set_speed_running(None)
+                self._recommend(ev.value)
+        elif isinstance(ev, Error):
+            if task_id == self._speed_task:
+                self._set_speed_running(None)
+            self._append_text(ev.message, error=True)
+            QMessageBox.warning(self, "Error" if self.lang == "en" else "操作失败", ev.message)
+
+    def _on_finished(self, task_id: int) -> None:
+        if task_id == self._speed_task:
+            self._set_speed_running(None)
+
+    def _check_lag(self, outcome: SpeedOutcome) -> None:
+        """Queue the sync-lag check behind the speed test; the speed button cancels it too."""
+        hot = str(QSettings().value("hot_packages", ",".join(freshness.HOT_PACKAGES)))
+        packages = [p.strip() for p in hot.split(",") if p.strip()]
+
+        def _lag(events, cancel):
+            # Speed is useless if the mirror lacks new releases: report lag and pass it on
+            rows = outcome.ranking
+            top = [row[0] for row in rows if row[0] in core.MIRRORS][:catalog.PREFILTER_K]
+            lags = freshness.check_freshness(
+                {name: core.MIRRORS[name] for name in top}, packages, deadline=10.0, cancel=cancel
+            )
+            events.log(TEXTS[self.lang]["lag_header"])
+            for i, (name, lag) in enumerate(lags, 1):
+                disp = MIRROR_DISPLAY[self.lang].get(name, name)
+                failed = f"  {TEXTS[self.lang]['lag_failed'].format(pkgs=', '.join(lag.failed))}" if lag.failed else ""
+                if not lag.behind:
+                    events.log(f"{i:>2}. {disp:<12}  {TEXTS[self.lang]['lag_ok']}{failed}")
+                    continue
+                detail = ", ".join(f"{pkg} {vs[-1]}" for pkg, vs in lag.missing.items() if vs)
+                events.log(f"{i:>2}. {disp:<12}  {TEXTS[self.lang]['lag_behind'].format(n=lag.behind, detail=detail)}{failed}")
+            # Resolve pip's config here, off the GUI thread, so _recommend reads it from memory
+            core.current_mirror()
+            return SpeedOutcome(rows, {name: lag.behind for name, lag in lags})
+        # Same group as the speed test, so it starts once that task has finished
+        self._set_speed_running(self.scheduler.submit(_lag, group="speed", timeout=30.0))
+
+    def _recommend(self, outcome: SpeedOutcome) -> None:
+        ranking = outcome.ranking
+        if ranking and len(ranking[0]) > 2:
+            ranking = sorted(ranking, key=lambda entry: -entry[2])
+        # Lagging mirrors rank lower
+        behind = outcome.behind or {}
+        if behind:
+            ranking = freshness.apply_lag(ranking, behind)
+        best = next(((entry[0], entry[1]) for entry in ranking if entry[1] != float("inf")), None)
+        if not best:
+            return
+        best_name, best_ms = best
+        best_name_disp = MIRROR_DISPLAY[self.lang].get(best_name, best_name)
+        # Identify current mirror from the snapshot warmed by the worker (no disk I/O here)
+        current_name = core.current_mirror(revalidate=False)
+        if current_name == best_name:
+            QMessageBox.information(
+                self,
+                TEXTS[self.lang]["speed_finished"],
+                TEXTS[self.lang]["fastest_is_current"].format(name=best_name_disp, ms=best_ms),
+            )
+            return
+        # Ask user to switch
+        scope = self.cmb_scope.currentData()
+        current_disp = (
+            MIRROR_DISPLAY[self.lang].get(current_name, current_name)
+            if current_name else ("未设置/官方默认" if self.lang == "zh" else "Not set/Official default")
+        )
+        text = TEXTS[self.lang]["recommend_text"].format(best=best_name_disp, ms=best_ms, current=current_disp, scope=scope)
+        if behind.get(current_name):
+            text += TEXTS[self.lang]["lag_note"].format(n=behind[current_name])
+        if QMessageBox.question(self, TEXTS[self.lang]["apply_recommend"], text) == QMessageBox.StandardButton.Yes:
+            self._append_text(TEXTS[self.lang]["act_switch"].format(name=best_name_disp, scope=scope))
+            self._submit(core.set_mirror, best_name, scope, group="config", timeout=60.0)
+
+    def _on_cancelled(self, task_id: int, reason: str) -> None:
+        if task_id == self._speed_task:
+            self._set_speed_running(None)
+        self._append_text(TEXTS[self.lang]["timed_out" if reason == "timeout" else "cancelled"], error=reason == "timeout")
 
     # --- actions ---
     def on_switch(self) -> None:
         name = self.cmb_mirror.currentData()
         scope = self.cmb_scope.currentData()
         self._append_text(TEXTS[self.lang]["act_switch"].format(name=MIRROR_DISPLAY[self.lang].get(name, name), scope=scope))
-        self._run_in_thread(core.set_mirror, name, scope)
+        self._submit(core.set_mirror, name, scope, group="config", timeout=60.0)
 
     def on_reset(self) -> None:
         scope = self.cmb_scope.currentData()
         self._append_text(TEXTS[self.lang]["act_reset"].format(scope=scope))
-        self._run_in_thread(core.reset_mirror, scope)
+        self._submit(core.reset_mirror, scope, group="config", timeout=60.0)
 
     def on_show(self) -> None:
         def _show():
             core.show_config()
         self._append_text(TEXTS[self.lang]["act_show"])
-        self._run_in_thread(_show)
+        self._submit(_show, timeout=30.0)
 
     def on_speedtest(self) -> None:
-        def _speed(progress):
-            from . import speedtest
+        if self._speed_task is not None:
+            # The button doubles as "cancel" while a speed test runs
+            self.scheduler.cancel(self._speed_task)
+            return
+        with_bandwidth = self.chk_bandwidth.isChecked()
+        ttl = float(QSettings().value("history_ttl", history.DEFAULT_TTL))
+
+        def _speed(events, cancel):
+            from . import netfp, speedtest, throughput
+
             # Wrap progress to show Chinese display names
             def _p(msg: str) -> None:
                 zh_prefix = "正在测试 "
@@ -386,20 +502,84 @@ class MainWindow(QWidget):
                     key = msg[len(zh_prefix):-len(zh_suffix)]
                     disp = MIRROR_DISPLAY[self.lang].get(key, key)
                     msg = f"{TEXTS[self.lang]['testing_prefix']}{disp}{TEXTS[self.lang]['testing_suffix']}"
+                elif " 源测试完成：" in msg:
+                    key, result = msg.split(" 源测试完成：", 1)
+                    disp = MIRROR_DISPLAY[self.lang].get(key, key)
+                    if result == "超时/失败":
+                        result = TEXTS[self.lang]["timeout"]
+                    msg = TEXTS[self.lang]["tested"].format(name=disp, result=result)
                 elif msg.strip().startswith("测速完成"):
                     msg = TEXTS[self.lang]["speed_done"]
-                progress(msg)
-
-            ranking = speedtest.benchmark_mirrors(core.MIRRORS, attempts=2, timeout=3.0, progress=_p)
-            # Localized ranking printout
-            print(TEXTS[self.lang]["rank_header"])
-            for i, (name, ms) in enumerate(ranking, 1):
-                disp = MIRROR_DISPLAY[self.lang].get(name, name)
-                human = (TEXTS[self.lang]["timeout"] if ms == float("inf") else f"{ms:.0f}ms")
-                print(f"{i:>2}. {disp:<12}  {human}")
-            print("##RANKING_JSON " + json.dumps(ranking))
+                events.progress(msg)
+
+            with history.HistoryStore() as store:
+                # Results are reusable only if measured recently on this same network
+                fp = netfp.fingerprint()
+                net_ts, net_ranking = store.network_ranking(fp)
+                age = time.time() - net_ts if net_ts is not None else float("inf")
+                # Recent enough, and one probe confirms the cached winner: skip the full test
+                if age < ttl and netfp.validated_winner(net_ranking) is None:
+                    events.log(TEXTS[self.lang]["history_invalid"])
+                elif age < ttl:
+                    events.log(TEXTS[self.lang]["history_cached"].format(age=age / 60, ttl=ttl / 60))
+                    ranking = store.weighted_ranking(network=fp)
+                    events.log("\n".join(self._ranking_lines(TEXTS[self.lang]["history_weighted"], ranking)))
+                    return SpeedOutcome(ranking)
+                # Long catalogs: only the K mirrors that connect fastest get the full test
+                mirrors = catalog.prefilter(core.MIRRORS, cancel=cancel)
+                results = speedtest.benchmark_phases(
+                    mirrors, attempts=2, timeout=3.0, progress=_p, max_workers=8, deadline=10.0, cancel=cancel
+                )
+                # Localized ranking printout with the DNS/TCP/TLS/TTFB/body breakdown
+                events.log(TEXTS[self.lang]["rank_header"])
+                for i, (name, timing) in enumerate(results, 1):
+                    disp = MIRROR_DISPLAY[self.lang].get(name, name)
+                    if timing.ok:
+                        events.log(f"{i:>2}. {disp:<12}  {timing.total_ms:.0f}ms  ({speedtest.format_phases(timing)})")
+                    else:
+                        events.log(f"{i:>2}. {disp:<12}  {TEXTS[self.lang]['timeout']}")
+                store.record(speedtest.phase_ranking(results), network=fp)
+                store.save_network_ranking(fp, speedtest.phase_ranking(results))
+                # Recommend from this network's exponentially weighted history, not this run alone
+                ranking = store.weighted_ranking(network=fp)
+                events.log("\n".join(self._ranking_lines(TEXTS[self.lang]["history_weighted"], ranking)))
+            if with_bandwidth:
+                live = {name: core.MIRRORS[name] for name, ms in ranking if ms != float("inf") and name in core.MIRRORS}
+                bw = throughput.benchmark_throughput(live, progress=_p, deadline=60.0, cancel=cancel)
+                events.log(TEXTS[self.lang]["bw_header"])
+                for i, (name, res) in enumerate(bw, 1):
+                    disp = MIRROR_DISPLAY[self.lang].get(name, name)
+                    human = TEXTS[self.lang]["timeout"] if res.error else f"{res.mbps:.2f}MB/s"
+                    events.log(f"{i:>2}. {disp:<12}  {human}")
+                # Rank by weighted latency/throughput score: [name, ms, score]
+                ranking = throughput.score_mirrors(ranking, {name: res.mbps for name, res in bw})
+                events.log(TEXTS[self.lang]["score_header"])
+                for i, (name, ms, score) in enumerate(ranking, 1):
+                    events.log(f"{i:>2}. {MIRROR_DISPLAY[self.lang].get(name, name):<12}  {score:.2f}")
+            return SpeedOutcome(ranking)
         self._append_text(TEXTS[self.lang]["act_speed"])
-        self._run_in_thread(_speed)
+        self._set_speed_running(self._submit(_speed, group="speed", timeout=180.0))
+
+    def closeEvent(self, event) -> None:
+        # Ask running tasks to stop so the pool can wind down before the process exits
+        self.scheduler.shutdown()
+        super().closeEvent(event)
+
+    # --- background health monitor ---
+    def on_monitor_toggled(self, on: bool) -> None:
+        QSettings().setValue("auto_switch", on)
+        if on:
+            if self.monitor is None:
+                self.monitor = monitor.HealthMonitor(self.cmb_scope.currentData(), on_event=self.monitor_event.emit)
+            self.monitor.start()
+            self._append_text(TEXTS[self.lang]["monitor_on"])
+        elif self.monitor is not None:
+            self.monitor.stop()
+            self._append_text(TEXTS[self.lang]["monitor_off"])
+
+    def _on_scope_changed(self) -> None:
+        if self.monitor is not None:
+            self.monitor.scope = self.cmb_scope.currentData()
 
     # --- language ---
     def on_lang_changed(self) -> None:
@@ -430,7 +610,9 @@ class MainWindow(QWidget):
         self.btn_switch.setText(TEXTS[self.lang]["switch"])
         self.btn_reset.setText(TEXTS[self.lang]["reset"])
         self.btn_show.setText(TEXTS[self.lang]["show"])
-        self.btn_speed.setText(TEXTS[self.lang]["speed"])
+        self.btn_speed.setText(TEXTS[self.lang]["cancel_speed" if self._speed_task is not None else "speed"])
+        self.chk_bandwidth.setText(TEXTS[self.lang]["bandwidth"])
+        self.chk_monitor.setText(TEXTS[self.lang]["auto_switch"])
         self.lbl_lang.setText(TEXTS[self.lang]["lang_label"])
         self.txt_log.setPlaceholderText(TEXTS[self.lang]["log_placeholder"])
         self.status.setText(TEXTS[self.lang]["ready"])
@@ -1,44 +1,292 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
-"""Worker objects to run long tasks without blocking UI."""
+"""
+Task scheduler to run long tasks without blocking UI.
+Tasks run on a QThreadPool and get an id. Tasks sharing a group (e.g. config writes)
+queue behind each other, other tasks run side by side. Cancellation is cooperative:
+a task that takes a `cancel` parameter receives a threading.Event, which timeouts set
+as well; a task without one runs to the end and reports its real outcome. Tasks
+report through typed events (Progress, Log, Result, Error) delivered one by one on
+the GUI thread; a task that takes an `events` parameter gets an EventSink, and
+whatever it prints arrives line by line as Log events.
+"""
 from __future__ import annotations
+import inspect
 import io
-from contextlib import redirect_stdout, redirect_stderr
-from typing import Callable, Any
-from PyQt6.QtCore import QObject, pyqtSignal
+import itertools
+import sys
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Callable, Deque, Dict, Optional, TextIO, Union
 
+from PyQt6.QtCore import QObject, QRunnable, QThreadPool, QTimer, pyqtSignal
 
-class Worker(QObject):
-    finished = pyqtSignal(str)
-    failed = pyqtSignal(str)
-    progress = pyqtSignal(str)
+from . import telemetry
+from .speedtest import Cancelled
 
-    def __init__(self, fn: Callable, *args: Any) -> None:
+
+@dataclass(frozen=True)
+class Progress:
+    text: str
+
+
+@dataclass(frozen=True)
+class Log:
+    text: str
+    error: bool = False
+
+
+@dataclass(frozen=True)
+class Result:
+    value: Any
+
+
+@dataclass(frozen=True)
+class Error:
+    message: str
+
+
+Event = Union[Progress, Log, Result, Error]
+
+
+class EventSink:
+    """Handed to a task; safe to call from any thread (it only emits a Qt signal)."""
+
+    def __init__(self, emit: Callable[[Event], None]) -> None:
+        self.emit = emit
+
+    def progress(self, text: str) -> None:
+        self.emit(Progress(str(text)))
+
+    def log(self, text: str, error: bool = False) -> None:
+        self.emit(Log(str(text), error))
+
+    def result(self, value: Any) -> None:
+        self.emit(Result(value))
+
+
+class _LineWriter:
+    """Turns a task's print() output into Log events, one event per batch of whole lines."""
+
+    def __init__(self, sink: EventSink) -> None:
+        self.sink = sink
+        self.pending = ""
+
+    def write(self, text: str) -> None:
+        self.pending += text
+        if "\n" in self.pending:
+            lines, _, self.pending = self.pending.rpartition("\n")
+            self.sink.log(lines)
+
+    def close(self) -> None:
+        if self.pending:
+            self.sink.log(self.pending)
+            self.pending = ""
+
+
+class _ThreadRoutedStream(io.TextIOBase):
+    """
+    Stand-in for sys.stdout/sys.stderr that sends each task thread's writes to that
+    task's own writer. contextlib.redirect_stdout swaps the process-wide stream, so it
+    captures other threads' output and breaks as soon as two tasks run at once.
+    """
+
+    def __init__(self, fallback: Optional[TextIO]) -> None:
         super().__init__()
-        self.fn = fn
-        self.args = args
+        self.fallback = fallback  # None under pythonw
+        self._local = threading.local()
+
+    def route(self, writer: Optional[_LineWriter]) -> None:
+        self._local.writer = writer
+
+    def write(self, text: str) -> int:
+        target = getattr(self._local, "writer", None) or self.fallback
+        if target is not None:
+            target.write(text)
+        return len(text)
+
+    @property
+    def encoding(self) -> str:  # type: ignore[override]
+        return getattr(self.fallback, "encoding", None) or "utf-8"
+
+    def flush(self) -> None:
+        if self.fallback is not None:
+            self.fallback.flush()
+
+
+def _routed(name: str) -> _ThreadRoutedStream:
+    stream = getattr(sys, name)
+    if not isinstance(stream, _ThreadRoutedStream):
+        stream = _ThreadRoutedStream(stream)
+        setattr(sys, name, stream)
+    return stream
+
+
+@dataclass
+class Task:
+    id: int
+    name: str
+    fn: Callable
+    args: tuple
+    group: Optional[str] = None  # tasks of one group never run at the same time
+    timeout: Optional[float] = None  # seconds until cancel is set
+    cancel: threading.Event = field(default_factory=threading.Event)
+    timed_out: bool = False
+    submitted: float = field(default_factory=time.perf_counter)
+
+
+class _Runnable(QRunnable):
+    def __init__(self, scheduler: "TaskScheduler", task: Task) -> None:
+        super().__init__()
+        self.scheduler = scheduler
+        self.task = task
 
     def run(self) -> None:
-        buf_out = io.StringIO()
-        buf_err = io.StringIO()
+        self.scheduler._execute(self.task)
+
+
+class TaskScheduler(QObject):
+    """Signals carry the task id first; they are delivered on the GUI thread."""
+    started = pyqtSignal(int, str)  # id, name
+    event = pyqtSignal(int, object)  # id, Progress | Log | Result | Error
+    finished = pyqtSignal(int)  # after the task's last event, unless it failed or was cancelled
+    cancelled = pyqtSignal(int, str)  # id, "cancelled" or "timeout"
+    busy_changed = pyqtSignal(bool)
+    _done = pyqtSignal(int)
+
+    def __init__(self, parent: Optional[QObject] = None, max_threads: int = 4) -> None:
+        super().__init__(parent)
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(max_threads)
+        self._ids = itertools.count(1)
+        self._queue: Deque[Task] = deque()
+        self._running: Dict[int, Task] = {}
+        self._timers: Dict[int, QTimer] = {}
+        self._stdout = _routed("stdout")
+        self._stderr = _routed("stderr")
+        self._done.connect(self._on_done)
+
+    # --- GUI thread ---
+    @property
+    def busy(self) -> bool:
+        return bool(self._running or self._queue)
+
+    def group_busy(self, group: Optional[str]) -> bool:
+        return group is not None and any(t.group == group for t in list(self._running.values()) + list(self._queue))
+
+    def submit(
+        self, fn: Callable, *args: Any, name: str = "", group: Optional[str] = None, timeout: Optional[float] = None
+    ) -> int:
+        """Queue fn(*args) and return its task id."""
+        was_busy = self.busy
+        task = Task(next(self._ids), name or getattr(fn, "__name__", "task"), fn, args, group, timeout)
+        self._queue.append(task)
+        self._pump()
+        if not was_busy:
+            self.busy_changed.emit(True)
+        return task.id
+
+    def cancel(self, task_id: int) -> bool:
+        """Drop a queued task or ask a running one to stop; False if the id is unknown."""
+        for task in self._queue:
+            if task.id == task_id:
+                self._queue.remove(task)
+                self.cancelled.emit(task_id, "cancelled")
+                if not self.busy:
+                    self.busy_changed.emit(False)
+                return True
+        task = self._running.get(task_id)
+        if task is None:
+            return False
+        task.cancel.set()
+        return True
+
+    def cancel_all(self) -> None:
+        for task_id in [t.id for t in self._queue] + list(self._running):
+            self.cancel(task_id)
+
+    def shutdown(self, wait_ms: int = 3000) -> None:
+        self.cancel_all()
+        self.pool.waitForDone(wait_ms)
+
+    def _pump(self) -> None:
+        busy_groups = {t.group for t in self._running.values() if t.group}
+        for task in list(self._queue):
+            if task.group is not None and task.group in busy_groups:
+                continue  # FIFO within a group
+            self._queue.remove(task)
+            if task.group is not None:
+                busy_groups.add(task.group)
+            self._start(task)
+
+    def _start(self, task: Task) -> None:
+        self._running[task.id] = task
+        if task.timeout:
+            timer = QTimer(self)
+            timer.setSingleShot(True)
+            timer.timeout.connect(lambda task_id=task.id: self._expire(task_id))
+            timer.start(int(task.timeout * 1000))
+            self._timers[task.id] = timer
+        self.started.emit(task.id, task.name)
+        self.pool.start(_Runnable(self, task))
+
+    def _expire(self, task_id: int) -> None:
+        task = self._running.get(task_id)
+        if task is not None:
+            task.timed_out = True
+            task.cancel.set()
+
+    def _on_done(self, task_id: int) -> None:
+        self._running.pop(task_id, None)
+        timer = self._timers.pop(task_id, None)
+        if timer is not None:
+            timer.stop()
+            timer.deleteLater()
+        self._pump()
+        if not self.busy:
+            self.busy_changed.emit(False)
+
+    # --- pool thread ---
+    def _execute(self, task: Task) -> None:
+        sink = EventSink(lambda ev: self.event.emit(task.id, ev))
+        writer = _LineWriter(sink)
+        self._stdout.route(writer)
+        self._stderr.route(writer)
+        queued_ms = round((time.perf_counter() - task.submitted) * 1000.0, 1)
         try:
-            with redirect_stdout(buf_out), redirect_stderr(buf_err):
-                # Prefer calling with a progress callback if supported
-                try:
-                    self.fn(self._emit_progress, *self.args)
-                except TypeError:
-                    self.fn(*self.args)
-            out = buf_out.getvalue()
-            err = buf_err.getvalue()
-            msg = (out + ("\n" + err if err else "")).strip()
-            if not msg:
-                msg = "[OK] Done."
-            self.finished.emit(msg)
-        except Exception as e:
-            err_full = buf_out.getvalue() + "\n" + buf_err.getvalue()
-            msg = (str(e) + ("\n" + err_full if err_full.strip() else "")).strip()
-            self.failed.emit(msg)
+            with telemetry.span("task", task=task.name, group=task.group, queued_ms=queued_ms) as sp:
+                self._run_task(task, sink, writer, sp)
+        finally:
+            self._stdout.route(None)
+            self._stderr.route(None)
+            self._done.emit(task.id)
 
-    # Callable passed into worker task to emit progress safely from worker thread
-    def _emit_progress(self, text: str) -> None:
-        self.progress.emit(str(text))
+    def _run_task(self, task: Task, sink: EventSink, writer: _LineWriter, sp: telemetry.Span) -> None:
+        try:
+            params = inspect.signature(task.fn).parameters
+            kwargs: Dict[str, Any] = {}
+            if "events" in params:
+                kwargs["events"] = sink
+            if "progress" in params:
+                kwargs["progress"] = sink.progress
+            if "cancel" in params:
+                kwargs["cancel"] = task.cancel
+            value = task.fn(*task.args, **kwargs)
+            if "cancel" in kwargs and task.cancel.is_set():
+                raise Cancelled()  # stopped partway: the value is incomplete
+            writer.close()
+            if value is not None:
+                sink.result(value)
+            self.finished.emit(task.id)
+        except Cancelled:
+            writer.close()
+            if task.timed_out:
+                sp.fail("timed out", timeout=True)
+            sp.set(outcome="timeout" if task.timed_out else "cancelled")
+            self.cancelled.emit(task.id, "timeout" if task.timed_out else "cancelled")
+        except Exception as e:
+            writer.close()
+            sp.fail(e)
+            sink.emit(Error(str(e) or type(e).__name__))
@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+"""addrprobe's DNS reply parser on hand-built messages."""
+from __future__ import annotations
+import socket
+import struct
+
+import pytest
+
+from pip_switcher import addrprobe
+
+
+def _reply(qid: int, flags: int, ips) -> bytes:
+    question = addrprobe._build_query(qid, "files.example", 1)[12:]
+    answers = b"".join(
+        b"\xc0\x0c" + struct.pack(">HHIH", 1, 1, 300, 4) + socket.inet_aton(ip) for ip in ips
+    )
+    return struct.pack(">HHHHHH", qid, flags, 1, len(ips), 0, 0) + question + answers
+
+
+def test_parse_reply_reads_addresses_and_ttl() -> None:
+    ips, ttl = addrprobe._parse_reply(_reply(7, 0x8180, ["192.0.2.1", "192.0.2.2"]), 7, socket.AF_INET)
+    assert ips == ["192.0.2.1", "192.0.2.2"]
+    assert ttl == 300.0
+
+
+def test_truncated_reply_is_not_taken_as_complete() -> None:
+    with pytest.raises(addrprobe._Truncated):
+        addrprobe._parse_reply(_reply(7, 0x8380, ["192.0.2.1"]), 7, socket.AF_INET)
@@ -0,0 +1,15 @@
+# -*- coding: utf-8 -*-
+"""catalog.load with user files: a broken one is skipped with a warning on stderr."""
+from __future__ import annotations
+
+from pip_switcher import catalog
+
+
+def test_broken_user_catalog_warns_on_stderr(tmp_path, capsys) -> None:
+    bad = tmp_path / "mirrors.json"
+    bad.write_text("{not json", encoding="utf-8")
+    cat = catalog.load([str(bad)])
+    assert cat.mirror_map() == catalog.load([]).mirror_map()
+    out, err = capsys.readouterr()
+    assert out == ""
+    assert "[WARN] Ignoring mirror catalog" in err
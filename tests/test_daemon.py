@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""Best-mirror daemon: routes, and /best over a real loopback server."""
+from __future__ import annotations
+import asyncio
+import contextlib
+import json
+import threading
+import time
+
+from pip_switcher import daemon
+from pip_switcher.simbench import StandIn, stand_ins
+
+
+def test_best_is_503_until_a_ranking_exists() -> None:
+    mirrors = {"a": ("http://a.example/simple", "a.example"), "b": ("http://b.example/simple", "b.example")}
+    d = daemon.BestMirrorDaemon(mirrors)
+    status, _body = d.route("GET", "/best")
+    assert status == 503
+    d.snapshot = daemon.make_snapshot([("b", 12.0), ("a", float("inf"))], mirrors, "benchmark")
+    status, body = d.route("GET", "/best?x=1")
+    assert status == 200
+    assert json.loads(body)["best"] == "b"
+    assert json.loads(body)["index_url"] == "http://b.example/simple"
+    assert d.route("POST", "/best")[0] == 405
+    assert d.route("GET", "/nope")[0] == 404
+
+
+def test_best_over_http_after_refresh(tmp_path) -> None:
+    with stand_ins({"slow": StandIn(delay_ms=150), "fast": StandIn()}) as mirrors:
+        d = daemon.BestMirrorDaemon(
+            mirrors, interval=3600, timeout=1.0, deadline=4.0, history_path=str(tmp_path / "h.sqlite3")
+        )
+        loop = asyncio.new_event_loop()
+        bound = threading.Event()
+        addresses = []
+
+        def _ready(addrs) -> None:
+            addresses.extend(addrs)
+            bound.set()
+
+        task = loop.create_task(d.serve(port=0, ready=_ready))
+
+        def _run() -> None:
+            with contextlib.suppress(asyncio.CancelledError):
+                loop.run_until_complete(task)
+
+        thread = threading.Thread(target=_run, daemon=True)
+        thread.start()
+        try:
+            assert bound.wait(5)
+            port = int(addresses[0].rsplit(":", 1)[1])
+            end = time.monotonic() + 10
+            while time.monotonic() < end:
+                status, answer = daemon.query("/best", port=port)
+                if status == 200:
+                    break
+                time.sleep(0.1)
+            assert status == 200
+            assert answer["best"] == "fast" and answer["source"] == "benchmark"
+            status, health = daemon.query("/healthz", port=port)
+            assert status == 200 and health["ready"]
+        finally:
+            loop.call_soon_threadsafe(task.cancel)
+            thread.join(5)
+            loop.run_until_complete(loop.shutdown_default_executor())
+            loop.close()
@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+"""fleet.run_batch: one broken environment must not sink the batch."""
+from __future__ import annotations
+import sys
+
+from pip_switcher import core, fleet, fsutil, pipconf
+from pip_switcher.simbench import pip_sandbox
+
+
+def _env(tmp_path, name: str) -> fleet.Environment:
+    return fleet.Environment(python=sys.executable, prefix=str(tmp_path / name), kind="venv")
+
+
+def test_malformed_config_is_a_failed_result(tmp_path) -> None:
+    bad, good = _env(tmp_path, "bad"), _env(tmp_path, "good")
+    fsutil.write_atomic(pipconf.config_file("site", bad.prefix), "index-url = no section header\n")
+    name = next(iter(core.MIRRORS))
+    lines = []
+    results = fleet.run_batch([bad, good], lambda env: fleet.apply_mirror(env, name), progress=lines.append)
+    assert [r.env for r in results] == [bad, good]
+    assert not results[0].ok and "section" in results[0].detail.lower()
+    assert results[1].ok and results[1].index_url == core.MIRRORS[name][0]
+    assert pipconf.read_file(pipconf.config_file("site", good.prefix))["global.index-url"] == core.MIRRORS[name][0]
+    assert sorted(line[:3] for line in lines) == ["ERR", "OK "]
+
+
+def test_reset_after_apply_leaves_no_index(tmp_path) -> None:
+    env = _env(tmp_path, "venv")
+    name = next(iter(core.MIRRORS))
+    with pip_sandbox():  # the user's own pip.conf must not leak into the result
+        assert fleet.apply_mirror(env, name).ok
+        assert fleet.audit(env).detail == name
+        result = fleet.reset_mirror(env)
+        assert result.ok and result.index_url is None
+        assert fleet.audit(env).detail == "official"
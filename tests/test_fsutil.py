@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+"""fsutil.write_atomic: file modes and temp file naming."""
+from __future__ import annotations
+import os
+import stat
+
+from pip_switcher import fsutil
+
+
+def test_write_atomic_modes(tmp_path) -> None:
+    new = str(tmp_path / "new.conf")
+    fsutil.write_atomic(new, "[global]\n")
+    assert stat.S_IMODE(os.stat(new).st_mode) == 0o666 & ~fsutil._UMASK
+    os.chmod(new, 0o640)
+    fsutil.write_atomic(new, "[global]\ntimeout = 5\n")
+    assert stat.S_IMODE(os.stat(new).st_mode) == 0o640
+
+
+def test_write_atomic_temp_prefix(tmp_path, monkeypatch) -> None:
+    seen = []
+    real_replace = os.replace
+    monkeypatch.setattr(os, "replace", lambda src, dst: seen.append(os.path.basename(src)) or real_replace(src, dst))
+    fsutil.write_atomic(str(tmp_path / "state.json"), "{}", prefix=".failover-")
+    assert seen[0].startswith(".failover-")
+    assert os.listdir(tmp_path) == ["state.json"]
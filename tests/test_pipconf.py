@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+"""pipconf writes inside pip_sandbox(): round-trip, rollback and PIP_CONFIG_FILE."""
+from __future__ import annotations
+import os
+
+from pip_switcher import fsutil, pipconf
+from pip_switcher.simbench import pip_sandbox
+
+URL = "https://mirror.example/simple"
+
+
+def test_update_round_trip_and_rollback_of_new_file() -> None:
+    with pip_sandbox():
+        path = pipconf.config_file("user")
+        previous = pipconf.update("user", {"global.index-url": URL, "global.trusted-host": "mirror.example"})
+        assert previous is None
+        assert pipconf.read_file(path) == {"global.index-url": URL, "global.trusted-host": "mirror.example"}
+        assert pipconf.snapshot().index_url == URL
+        pipconf.rollback("user", previous)
+        assert not os.path.exists(path)
+        assert pipconf.snapshot().index_url is None
+
+
+def test_rollback_restores_existing_file_verbatim() -> None:
+    with pip_sandbox():
+        path = pipconf.config_file("user")
+        original = "# mine\n[global]\ntimeout = 60\n"
+        fsutil.write_atomic(path, original)
+        previous = pipconf.update("user", {"global.index-url": URL}, unset=["global.timeout"])
+        assert pipconf.read_file(path) == {"global.index-url": URL}
+        pipconf.rollback("user", previous)
+        with open(path, encoding="utf-8") as f:
+            assert f.read() == original
+
+
+def test_unset_drops_empty_section() -> None:
+    with pip_sandbox():
+        pipconf.update("user", {"install.user": "true"})
+        pipconf.update("user", unset=["install.user", "global.not-there"])
+        assert pipconf.read_file(pipconf.config_file("user")) == {}
+
+
+def test_devnull_config_file_disables_all_files() -> None:
+    with pip_sandbox():
+        pipconf.update("user", {"global.index-url": URL})
+        os.environ["PIP_CONFIG_FILE"] = os.devnull
+        pipconf.invalidate()
+        assert pipconf.snapshot().index_url is None
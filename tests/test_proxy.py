@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+"""Caching proxy in front of a stand-in mirror: file routes stay on known hosts."""
+from __future__ import annotations
+import hashlib
+import os
+import re
+import time
+import urllib.error
+import urllib.request
+from typing import Iterator, Tuple
+
+import pytest
+
+from pip_switcher import proxy
+from pip_switcher.simbench import FILES, StandIn, stand_ins
+from pip_switcher.speedtest import PROBE_PROJECT
+
+
+@pytest.fixture
+def running(tmp_path) -> Iterator[Tuple[proxy.CachingProxy, str]]:
+    with stand_ins({"up": StandIn()}) as mirrors:
+        srv = proxy.CachingProxy(mirrors["up"][0], cache_dir=str(tmp_path), port=0, timeout=3.0)
+        srv.start_background()
+        try:
+            yield srv, f"http://127.0.0.1:{srv.server_address[1]}"
+        finally:
+            srv.shutdown()
+            srv.server_close()
+
+
+def _status(url: str) -> int:
+    try:
+        with urllib.request.urlopen(url, timeout=5) as resp:
+            resp.read()
+            return resp.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+def _file_url(base: str, target: str) -> str:
+    return f"{base}/files/{PROBE_PROJECT}/{proxy._token(target)}/x.whl"
+
+
+def test_upstream_file_is_served(running) -> None:
+    srv, base = running
+    with urllib.request.urlopen(f"{base}/simple/{PROBE_PROJECT}/", timeout=5) as resp:
+        page = resp.read().decode()
+    href, digest = re.search(r'href="([^"#]+)#sha256=([0-9a-f]+)"', page).groups()
+    assert href.endswith("/" + FILES[PROBE_PROJECT][0])
+    with urllib.request.urlopen(base + href, timeout=5) as resp:
+        assert hashlib.sha256(resp.read()).hexdigest() == digest
+    # The handler commits to the cache after the client has the last byte: give it a moment
+    end = time.monotonic() + 2.0
+    while srv.cache._url_locks and time.monotonic() < end:
+        time.sleep(0.01)
+    assert srv.cache._url_locks == {}  # evicted once the download finished
+    with urllib.request.urlopen(base + href, timeout=5) as resp:  # now from the cache
+        assert hashlib.sha256(resp.read()).hexdigest() == digest
+
+
+@pytest.mark.parametrize("target", [
+    "file:///etc/hostname",
+    "http://169.254.169.254/latest/meta-data/",
+    "http://127.0.0.1:1/private",
+])
+def test_foreign_targets_are_404(running, target: str) -> None:
+    _srv, base = running
+    assert _status(_file_url(base, target)) == 404
+
+
+def test_linked_file_host_is_learnt(tmp_path) -> None:
+    srv = proxy.CachingProxy("https://mirror.example/simple", cache_dir=str(tmp_path), port=0)
+    try:
+        assert srv.allows("https://mirror.example/files/a.whl")
+        assert not srv.allows("https://files.example/a.whl")
+        srv.learn_links(b'<a href="https://files.example/a.whl#sha256=00">a.whl</a>', "https://mirror.example/simple/a/")
+        assert srv.allows("https://files.example/a.whl")
+        assert not srv.allows("file://files.example/a.whl")
+    finally:
+        srv.server_close()
+
+
+def test_root_listing_is_streamed_and_cached(running) -> None:
+    srv, base = running
+    pages = []
+    for _ in range(2):  # live, then from the index cache
+        with urllib.request.urlopen(f"{base}/simple/", timeout=5) as resp:
+            pages.append(resp.read().decode())
+    assert pages[0] == pages[1]
+    assert f'href="/simple/{PROBE_PROJECT}/"' in pages[0]
+    body_path, _meta = srv.cache.index_paths(srv.upstream.rstrip("/") + "/")
+    with open(body_path, "rb") as f:
+        assert f"/simple/{PROBE_PROJECT}/".encode() in f.read()
+
+
+def test_url_table_survives_a_crash(tmp_path) -> None:
+    cache = proxy.ProxyCache(str(tmp_path), max_bytes=10)
+    for i, body in enumerate([b"aaaaaa", b"bbbbbb"]):
+        fd, tmp = cache.new_temp()
+        with open(fd, "wb") as f:
+            f.write(body)
+        cache.commit(f"https://m.example/{i}.whl", tmp, hashlib.sha256(body).hexdigest())
+        os.utime(cache.lookup(f"https://m.example/{i}.whl"), (i, i))  # 0.whl is the LRU one
+    # No close(): the journal alone must bring back the table, minus the evicted entry
+    reopened = proxy.ProxyCache(str(tmp_path), max_bytes=10)
+    assert reopened.lookup("https://m.example/0.whl") is None
+    assert reopened.lookup("https://m.example/1.whl") is not None
+    cache.close()
+    reopened.close()
+
+
+@pytest.mark.parametrize("project", ["a/b", "..", "%2e%2e", "Foo_Bar", "-x"])
+def test_unnormalized_project_is_404(running, project: str) -> None:
+    _srv, base = running
+    assert _status(f"{base}/simple/{project}/") == 404
+    assert _status(f"{base}/files/{project}/{proxy._token('https://m.example/x.whl')}/x.whl") == 404
@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+"""benchmark_mirrors and benchmark_adaptive against local stand-in mirrors (simbench)."""
+from __future__ import annotations
+
+from pip_switcher import speedtest
+from pip_switcher.simbench import StandIn, stand_ins
+
+
+def test_benchmark_picks_fastest_and_marks_dead_inf() -> None:
+    specs = {"slow": StandIn(delay_ms=150), "fast": StandIn(), "dead": StandIn(hang=True)}
+    with stand_ins(specs) as mirrors:
+        ranking = speedtest.benchmark_mirrors(mirrors, attempts=2, timeout=1.0, deadline=4.0)
+    assert [name for name, _ms in ranking] == ["fast", "slow", "dead"]
+    assert ranking[0][1] < ranking[1][1]
+    assert ranking[2][1] == float("inf")
+
+
+def test_benchmark_skips_erroring_mirror() -> None:
+    with stand_ins({"broken": StandIn(error_rate=1.0), "ok": StandIn(delay_ms=50)}) as mirrors:
+        ranking = dict(speedtest.benchmark_mirrors(mirrors, attempts=2, timeout=1.0, deadline=4.0))
+    assert ranking["broken"] == float("inf")
+    assert ranking["ok"] != float("inf")
+
+
+def test_adaptive_reports_dropped_mirror_first() -> None:
+    specs = {"a": StandIn(), "b": StandIn(), "broken": StandIn(error_rate=1.0)}
+    done = []
+    with stand_ins(specs) as mirrors:
+        speedtest.benchmark_adaptive(
+            mirrors, timeout=1.0, deadline=6.0,
+            progress=lambda msg: done.append(msg.split(" ", 1)[0]) if "测试完成" in msg else None,
+        )
+    assert done[0] == "broken"  # reported when dropped, not after the others settle
+    assert sorted(done) == ["a", "b", "broken"]